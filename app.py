@@ -1,14 +1,25 @@
-import aiml
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify
 from glob import glob
 from nltk.corpus import wordnet as wn
-from nltk import pos_tag, ne_chunk, sent_tokenize, word_tokenize
 from nltk.tree import Tree
-from nltk.sentiment import SentimentIntensityAnalyzer
 import pytholog as pl
 import calendar
 from datetime import date
-from neo4j import GraphDatabase
+from neo4j_pool import get_neo4j_session
+from neo4j_schema import ensure_schema
+from sensory_memory import write_sensory_memory
+from interaction_writer import InteractionWriter
+from text_analysis import analyze_text, ensure_analyzed
+from nlp_resources import nlp, pos_tag, ne_chunk, sentiment_analyzer
+from lexical_cache import lexicon
+from bot_sessions import SessionKernel, bot_session_id
+from brain_snapshot import load_brain
+from knowledge_cache import knowledge_bases
+from query_executor import QueryTimeout
+from fact_store import fact_store
+from predicate_handlers import prompt_handlers
+from sensor_rollups import retention
+from sensor_managers import DHT11SensoryMemoryManager
 import hashlib
 import re
 import dns.resolver
@@ -20,274 +31,6 @@ import requests
 from threading import Thread
 import uuid
 from speech_recognition import Recognizer, Microphone, UnknownValueError, RequestError, WaitTimeoutError
-import serial
-import json
-import threading
-import time
-import queue
-import logging
-
-
-mood = ""
-
-
-
-class DHT11SensoryMemoryManager:
-    def __init__(self, port='COM3', baudrate=115200):
-        self.port = port
-        self.baudrate = baudrate
-        self.serial_connection = None
-        self.sensor_data = {
-            'temperature': None,
-            'humidity': None,
-            'timestamp': None,
-            'sensor_type': 'DHT11',
-            'memory_type': 'SensoryMemory',
-            'status': 'disconnected'
-        }
-        self.data_queue = queue.Queue(maxsize=100)
-        self.running = False
-        self.lock = threading.Lock()
-
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
-
-        self.connect()
-
-    def connect(self):
-        """Connect to Arduino with retry logic"""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                self.serial_connection = serial.Serial(
-                    self.port,
-                    self.baudrate,
-                    timeout=2,
-                    write_timeout=2
-                )
-                time.sleep(2)  # Arduino initialization
-                self.running = True
-                self.sensor_data['status'] = 'connected'
-                self.logger.info(f"Connected to DHT11 on {self.port}")
-
-                # Start monitoring threads
-                self.start_monitoring()
-                return True
-
-            except Exception as e:
-                self.logger.error(f"Connection attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    self.sensor_data['status'] = 'error'
-                    return False
-                time.sleep(2)
-
-    def start_monitoring(self):
-        """Start background monitoring threads"""
-        self.reader_thread = threading.Thread(target=self.read_sensor_data, daemon=True)
-        self.processor_thread = threading.Thread(target=self.process_sensor_data, daemon=True)
-
-        self.reader_thread.start()
-        self.processor_thread.start()
-
-    def read_sensor_data(self):
-        """Continuous reading thread"""
-        while self.running:
-            try:
-                if self.serial_connection and self.serial_connection.is_open:
-                    self.serial_connection.write(b'GET_SENSOR_DATA\n')
-
-                    response = self.serial_connection.readline().decode().strip()
-                    if response:
-                        try:
-                            data = json.loads(response)
-                            self.data_queue.put(data, timeout=1)
-                        except json.JSONDecodeError:
-                            self.logger.warning(f"Invalid JSON: {response}")
-
-                time.sleep(30)  # Read every 30 seconds
-
-            except Exception as e:
-                self.logger.error(f"Read error: {e}")
-                time.sleep(5)
-
-    def process_sensor_data(self):
-        """Process queued sensor data"""
-        while self.running:
-            try:
-                data = self.data_queue.get(timeout=1)
-
-                with self.lock:
-                    if self.validate_sensor_data(data):
-                        self.sensor_data.update(data)
-                        self.sensor_data['python_timestamp'] = datetime.now().isoformat()
-
-                        # Save to Neo4j as DHT11:SensoryMemory
-                        threading.Thread(
-                            target=self.save_dht11_sensory_memory,
-                            args=(data.copy(),),
-                            daemon=True
-                        ).start()
-
-                self.data_queue.task_done()
-
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"Processing error: {e}")
-
-    def validate_sensor_data(self, data):
-        """Validate DHT11 sensor data ranges"""
-        if not isinstance(data, dict):
-            return False
-
-        temp = data.get('temperature')
-        humidity = data.get('humidity')
-
-        # DHT11 specifications: 0-50°C, 20-80% RH
-        if temp is not None and (temp < 0 or temp > 50):
-            self.logger.warning(f"Temperature out of DHT11 range: {temp}")
-            return False
-
-        if humidity is not None and (humidity < 20 or humidity > 80):
-            self.logger.warning(f"Humidity out of DHT11 range: {humidity}")
-            return False
-
-        return True
-
-    def save_dht11_sensory_memory(self, sensor_data):
-        """Optimized DHT11 data saving to prevent Cartesian products"""
-        try:
-            driver = connect_neo4j()
-            if not driver:
-                self.logger.warning("Neo4j not available, skipping sensor data save")
-                return
-
-            neo4j_session = driver.session()
-            timestamp = datetime.now().isoformat()
-
-            # Step 1: Create the sensor reading node
-            neo4j_session.run("""
-                CREATE (s:DHT11:SensoryMemory {
-                    temperature: $temperature,
-                    humidity: $humidity,
-                    timestamp: $timestamp,
-                    sensor_type: $sensor_type,
-                    memory_type: $memory_type,
-                    status: $status,
-                    data_quality: $quality
-                })
-            """,
-                              temperature=sensor_data.get('temperature'),
-                              humidity=sensor_data.get('humidity'),
-                              timestamp=timestamp,
-                              sensor_type='DHT11',
-                              memory_type='SensoryMemory',
-                              status=sensor_data.get('status'),
-                              quality='validated'
-                              )
-
-            # Step 2: Link to user (if available) using optimized query
-            if hasattr(self, 'current_user_email') and self.current_user_email:
-                neo4j_session.run("""
-                    MERGE (u:User {email: $email})
-                    WITH u
-                    MATCH (s:DHT11:SensoryMemory {timestamp: $timestamp})
-                    MERGE (u)-[:HAS_SENSOR_READING]->(s)
-                """, email=self.current_user_email, timestamp=timestamp)
-
-            neo4j_session.close()
-            driver.close()
-
-            self.logger.info(f"Saved DHT11:SensoryMemory - Temp: {sensor_data.get('temperature')}°C")
-
-        except Exception as e:
-            self.logger.warning(f"Neo4j save error: {e}")
-
-    def set_current_user(self, email):
-        """Set current user for sensor data linking"""
-        self.current_user_email = email
-
-    def get_latest_readings(self):
-        """Thread-safe data access"""
-        with self.lock:
-            return self.sensor_data.copy()
-
-    def get_environmental_context(self):
-        """Get comprehensive environmental context"""
-        with self.lock:
-            data = self.sensor_data.copy()
-            print(data)
-            if data['status'] != 'valid':
-                return None
-
-            temp = data['temperature']
-            humidity = data['humidity']
-            print(temp, humidity)
-            if temp is None or humidity is None:
-                return None
-
-            # Calculate comfort metrics
-            comfort_score = self.calculate_comfort_score(temp, humidity)
-            recommendations = self.get_recommendations(temp, humidity)
-            print(comfort_score)
-            return {
-                'temperature': temp,
-                'humidity': humidity,
-                'comfort_level': comfort_score,
-                'recommendations': recommendations,
-                'timestamp': data.get('timestamp'),
-                'sensor_type': 'DHT11',
-                'memory_type': 'SensoryMemory'
-            }
-
-    def calculate_comfort_score(self, temp, humidity):
-        """Calculate comfort score (0-100) based on DHT11 readings"""
-        # Optimal ranges: 20-26°C temperature, 40-60% humidity
-        temp_score = max(0, min(100, 100 - abs(temp - 23) * 10))
-        humidity_score = max(0, min(100, 100 - abs(humidity - 50) * 2))
-        return (temp_score + humidity_score) / 2
-
-    def get_recommendations(self, temp, humidity):
-        """Get environmental recommendations based on DHT11 readings"""
-        recommendations = []
-
-        if temp > 26:
-            recommendations.append("Room temperature is high - consider cooling")
-        elif temp < 20:
-            recommendations.append("Room temperature is low - consider warming")
-
-        if humidity > 60:
-            recommendations.append("Humidity is high - consider dehumidifying")
-        elif humidity < 40:
-            recommendations.append("Humidity is low - consider humidifying")
-
-        if not recommendations:
-            recommendations.append("Environmental conditions are optimal")
-
-        return recommendations
-
-    def disconnect(self):
-        """Clean shutdown"""
-        self.running = False
-        if self.serial_connection:
-            self.serial_connection.close()
-        self.logger.info("DHT11 sensor manager disconnected")
-
-
-# Initialize global sensor manager
-
-
-
-def connect_neo4j():
-    # Define the Neo4j connection details
-    uri = "bolt://localhost:7687"
-    username = "neo4j"
-    password = "12345678@"
-    # Create a Neo4j driver instance
-    driver = GraphDatabase.driver(uri, auth=(username, password))
-    return driver
-
 
 
 def hash_password(password):
@@ -295,8 +38,7 @@ def hash_password(password):
 
 
 def validate_data(email, password):
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
 
     query = """
  MATCH (u:User{email:$email, password:$password})
@@ -305,7 +47,6 @@ def validate_data(email, password):
     password = hash_password(password)
     user = neo4j_session.run(query, email=email, password=password).data()
     neo4j_session.close()
-    driver.close()
     if user:
         return True
 
@@ -313,15 +54,13 @@ def validate_data(email, password):
 
 
 def check_email(email):
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
     query = """
     MATCH (u:User{email:$email})
     RETURN u
     """
     user = neo4j_session.run(query, email=email).data()
     neo4j_session.close()
-    driver.close()
     if user:
         print(user)
         return True
@@ -349,28 +88,24 @@ def validate_email(email):
 
 
 def get_username(email):
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
     query = """
     MATCH (u:User{email: $email}) RETURN u.name
     """
     username = neo4j_session.run(query, email=email).data()[0]['u.name']
     neo4j_session.close()
-    driver.close()
     return username
 
 
 def store_credentials(name, email, password):
     password = hash_password(password)
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
 
     query = """
     MERGE (u:User{name:$name, email:$email, password:$password})
     """
     neo4j_session.run(query, name=name, email=email, password=password)
     neo4j_session.close()
-    driver.close()
 
     # Create empty facts file for the user
     fact_dir = "prolog/facts"
@@ -385,16 +120,14 @@ def store_credentials(name, email, password):
 
 
 def sentiment_analysis(text):
-    global mood
-    sia = SentimentIntensityAnalyzer()
-    results = sia.polarity_scores(text)
+    results = sentiment_analyzer().polarity_scores(text)
     if results['pos'] > results['neg']:
         myBot.setPredicate("sentiment", "positive")
-        mood = "positive"
+        myBot.setPredicate("last_mood", "positive")
         return
     elif results['neg'] > results['pos']:
         myBot.setPredicate("sentiment", "negative")
-        mood = "negative"
+        myBot.setPredicate("last_mood", "negative")
         return
 
     return
@@ -420,21 +153,20 @@ def check_sentiment(sentiment):
 
 
 def set_sentiment():
-    global mood
     sentiment = myBot.getPredicate("sentiment")
     if sentiment == "":
-        myBot.setPredicate("sentiment", mood)
+        myBot.setPredicate("sentiment", myBot.getPredicate("last_mood"))
         return
     return
 
 
 def get_description(word):
     description = '\n'
-    sn = wn.synsets(word)
-    length = len(sn)
+    definitions = lexicon.get(word).definitions
+    length = len(definitions)
     for i in range(length):
         # description += str(i+1)
-        description += str(i + 1) + ". " + sn[i].definition()
+        description += str(i + 1) + ". " + definitions[i]
         if i + 1 != length:
             description += '\n'
 
@@ -452,14 +184,33 @@ def check_meanings(word):
         return
 
 
+# Predicates the lookups set for the reply, cleared with the handlers' predicates
+QUERY_PREDICATES = ("kb_query",)
+
+
+def query_facts(expr):
+    # kb_query is "timeout" once any lookup in this message gave up; it is only
+    # ever set, never set back, so a later lookup cannot hide an earlier timeout
+    try:
+        return knowledge_bases.query(expr)
+    except QueryTimeout:
+        myBot.setPredicate("kb_query", "timeout")
+        raise
+
+
 def find_dob(person_name):
     person_name = person_name.lower() if person_name != "USER" else session["username"].lower()
-    myBot.setPredicate("person", person_name.capitalize())
+    # Its own predicate: the lookups run concurrently and "person" is the relation fact writer's
+    myBot.setPredicate("dob_name", person_name.capitalize())
     query = f"dob({person_name}, (Y, M, D))"
     try:
-        result = kb.query(pl.Expr(query))
+        result = query_facts(pl.Expr(query))
         if result is None:
             result = ['No']
+    except QueryTimeout:
+        myBot.setPredicate("dob", "timeout")
+        myBot.setPredicate("dob_person", "")
+        return
     except Exception as e:
         result = ['No']
     if result[0] != 'No':
@@ -484,15 +235,19 @@ def find_dob(person_name):
 
 def find_age(person_name):
     person_name = person_name.lower() if person_name != "USER" else session["username"].lower()
-    myBot.setPredicate("person", person_name.capitalize())
+    myBot.setPredicate("age_name", person_name.capitalize())
     query = f"dob({person_name}, (Y, M, D))"
     print(query)
     try:
-        result = kb.query(pl.Expr(query))
+        result = query_facts(pl.Expr(query))
         if result is None:
             result = ['No']
+    except QueryTimeout:
+        myBot.setPredicate("age", "timeout")
+        myBot.setPredicate("age_person", "")
+        return
     except Exception as e:
-        result = ['No']  # Assuming 'kb' is your pytholog KnowledgeBase object
+        result = ['No']
     if result[0] != 'No':
         entry = result[0]
         raw_year = entry['Y']
@@ -516,13 +271,17 @@ def find_age(person_name):
 
 def find_gender(person_name):
     person_name = person_name.lower() if person_name != "USER" else session["username"].lower()
-    myBot.setPredicate("person", person_name.capitalize())
+    myBot.setPredicate("gender_name", person_name.capitalize())
     # First try male query
     query_male = pl.Expr(f"male({person_name})")
+    timed_out = False
     try:
-        result_male = kb.query(query_male)
+        result_male = query_facts(query_male)
         if result_male is None:
             result_male = ['No']
+    except QueryTimeout:
+        timed_out = True
+        result_male = ['No']
     except Exception as e:
         result_male = ['No']
 
@@ -534,9 +293,12 @@ def find_gender(person_name):
     # If not male, try female query
     query_female = pl.Expr(f"female({person_name})")
     try:
-        result_female = kb.query(query_female)
-        if result_male is None:
+        result_female = query_facts(query_female)
+        if result_female is None:
             result_female = ['No']
+    except QueryTimeout:
+        timed_out = True
+        result_female = ['No']
     except Exception as e:
         result_female = ['No']
 
@@ -545,8 +307,8 @@ def find_gender(person_name):
         myBot.setPredicate("gender_person", person_name)
         return
 
-    # If neither male nor female found
-    myBot.setPredicate("gender", "unknown")
+    # If neither male nor female found; "unknown" only if both lookups finished
+    myBot.setPredicate("gender", "timeout" if timed_out else "unknown")
     myBot.setPredicate("gender_person", person_name)
     return
 
@@ -594,95 +356,141 @@ def set_name_check_variable(argument_name, session):
         return False
 
 
-def prompt_check():
-    username = session.get('username', '').lower()
+def _username():
+    return session.get('username', '').lower()
+
+
+# Handlers for the predicates AIML templates set; prompt_check() runs the
+# triggered ones, independent handlers concurrently (see predicate_handlers).
+@prompt_handlers.handler("user_input_name")
+def _name_check(values):
+    set_name_check_variable(values['user_input_name'], session)
+
+
+@prompt_handlers.handler("delete")
+def _delete_history(values):
+    delete_chat_history(session['email'])
+
+
+@prompt_handlers.handler("word")
+def _meanings(values):
+    check_meanings(values["word"])
+
+
+@prompt_handlers.handler("mood")
+def _sentiment(values):
+    check_sentiment(values["mood"])
+
+
+@prompt_handlers.handler("dob_person")
+def _find_dob(values):
+    find_dob(values["dob_person"])
+
+
+@prompt_handlers.handler("age_person")
+def _find_age(values):
+    print(values["age_person"])
+    find_age(values["age_person"])
+
+
+@prompt_handlers.handler("gender_person")
+def _find_gender(values):
+    print(values["gender_person"])
+    find_gender(values["gender_person"])
+
+
+@prompt_handlers.handler("rel", "person1", when=lambda values: values["rel"] or values["person1"])
+def _find_relation(values):
+    check_relation(values["rel"], values["person1"])
+
+
+# Fact writers wait for this message's lookups, which answer from the facts known before it
+FACT_LOOKUPS = ("find_dob", "find_age", "find_gender", "find_relation")
+
+
+@prompt_handlers.handler("other_person1", "other_person2", "other_relation", after=FACT_LOOKUPS)
+def _other_relation_fact(values):
+    append_relation_fact(values["other_person1"], values["other_person2"], values["other_relation"])
+
+
+@prompt_handlers.handler("gender", after=FACT_LOOKUPS)
+def _gender_fact(values):
+    append_gender_fact(_username(), values["gender"])
+
+
+@prompt_handlers.handler("other_gender_person", "other_gender", after=FACT_LOOKUPS)
+def _other_gender_fact(values):
+    append_gender_fact(values["other_gender_person"], values["other_gender"])
+
+
+@prompt_handlers.handler("dob", after=FACT_LOOKUPS)
+def _dob_fact(values):
+    append_dob_fact(_username(), values["dob"])
 
+
+@prompt_handlers.handler("other_dob_person", "other_dob", after=FACT_LOOKUPS)
+def _other_dob_fact(values):
+    append_dob_fact(values["other_dob_person"], values["other_dob"])
+
+
+@prompt_handlers.handler("relation", "person", "person1", after=FACT_LOOKUPS,
+                         when=lambda values: values["person1"] if values["relation"] == "married" else values["person"])
+def _relation_fact(values):
+    if values["relation"] == "married":
+        append_relation_fact(_username(), values["person1"], values["relation"])
+    else:
+        append_relation_fact(_username(), values["person"], values["relation"])
+
+
+# DHT11 sensor handling
+@prompt_handlers.handler("get_dht11_temperature")
+def _dht11_temperature(values):
+    get_dht11_temperature()
+
+
+@prompt_handlers.handler("get_dht11_humidity")
+def _dht11_humidity(values):
+    get_dht11_humidity()
+
+
+@prompt_handlers.handler("get_dht11_status")
+def _dht11_status(values):
+    get_dht11_status()
+
+
+@prompt_handlers.handler("analyze_dht11_environment")
+def _dht11_environment(values):
+    analyze_dht11_environment()
+
+
+@prompt_handlers.handler("get_dht11_memory")
+def _dht11_memory(values):
+    memory_data = get_dht11_memory_data()
+    if memory_data:
+        latest = memory_data[0]
+        myBot.setPredicate("latest_dht11_temp", str(latest['temperature']))
+        myBot.setPredicate("latest_dht11_humidity", str(latest['humidity']))
+
+
+def prompt_check():
     # Set current user for sensor data linking
     if 'email' in session:
         dht11_sensor.set_current_user(session['email'])
 
-    keys = [
-        "mood", "word", "dob_person", "age_person", "gender_person",
-        "rel", "person1", "gender", "dob", "relation", "person",
-        "other_dob_person", "other_dob", "other_gender_person", "other_gender",
-        "other_person1", "other_person2", "other_relation", "delete", "user_input_name",
-        "get_dht11_temperature", "get_dht11_humidity", "get_dht11_status",
-        "analyze_dht11_environment", "get_dht11_memory"  # Added DHT11 predicates
-    ]
-
-    values = {key: myBot.getPredicate(key).strip() for key in keys}
-
-    if values['user_input_name']:
-        set_name_check_variable(values['user_input_name'],session)
-    if values['delete']:
-        delete_chat_history(session['email'])
-    if values["word"]:
-        check_meanings(values["word"])
-
-    if values["mood"]:
-        check_sentiment(values["mood"])
-
-    if values["dob_person"]:
-        find_dob(values["dob_person"])
-
-    if values["age_person"]:
-        print(values["age_person"])
-        find_age(values["age_person"])
-
-    if values["gender_person"]:
-        print(values["gender_person"])
-        find_gender(values["gender_person"])
-
-    if values["rel"] or values["person1"]:
-        check_relation(values["rel"], values["person1"])
-    if values["other_person1"] and values["other_person2"] and values["other_relation"]:
-        append_relation_fact(values["other_person1"], values["other_person2"] ,values["other_relation"])
-    if values["gender"]:
-        append_gender_fact(username, values["gender"])
-    if values["other_gender_person"] and values["other_gender"]:
-        append_gender_fact(values["other_gender_person"], values["other_gender"])
-    if values["dob"]:
-        append_dob_fact(username, values["dob"])
-    if values["other_dob"] and values["other_dob_person"]:
-        append_dob_fact(values["other_dob_person"], values["other_dob"])
-    if values["relation"] == "married" and values["person1"]:
-        append_relation_fact(username, values["person1"], values["relation"])
-    if values["relation"] != "married" and values["person"]:
-        append_relation_fact(username, values["person"], values["relation"])
-        # Add DHT11 sensor handling
-    if values["get_dht11_temperature"]:
-        get_dht11_temperature()
-
-    if values["get_dht11_humidity"]:
-        get_dht11_humidity()
-
-    if values["get_dht11_status"]:
-        get_dht11_status()
-
-    if values["analyze_dht11_environment"]:
-        analyze_dht11_environment()
-
-    if values["get_dht11_memory"]:
-        memory_data = get_dht11_memory_data()
-        if memory_data:
-            latest = memory_data[0]
-            myBot.setPredicate("latest_dht11_temp", str(latest['temperature']))
-            myBot.setPredicate("latest_dht11_humidity", str(latest['humidity']))
-
+    prompt_handlers.dispatch(myBot.getPredicate)
 
 
 def find_person(x, rel):
-    expr = f"{rel}(Y,{x})"
-    print(expr)
+    print(f"{rel}(Y,{x})")
     try:
-        result = kb.query(pl.Expr(expr))
-        if result is None:
-            result = ['No']
+        # Materialised bottom-up from kb.pl and the user's facts
+        result = knowledge_bases.find_related(rel, x)
     except Exception as e:
-        result = ['No']
+        print(f"Relation lookup failed: {e}")
+        result = []
     print(result)
-    if result[0] != 'No':  # If result is not None or empty
-        return result[0]["Y"]
+    if result:
+        return result[0]
     else:
         return "unknown"
 
@@ -703,16 +511,14 @@ def check_relation(rel,person1):
         return
 
 def append_gender_fact(username, gender):
-    fact = f"{gender.lower()}({username.lower()}).\n"  # example: male(burhan).
+    fact = f"{gender.lower()}({username.lower()})"  # example: male(burhan)
 
-    print("Appending gender to Prolog file:", fact)
+    print("Asserting gender fact:", fact)
 
-    fact_file_path = session.get("fact_file")  # get path from session
+    fact_file_path = session.get("fact_file") or knowledge_bases.active_fact_file()
 
     if fact_file_path:
-        with open(fact_file_path, "a") as f:  # 'a' mode for append
-            f.write(fact)
-            f.close()
+        fact_store.assert_fact(fact_file_path, fact)
     else:
         print("Fact file path not found in session.")
 
@@ -729,15 +535,13 @@ def append_dob_fact(username, dob):
         date_obj = parser.parse(dob, dayfirst=True)  # dayfirst helps with DD/MM/YYYY format
 
         year, month, day = date_obj.year, date_obj.month, date_obj.day
-        fact = f"dob({username.lower()},date({year},{month},{day})).\n"
-        print("Appending to Prolog facts:", fact)
+        fact = f"dob({username.lower()},date({year},{month},{day}))"
+        print("Asserting Prolog fact:", fact)
 
-        # Append to fact file from session
-        fact_file_path = session.get("fact_file")
+        # Assert into the live knowledge base and the user's fact file
+        fact_file_path = session.get("fact_file") or knowledge_bases.active_fact_file()
         if fact_file_path:
-            with open(fact_file_path, "a") as f:
-                f.write(fact)
-                f.close()
+            fact_store.assert_fact(fact_file_path, fact)
         else:
             print("Error: fact_file not found in session.")
 
@@ -747,12 +551,11 @@ def append_dob_fact(username, dob):
 
 
 def append_relation_fact(username, person1, relation):
-    # --- Append to Prolog ---
-    fact = f"{relation.lower()}({person1.lower()},{username.lower()}).\n"
-    fact_file_path = session.get("fact_file")
+    # --- Assert into Prolog ---
+    fact = f"{relation.lower()}({person1.lower()},{username.lower()})"
+    fact_file_path = session.get("fact_file") or knowledge_bases.active_fact_file()
     if fact_file_path:
-        with open(fact_file_path, "a") as f:
-            f.write(fact)
+        fact_store.assert_fact(fact_file_path, fact)
 
     # --- Trigger async Neo4j save using email from session ---
     user_email = session.get("email")
@@ -777,8 +580,7 @@ def save_social_memory(username, email, person1, relation):
         edge_label = f"IS_{relation_upper}_OF"
         is_bidirectional = False
 
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
 
     try:
         # Ensure person1 node
@@ -826,51 +628,21 @@ def save_social_memory(username, email, person1, relation):
         print(f"[NEO4J ERROR]: {e}")
     finally:
         neo4j_session.close()
-        driver.close()
 
 
 
 def save_sensory_memory(text, timestamp=None):
+    analysis = ensure_analyzed(text)
     if timestamp is None:
         timestamp = datetime.now().isoformat()
     ip_address = get_public_ip()
 
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
-
-    neo4j_session.run("""
-        MERGE (t:Text:SensoryMemory {full_text: $text, timestamp: $timestamp, ip_address: $ip_address})
-    """, text=text, timestamp=timestamp, ip_address=ip_address)
-    sentences = sent_tokenize(text)
-    prev_sentence = None
-    for sentence in sentences:
-        neo4j_session.run("""
-            MATCH (t:Text:SensoryMemory {full_text: $text})
-            MERGE (s:Sentence:SensoryMemory {sentence_text: $sentence})
-            MERGE (t)-[:HAS_A_SENTENCE]->(s)
-        """, text=text, sentence=sentence)
-        if prev_sentence:
-            neo4j_session.run("""
-                MATCH (s1:Sentence {sentence_text: $prev_sentence}), (s2:Sentence {sentence_text: $curr_sentence})
-                MERGE (s1)-[:NEXT_SENTENCE]->(s2)
-            """, prev_sentence=prev_sentence, curr_sentence=sentence)
-        prev_sentence = sentence
-        words = word_tokenize(sentence)
-        prev_word = None
-        for word in words:
-            neo4j_session.run("""
-                MATCH (s:Sentence {sentence_text: $sentence})
-                MERGE (w:Word:SensoryMemory {word_text: $word})
-                MERGE (s)-[:HAS_A_WORD]->(w)
-            """, sentence=sentence, word=word)
-            if prev_word:
-                neo4j_session.run("""
-                    MATCH (w1:Word {word_text: $prev_word}), (w2:Word {word_text: $curr_word})
-                    MERGE (w1)-[:NEXT_WORD]->(w2)
-                """, prev_word=prev_word, curr_word=word)
-            prev_word = word
-    neo4j_session.close()
-    driver.close()
+    neo4j_session = get_neo4j_session()
+    try:
+        return write_sensory_memory(neo4j_session, analysis.text, timestamp, ip_address,
+                                    sentences=[(sentence.text, sentence.tokens) for sentence in analysis.sentences])
+    finally:
+        neo4j_session.close()
 
 
 
@@ -889,20 +661,16 @@ def get_wordnet_pos(treebank_tag):
 
 
 def save_semantic_memory(text):
-    from nltk.corpus import wordnet as wn
-    words = word_tokenize(text)
-    tagged_words = pos_tag(words)
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
-    for word, tag in tagged_words:
+    analysis = ensure_analyzed(text)
+    neo4j_session = get_neo4j_session()
+    for word, tag in analysis.pos_tags:
         wn_pos = get_wordnet_pos(tag)
         if wn_pos:
-            synsets = wn.synsets(word, pos=wn_pos)
-            if synsets:
-                synset = synsets[0]
-                definition = synset.definition()
-                synonyms = set(lemma.name() for lemma in synset.lemmas())
-                antonyms = set(ant.name() for lemma in synset.lemmas() for ant in lemma.antonyms())
+            entry = lexicon.get(word, wn_pos)
+            if entry.found:
+                definition = entry.definition
+                synonyms = entry.synonyms
+                antonyms = entry.antonyms
                 neo4j_session.run("""
                     MERGE (d:Description:SemanticMemory {description: $definition})
                     WITH d MATCH (w:Word:SensoryMemory {word_text: $word})
@@ -920,62 +688,20 @@ def save_semantic_memory(text):
                         WITH a MATCH (w:Word:SensoryMemory {word_text: $word})
                         MERGE (w)-[:HAS_ANTONYM]->(a)
                     """, word=word, antonym=antonym)
-                hypernyms = synset.hypernyms()
-                if hypernyms:
-                    hyper = hypernyms[0].lemmas()[0].name()
+                if entry.hypernym:
+                    hyper = entry.hypernym
                     neo4j_session.run("""
                         MERGE (c:Category:SemanticMemory {name: $hypernym})
                         WITH c MATCH (w:Word:SensoryMemory {word_text: $word})
                         MERGE (w)-[:IS_A]->(c)
                     """, word=word, hypernym=hyper)
-                domain = synset.lexname().split(".")[-1]
+                domain = entry.domain
                 neo4j_session.run("""
                     MERGE (d:Domain:SemanticMemory {domain_name: $domain})
                     WITH d MATCH (w:Word:SensoryMemory {word_text: $word})
                     MERGE (w)-[:BELONGS_TO_DOMAIN]->(d)
                 """, word=word, domain=domain)
     neo4j_session.close()
-    driver.close()
-
-def extract_named_entities_from_words(words):
-    named_entities = []
-    pos = pos_tag(words)
-    ne_tree = ne_chunk(pos)
-    for subtree in ne_tree:
-        if isinstance(subtree, Tree):
-            entity_name = " ".join([token for token, _ in subtree.leaves()])
-            entity_type = subtree.label()
-            named_entities.append((entity_name, entity_type))
-    return named_entities
-
-
-def classify_sentence_type(sentence):
-    words = word_tokenize(sentence)
-    tags = pos_tag(words)
-
-    if not words:
-        return "unknown"
-
-    first_word = words[0].lower()
-    first_tag = tags[0][1] if tags else ""
-
-    # Interrogative if sentence starts with wh-word or auxiliary/modal verb
-    wh_words = {"what", "when", "where", "who", "why", "how", "which", "whom", "whose"}
-    aux_modals = {"is", "are", "was", "were", "do", "does", "did", "can", "could", "will", "would", "should", "shall", "may", "might", "have", "has", "had"}
-
-    if first_word in wh_words or first_word in aux_modals:
-        return "interrogative"
-
-    # Imperative: usually starts with base form verb (VB) and no subject (PRP/NOUN)
-    if first_tag == "VB" and all(tag[1] not in {"PRP", "NN", "NNP"} for tag in tags[:2]):
-        return "imperative"
-
-    # Exclamatory: begins with interjection (UH) or exclamatory adjective/adverb
-    if first_tag == "UH" or first_word in {"what", "how"} and len(tags) > 1 and tags[1][1] in {"JJ", "RB"}:
-        return "exclamatory"
-
-    # Default fallback
-    return "declarative"
 
 def get_public_ip():
     try:
@@ -993,15 +719,13 @@ def get_location_from_ip(ip=get_public_ip()):
         return "Unknown", "Unknown"
 
 def save_pam_from_sensory_memory(text):
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
-    sia = SentimentIntensityAnalyzer()
+    analysis = ensure_analyzed(text)
+    neo4j_session = get_neo4j_session()
     ip_address = get_public_ip()
     city, country = get_location_from_ip(ip_address)
 
-    sentences = sent_tokenize(text)
-
-    for sentence in sentences:
+    for analyzed in analysis.sentences:
+        sentence = analyzed.text
         result = neo4j_session.run("""
             MATCH (s:Sentence:SensoryMemory {sentence_text: $sentence})
             RETURN s
@@ -1012,7 +736,7 @@ def save_pam_from_sensory_memory(text):
             continue
 
         # Sentiment
-        sentiment_score = sia.polarity_scores(sentence)
+        sentiment_score = analyzed.sentiment
         neo4j_session.run("""
             MERGE (se:Sentiment:PerceptualAssociativeMemory {
                 positive: $positive,
@@ -1029,25 +753,18 @@ def save_pam_from_sensory_memory(text):
              compound=sentiment_score["compound"])
 
         # Mood node based on dominant sentiment
-        if sentiment_score["pos"] > sentiment_score["neg"] and sentiment_score["pos"] > sentiment_score["neu"]:
-            mood = "positive"
-        elif sentiment_score["neg"] > sentiment_score["pos"] and sentiment_score["neg"] > sentiment_score["neu"]:
-            mood = "negative"
-        else:
-            mood = "neutral"
         neo4j_session.run("""
             MERGE (m:Mood:PerceptualAssociativeMemory {mood: $mood})
             WITH m MATCH (s:Sentence:SensoryMemory {sentence_text: $sentence})
             MERGE (s)-[:HAS_MOOD]->(m)
-        """, sentence=sentence, mood=mood)
+        """, sentence=sentence, mood=analyzed.mood)
 
         # Sentence Type
-        sentence_type = classify_sentence_type(sentence)
         neo4j_session.run("""
             MERGE (t:SentenceType:PerceptualAssociativeMemory {type: $type})
             WITH t MATCH (s:Sentence:SensoryMemory {sentence_text: $sentence})
             MERGE (s)-[:HAS_TYPE]->(t)
-        """, sentence=sentence, type=sentence_type)
+        """, sentence=sentence, type=analyzed.sentence_type)
 
         # IP + Location
         neo4j_session.run("""
@@ -1060,12 +777,9 @@ def save_pam_from_sensory_memory(text):
         """, sentence=sentence, ip=ip_address, city=city, country=country)
 
         # POS Tags and Named Entities as attributes of Word node
-        words = word_tokenize(sentence)
-        pos_tags = pos_tag(words)
-        named_entities = extract_named_entities_from_words(words)
-        entity_map = {word: entity_type for word, entity_type in named_entities}
+        entity_map = analyzed.entity_map
 
-        for word, pos in pos_tags:
+        for word, pos in analyzed.pos_tags:
             long_pos = pos_tags_dict.get(pos, "Unknown")
             named_entity = entity_map.get(word) or "None"
             neo4j_session.run("""
@@ -1080,7 +794,6 @@ def save_pam_from_sensory_memory(text):
             """, word=word, pos=pos, long_pos=long_pos, named_entity=named_entity, sentence=sentence)
 
     neo4j_session.close()
-    driver.close()
 
 
 
@@ -1090,10 +803,12 @@ def get_session_id(session):
     return session['session_id']
 
 def create_episode(user_email, session):
+    # Every login starts a new episode; reusing the session_id of an earlier login
+    # in the same browser session would violate episode_session_id_unique
+    session.pop('session_id', None)
     session_id = get_session_id(session)
     start_time = datetime.now().isoformat()
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
     # Find previous episode for this user
     prev_episode = neo4j_session.run("""
         MATCH (u:User {email: $email})-[:HAS_EPISODE]->(e:Episode)
@@ -1113,7 +828,6 @@ def create_episode(user_email, session):
             MERGE (e1)-[:NEXT_EPISODE]->(e2)
         """, prev_id=prev_id, curr_id=session_id)
     neo4j_session.close()
-    driver.close()
     session['current_episode_id'] = session_id
 
 def end_episode(user_email, session):
@@ -1121,14 +835,12 @@ def end_episode(user_email, session):
     if not session_id:
         return
     end_time = datetime.now().isoformat()
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
     neo4j_session.run("""
         MATCH (e:Episode {session_id: $session_id})
         SET e.end_time = $end_time
     """, session_id=session_id, end_time=end_time)
     neo4j_session.close()
-    driver.close()
     session.pop('current_episode_id', None)
     session.pop('session_id', None)
 
@@ -1144,18 +856,20 @@ def create_interaction(user_email, user_input, bot_output, session):
     user_time = datetime.now().isoformat()
     bot_time = datetime.now().isoformat()
 
-    # Save both texts to memory systems first
-    save_sensory_memory(user_input, timestamp=user_time)
-    save_semantic_memory(user_input)
-    save_pam_from_sensory_memory(user_input)
+    # Analyze each text once and feed the same analysis to every memory system
+    user_analysis = analyze_text(user_input)
+    bot_analysis = analyze_text(bot_output)
+
+    save_sensory_memory(user_analysis, timestamp=user_time)
+    save_semantic_memory(user_analysis)
+    save_pam_from_sensory_memory(user_analysis)
 
-    save_sensory_memory(bot_output, timestamp=bot_time)
-    save_semantic_memory(bot_output)
-    save_pam_from_sensory_memory(bot_output)
+    save_sensory_memory(bot_analysis, timestamp=bot_time)
+    save_semantic_memory(bot_analysis)
+    save_pam_from_sensory_memory(bot_analysis)
 
     # Begin Neo4j operations
-    driver = connect_neo4j()
-    neo4j_session = driver.session()
+    neo4j_session = get_neo4j_session()
 
     # Ensure agent node exists
     neo4j_session.run("""
@@ -1211,7 +925,6 @@ def create_interaction(user_email, user_input, bot_output, session):
     """, interaction_id=interaction_id, text=bot_output, timestamp=bot_time)
 
     neo4j_session.close()
-    driver.close()
 
 def async_create_interaction(user_email, user_input, bot_output, session_snapshot):
     try:
@@ -1222,6 +935,12 @@ def async_create_interaction(user_email, user_input, bot_output, session_snapsho
         print(f"[ASYNC INTERACTION ERROR]: {e}")
 
 
+interaction_writer = InteractionWriter(async_create_interaction).register_shutdown()
+
+# Deduplicate the users' fact files in the background
+fact_store.start_compactor()
+retention.start_pruner()
+
 
 
 
@@ -1333,8 +1052,7 @@ def get_complete_graph_statistics(neo4j_session):
 def get_user_chat_history(email, session):
     """Retrieve complete chat history for a user from Neo4j"""
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         query = """
         MATCH (u:User {email: $email})-[:HAS_EPISODE]->(e:Episode)
@@ -1431,15 +1149,13 @@ def get_user_chat_history(email, session):
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
 def delete_chat_history(user_email):
     """Delete all memory-related nodes for a specific user from Neo4j"""
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         # Count nodes before deletion for the specific user
         count_query = """
@@ -1537,15 +1253,13 @@ def delete_chat_history(user_email):
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
 
 def get_dht11_temperature():
     """Get current temperature from DHT11 sensor"""
-    temp = dht11_sensor.get_latest_readings().get('temperature')
-    print(temp)
+    temp = dht11_sensor.snapshot.temperature
     if temp is not None:
         myBot.setPredicate("dht11_temperature", str(temp))
         myBot.setPredicate("dht11_temp_unit", "°C")
@@ -1557,8 +1271,7 @@ def get_dht11_temperature():
 
 def get_dht11_humidity():
     """Get current humidity from DHT11 sensor"""
-    humidity = dht11_sensor.get_latest_readings().get('humidity')
-    print(humidity)
+    humidity = dht11_sensor.snapshot.humidity
     if humidity is not None:
         myBot.setPredicate("dht11_humidity", str(humidity))
         myBot.setPredicate("dht11_humidity_unit", "%")
@@ -1570,9 +1283,7 @@ def get_dht11_humidity():
 
 def get_dht11_status():
     """Get DHT11 sensor status"""
-    data = dht11_sensor.get_latest_readings()
-    print("dht status: ", data)
-    status = data['status']
+    status = dht11_sensor.snapshot.status
     myBot.setPredicate("dht11_status", status)
     myBot.setPredicate("sensor_type", "DHT11")
     return status
@@ -1580,8 +1291,7 @@ def get_dht11_status():
 
 def analyze_dht11_environment():
     """Analyze environment using DHT11 readings"""
-    context = dht11_sensor.get_environmental_context()
-    print(context)
+    context = dht11_sensor.snapshot.context
     if context:
         myBot.setPredicate("dht11_comfort_score", str(int(context['comfort_level'])))
         myBot.setPredicate("dht11_recommendations", "; ".join(context['recommendations']))
@@ -1593,37 +1303,8 @@ def analyze_dht11_environment():
 
 
 def get_dht11_memory_data():
-    """Get recent DHT11 sensory memory data from Neo4j"""
-    try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
-
-        # Get recent DHT11 readings
-        query = """
-        MATCH (s:DHT11:SensoryMemory)
-        RETURN s.temperature as temp, s.humidity as humidity, s.timestamp as timestamp
-        ORDER BY s.timestamp DESC
-        LIMIT 5
-        """
-
-        result = neo4j_session.run(query)
-        readings = []
-
-        for record in result:
-            readings.append({
-                'temperature': record['temp'],
-                'humidity': record['humidity'],
-                'timestamp': record['timestamp']
-            })
-
-        neo4j_session.close()
-        driver.close()
-
-        return readings
-
-    except Exception as e:
-        print(f"Error retrieving DHT11 memory data: {e}")
-        return []
+    """Get the current user's recent DHT11 readings, from memory once the sensor has seen enough of them"""
+    return dht11_sensor.recent.latest(dht11_sensor.current_user_email, 5)
 
 
 recognizer = Recognizer()
@@ -1649,16 +1330,18 @@ def recognize_speech():
     return None
 
 
-kb = pl.KnowledgeBase("family")
-kb.clear_cache()
-kb.from_file("prolog/kb.pl")
+# Build the rules-only knowledge base now; per-user ones (kb.pl + the user's fact file) on first use
+knowledge_bases.get()
 
-myBot = aiml.Kernel()
+myBot = SessionKernel()
 app = Flask(__name__)
 app.secret_key = 'your-secret-key'
-aiml_files = glob("aiml files/*.aiml")
-for file in aiml_files:
-    myBot.learn(file)
+# Restore the precompiled brain, relearning "aiml files" only when they changed
+brain_report = load_brain(myBot, glob("aiml files/*.aiml"))
+print(f"AIML brain {brain_report['source']}: {brain_report['categories']} categories in {brain_report['seconds']}s")
+
+# Load the NLTK models in the background instead of on the first request
+nlp.warm_up_async()
 
 
 @app.route("/")
@@ -1681,7 +1364,7 @@ def login():
             create_episode(email, session)
             fact_path = f"prolog/facts/{email.replace('@', '_at_')}.pl"
             session["fact_file"] = fact_path
-            myBot.setPredicate("username", session["username"])
+            myBot.setPredicate("username", session["username"], bot_session_id(email))
             return redirect(url_for('home') + '?success=login')
         else:
             return redirect(url_for('login') + '?error=invalid')
@@ -1733,7 +1416,7 @@ def get_bot_response():
     if "email" not in session:
         return jsonify({"error": "Please log in to use the bot."}), 401
 
-    kb.from_file(session["fact_file"])
+    knowledge_bases.activate(session["fact_file"])
 
     # Handle both GET and POST requests
     if request.method == 'POST':
@@ -1746,25 +1429,18 @@ def get_bot_response():
         return jsonify({"error": "No message provided"}), 400
 
     try:
-        # Process the query
-        myBot.respond(query)
-        prompt_check()
-        response = myBot.respond(query)
-
-        # Async interaction logging
-        session_snapshot = dict(session)
-        Thread(target=async_create_interaction, args=(session["email"], query, response, session_snapshot)).start()
-
-        set_sentiment()
-
-        # Clear predicates
-        for key in [
-            "mood", "word", "dob_person", "age_person", "gender_person",
-            "rel", "person1", "gender", "dob", "relation", "person",
-            "other_dob_person", "other_dob", "other_gender_person", "other_gender",
-            "other_person1", "other_person2", "other_relation","delete","user_input_name"
-        ]:
-            myBot.setPredicate(key, "")
+        with myBot.session(bot_session_id(session["email"])):
+            # Match once, resolve prompt_check, then re-render the matched template
+            response = myBot.respond_two_phase(query, prompt_check)
+
+            # Async interaction logging
+            session_snapshot = dict(session)
+            interaction_writer.submit(session["email"], session["email"], query, response, session_snapshot)
+
+            set_sentiment()
+
+            # Clear predicates
+            prompt_handlers.clear(myBot.setPredicate, extra=QUERY_PREDICATES)
 
         return jsonify({"response": response}), 200
 
@@ -1780,8 +1456,7 @@ def analytics():
         return jsonify({"error": "Please log in to view analytics."}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         # Get comprehensive analytics data
         analytics_data = {
@@ -1799,7 +1474,6 @@ def analytics():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -1811,8 +1485,7 @@ def get_complete_graph_data():
         return jsonify({"error": "Not authenticated"}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
     except Exception as e:
         return jsonify({"error": "Database connection failed"}), 503
 
@@ -1908,7 +1581,6 @@ def get_complete_graph_data():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -1926,8 +1598,7 @@ def chat_history():
         return jsonify({"error": "Please log in to view chat history."}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         # Get chat history for the logged-in user
         chat_history = get_user_chat_history(session['email'], neo4j_session)
@@ -1940,7 +1611,6 @@ def chat_history():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -2022,10 +1692,12 @@ def get_interaction_statistics(email, neo4j_session):
 def logout():
     if "email" in session:
         end_episode(session["email"], session)
+        myBot.end_session(bot_session_id(session["email"]))
     session.clear()
     return redirect(url_for('login'))
 
 
 if __name__ == "__main__":
+    ensure_schema()
     dht11_sensor = DHT11SensoryMemoryManager()
     app.run(host='0.0.0.0', port='5001')
\ No newline at end of file
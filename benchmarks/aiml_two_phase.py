@@ -0,0 +1,89 @@
+"""
+AIML CPU time per message: respond(); prompt_check(); respond() against
+SessionKernel.respond_two_phase().
+
+Loads the bot's AIML files and answers a fixed set of queries with a stand-in
+prompt_check, both when it fills in a predicate (phase two re-renders) and
+when it changes nothing (phase two is skipped).  No database is needed:
+
+    python benchmarks/aiml_two_phase.py
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from glob import glob
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bot_sessions import SessionKernel
+
+
+QUERIES = [
+    "Hello",
+    "What is a computer",
+    "Who is my father",
+    "My name is Ahmed",
+    "Tell me a joke",
+    "What is the temperature",
+    "Where is Lahore",
+    "How are you",
+]
+
+
+def load_kernel():
+    kernel = SessionKernel()
+    kernel.verbose(False)
+    for file in glob(os.path.join(ROOT, "aiml files", "*.aiml")):
+        kernel.learn(file)
+    return kernel
+
+
+def resolve_nothing():
+    pass
+
+
+def make_resolver(kernel):
+    lookups = itertools.count()
+
+    def resolve_person():
+        kernel.setPredicate("person2", f"Person{next(lookups)}")
+    return resolve_person
+
+
+def legacy(kernel, query, between):
+    kernel.respond(query)
+    between()
+    return kernel.respond(query)
+
+
+def two_phase(kernel, query, between):
+    return kernel.respond_two_phase(query, between)
+
+
+def time_per_message(kernel, respond, between, repeats):
+    with kernel.session("benchmark"):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for query in QUERIES:
+                respond(kernel, query, between)
+        return (time.perf_counter() - start) * 1000 / (repeats * len(QUERIES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    kernel = load_kernel()
+    print(f"{'prompt_check':<18} {'legacy ms':>10} {'two-phase ms':>13} {'speedup':>8}")
+    for label, between in (("sets a predicate", make_resolver(kernel)), ("changes nothing", resolve_nothing)):
+        old = time_per_message(kernel, legacy, between, args.repeats)
+        new = time_per_message(kernel, two_phase, between, args.repeats)
+        print(f"{label:<18} {old:>10.3f} {new:>13.3f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+find_person cost: pytholog top-down queries against the materialised
+FamilyIndex, on synthetic family trees of increasing size.
+
+Each tree starts from one couple; every couple has --children children
+(alternating sons and daughters), each of whom marries someone from outside
+the tree and has children in turn, for --generations generations.  For every
+person and every relation below, the benchmark asks rel(Y, person) the way
+find_person does, and also reports how often the two engines agree:
+
+    python benchmarks/family_relations.py
+
+The engines are expected to disagree on sibling and every relation built on
+it, and on saas and sasur, where pytholog answers nothing; see family_index.
+--check pins FamilyIndex's answers for those relations on a fixture family
+and exits non-zero if any of them change:
+
+    python benchmarks/family_relations.py --check
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pytholog as pl
+
+from family_index import build_index
+
+
+RULES_PATH = os.path.join(ROOT, "prolog", "kb.pl")
+FIXTURE_PATH = os.path.join(ROOT, "benchmarks", "fixtures", "family.pl")
+# {relation: {person: sorted answers}}; a person not listed has no answers
+EXPECTED_PATH = os.path.join(ROOT, "benchmarks", "fixtures", "family_expected.json")
+
+RELATIONS = [
+    "father", "mother", "sibling", "brother", "sister", "grandfather", "grandmother",
+    "p_uncle", "p_aunt", "cousin", "taya", "chacha", "mama", "khala", "dada", "nani",
+    "saas", "sasur", "bahu", "damad", "bhatija", "pota", "nawasi", "bhanja",
+]
+
+
+def family_tree(generations, children):
+    facts, people = [], []
+    counter = [0]
+
+    def person(gender, year):
+        counter[0] += 1
+        name = f"{gender[0]}{counter[0]}"
+        facts.append(f"{gender}({name})")
+        facts.append(f"dob({name},date({year},{counter[0] % 12 + 1},{counter[0] % 28 + 1}))")
+        people.append(name)
+        return name
+
+    def couple(husband, wife):
+        facts.extend([f"married({husband},{wife})", f"husband({husband},{wife})", f"wife({wife},{husband})"])
+
+    couples = [(person("male", 1900), person("female", 1902))]
+    couple(*couples[0])
+    for generation in range(1, generations):
+        next_couples = []
+        for father, mother in couples:
+            for n in range(children):
+                year = 1900 + 25 * generation + n
+                if n % 2 == 0:
+                    child = person("male", year)
+                    spouse = person("female", year + 1)
+                    next_couples.append((child, spouse))
+                    couple(child, spouse)
+                else:
+                    child = person("female", year)
+                    spouse = person("male", year - 1)
+                    next_couples.append((spouse, child))
+                    couple(spouse, child)
+                facts.extend([f"parent({father},{child})", f"parent({mother},{child})"])
+        couples = next_couples
+    return facts, people
+
+
+def pytholog_answers(facts, people):
+    kb = pl.KnowledgeBase("benchmark")
+    with open(RULES_PATH) as f:
+        kb([line.strip().rstrip(".") for line in f])
+    kb(facts)
+    answers = {}
+    start = time.perf_counter()
+    for relation in RELATIONS:
+        for name in people:
+            try:
+                result = kb.query(pl.Expr(f"{relation}(Y,{name})"))
+            except Exception:
+                result = None
+            answers[relation, name] = {row["Y"] for row in result or [] if isinstance(row, dict)}
+    return answers, time.perf_counter() - start
+
+
+def index_answers(facts, people):
+    with tempfile.NamedTemporaryFile("w", suffix=".pl", delete=False) as f:
+        f.write("".join(fact + ".\n" for fact in facts))
+        fact_file = f.name
+    try:
+        start = time.perf_counter()
+        index = build_index(RULES_PATH, fact_file)
+        built = time.perf_counter() - start
+        answers = {(relation, name): set(index.subjects(relation, name))
+                   for relation in RELATIONS for name in people}
+        return answers, built, time.perf_counter() - start - built, index.size()
+    finally:
+        os.unlink(fact_file)
+
+
+def check_fixture():
+    """Every FamilyIndex answer on the fixture family that differs from the pinned ones"""
+    with open(EXPECTED_PATH) as f:
+        expected = json.load(f)
+    index = build_index(RULES_PATH, FIXTURE_PATH)
+    people = sorted(row[0] for gender in ("male", "female") for row in index.rows(gender))
+    mismatches = []
+    for relation, answers in expected.items():
+        for name in people:
+            found = sorted(index.subjects(relation, name))
+            if found != answers.get(name, []):
+                mismatches.append(f"{relation}(Y,{name}): expected {answers.get(name, [])}, got {found}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generations", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--children", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="compare against the pinned fixture answers and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_fixture()
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f"{len(mismatches)} mismatches against {os.path.relpath(EXPECTED_PATH, ROOT)}")
+        sys.exit(1 if mismatches else 0)
+
+    print(f"{'people':>6} {'facts':>6} {'derived':>8} {'pytholog s':>11} {'index build s':>14} "
+          f"{'lookups ms':>11} {'us/query pl/idx':>16} {'agree':>7}")
+    disagreements = set()
+    for generations in args.generations:
+        facts, people = family_tree(generations, args.children)
+        old, old_seconds = pytholog_answers(facts, people)
+        new, build_seconds, lookup_seconds, derived = index_answers(facts, people)
+        queries = len(RELATIONS) * len(people)
+        agree = sum(1 for key in new if new[key] == old[key])
+        disagreements.update(key[0] for key in new if new[key] != old[key])
+        print(f"{len(people):>6} {len(facts):>6} {derived:>8} {old_seconds:>11.3f} {build_seconds:>14.3f} "
+              f"{lookup_seconds * 1000:>11.2f} {old_seconds / queries * 1e6:>9.0f}/{lookup_seconds / queries * 1e6:<6.1f} "
+              f"{100.0 * agree / queries:>6.1f}%")
+    if disagreements:
+        print(f"\nRelations where pytholog differs (it cannot parse \\= or a parenthesised ';'): "
+              f"{', '.join(sorted(disagreements))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+% Fixture family for benchmarks/family_relations.py --check
+% Three generations: karim and zainab's four children, the family ahmed
+% married into, and their grandchildren.  tariq is older and imran younger
+% than ahmed, so ali has both a taya and a chacha.
+
+% Grandparents
+male(karim).
+female(zainab).
+married(karim,zainab).
+husband(karim,zainab).
+wife(zainab,karim).
+dob(karim,date(1930,3,12)).
+dob(zainab,date(1933,7,2)).
+
+male(rashid).
+female(fatima).
+married(rashid,fatima).
+husband(rashid,fatima).
+wife(fatima,rashid).
+dob(rashid,date(1932,1,20)).
+dob(fatima,date(1935,11,5)).
+
+% karim and zainab's children
+male(tariq).
+male(ahmed).
+female(sana).
+male(imran).
+parent(karim,tariq).
+parent(zainab,tariq).
+parent(karim,ahmed).
+parent(zainab,ahmed).
+parent(karim,sana).
+parent(zainab,sana).
+parent(karim,imran).
+parent(zainab,imran).
+dob(tariq,date(1955,4,18)).
+dob(ahmed,date(1958,9,30)).
+dob(sana,date(1960,2,14)).
+dob(imran,date(1963,6,8)).
+
+% rashid and fatima's children
+male(bilal).
+female(ayesha).
+female(hina).
+parent(rashid,bilal).
+parent(fatima,bilal).
+parent(rashid,ayesha).
+parent(fatima,ayesha).
+parent(rashid,hina).
+parent(fatima,hina).
+dob(bilal,date(1957,12,1)).
+dob(ayesha,date(1960,5,25)).
+dob(hina,date(1965,8,17)).
+
+% Spouses
+female(nadia).
+married(tariq,nadia).
+husband(tariq,nadia).
+wife(nadia,tariq).
+dob(nadia,date(1957,10,3)).
+
+married(ahmed,ayesha).
+husband(ahmed,ayesha).
+wife(ayesha,ahmed).
+
+male(usman).
+married(usman,sana).
+husband(usman,sana).
+wife(sana,usman).
+dob(usman,date(1958,3,9)).
+
+% Grandchildren
+male(omar).
+parent(tariq,omar).
+parent(nadia,omar).
+dob(omar,date(1982,1,15)).
+
+male(ali).
+female(maryam).
+parent(ahmed,ali).
+parent(ayesha,ali).
+parent(ahmed,maryam).
+parent(ayesha,maryam).
+dob(ali,date(1985,6,21)).
+dob(maryam,date(1988,12,2)).
+
+male(hamza).
+female(zara).
+parent(usman,hamza).
+parent(sana,hamza).
+parent(usman,zara).
+parent(sana,zara).
+dob(hamza,date(1986,9,9)).
+dob(zara,date(1990,4,4)).
+
+female(sara).
+married(ali,sara).
+husband(ali,sara).
+wife(sara,ali).
+dob(sara,date(1987,2,28)).
@@ -0,0 +1,352 @@
+"""
+Load generator for the sensor ingestion path.
+
+Simulates a fleet of virtual DHT11 devices and feeds their readings through
+the real managers in sensor_managers.py.  Readings go onto data_queue, are
+validated on the processing thread, become a snapshot and pass through
+sensor_filter, and sensor_buffer batches them to a sink.  Each device emits
+--rate readings per second: a slow drift with noise, rounded the way a
+DHT11 reports.
+
+    python benchmarks/sensor_fleet.py --devices 50 --rate 2 --seconds 30
+    python benchmarks/sensor_fleet.py --manager dht11 --devices 20 --rate 5
+    python benchmarks/sensor_fleet.py --sink neo4j        # real writes to NEO4J_URI
+
+Managers (--manager):
+
+    esp32   one ESP32DHT11SensoryMemoryManager; readings arrive through
+            queue_reading, as the poller delivers them
+    dht11   one DHT11SensoryMemoryManager per device, as each board has its
+            own serial port; frames arrive through queue_frame, as the
+            streaming reader delivers them
+
+Sinks (--sink):
+
+    memory  a stub session that counts nodes and rollup statements;
+            --write-latency adds a fixed time to every batch
+    neo4j   the database configured in neo4j_pool.py.  This writes real
+            DHT11:SensoryMemory nodes and rollups, and in dht11 mode one
+            User per device (virtual-<n>@sensor-fleet.local).
+
+Reported:
+
+  * throughput;
+  * end-to-end latency, from the moment a reading is emitted until
+    sensor_buffer has written its batch;
+  * readings dropped because a data_queue (maxsize 100) was full;
+  * the sensor_buffer and sensor_filter counters.
+
+When emission stops, whatever is still queued is processed and flushed
+before the report.
+"""
+import argparse
+import heapq
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from esp32_stub import comfort
+from sensor_buffer import sensor_buffer
+from sensor_filter import sensor_filter
+from sensor_managers import DHT11SensoryMemoryManager, ESP32DHT11SensoryMemoryManager
+
+
+class VirtualSensor:
+    """One virtual device: temperature and humidity drifting around a room's set point"""
+
+    def __init__(self, address, seed):
+        self.address = address
+        self._random = random.Random(seed)
+        self._base_temperature = self._random.uniform(19, 27)
+        self._base_humidity = self._random.uniform(35, 65)
+        self._phase = self._random.uniform(0, 2 * math.pi)
+        self.temperature = self._base_temperature
+        self.humidity = self._base_humidity
+
+    def _step(self, now):
+        # A slow swing (one cycle every ten minutes) plus sensor noise, kept within DHT11 range
+        swing = math.sin(now / 600 * 2 * math.pi + self._phase)
+        self.temperature = min(50, max(0, self._base_temperature + 1.5 * swing + self._random.gauss(0, 0.2)))
+        self.humidity = min(80, max(20, self._base_humidity - 4 * swing + self._random.gauss(0, 0.8)))
+
+    def frame(self, now):
+        """What a serial DHT11 board sends"""
+        self._step(now)
+        return {"temperature": round(self.temperature, 1), "humidity": float(round(self.humidity)),
+                "status": "valid"}
+
+    def esp32_reading(self, now):
+        """What an ESP32 answers on /sensor"""
+        frame = self.frame(now)
+        frame.update({
+            "timestamp": datetime.now().isoformat(),
+            "comfort_score": comfort(frame["temperature"], frame["humidity"]),
+            "recommendations": "Environmental conditions are optimal",
+            "esp32_ip": self.address,
+        })
+        return frame
+
+
+class LatencyTracker:
+    """Matches written readings to their emission times, per device and in order"""
+
+    def __init__(self):
+        self._pending = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.unmatched = 0
+
+    @staticmethod
+    def key(reading):
+        return reading["properties"].get("esp32_ip") or reading["email"]
+
+    def emitted(self, key, at):
+        with self._lock:
+            self._pending[key].append(at)
+
+    def written(self, readings):
+        now = time.monotonic()
+        with self._lock:
+            for reading in readings:
+                pending = self._pending.get(self.key(reading))
+                if pending:
+                    self.latencies.append(now - pending.popleft())
+                else:
+                    self.unmatched += 1
+
+    def outstanding(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+
+class _MemoryResult:
+    def __init__(self, written):
+        self._written = written
+
+    def single(self):
+        return {"written": self._written}
+
+    def consume(self):
+        return None
+
+
+class _MemoryTx:
+    def __init__(self, sink):
+        self._sink = sink
+
+    def run(self, query, parameters=None, **kwargs):
+        nodes = len(kwargs.get("readings", ()))
+        with self._sink.lock:
+            self._sink.nodes += nodes
+            self._sink.statements += 1
+        return _MemoryResult(nodes)
+
+
+class _MemorySession:
+    def __init__(self, sink):
+        self._sink = sink
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        if self._sink.write_latency:
+            time.sleep(self._sink.write_latency)
+        return transaction_function(_MemoryTx(self._sink), *args, **kwargs)
+
+
+class MemorySink:
+    """Session factory standing in for Neo4j: counts nodes and statements, optionally slowed down"""
+
+    def __init__(self, write_latency=0.0):
+        self.write_latency = write_latency
+        self.lock = threading.Lock()
+        self.nodes = 0
+        self.statements = 0
+
+    def __call__(self):
+        return _MemorySession(self)
+
+
+class _RecordingSession:
+    def __init__(self, session, tracker):
+        self._session = session
+        self._tracker = tracker
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._session.__exit__(exc_type, exc_value, traceback)
+
+    def execute_write(self, transaction_function, readings, *args, **kwargs):
+        result = self._session.execute_write(transaction_function, readings, *args, **kwargs)
+        self._tracker.written(readings)
+        return result
+
+
+class RecordingSessions:
+    """Wraps a session factory so every successfully written batch is reported to the tracker"""
+
+    def __init__(self, session_factory, tracker):
+        self.session_factory = session_factory
+        self.tracker = tracker
+
+    def __call__(self):
+        return _RecordingSession(self.session_factory(), self.tracker)
+
+
+def esp32_address(index):
+    return f"10.42.{index // 250}.{index % 250 + 1}"
+
+
+def build_fleet(kind, devices):
+    """(managers, [(device, deliver, manager, tracker key)]) with processing threads running"""
+    fleet = []
+    if kind == "esp32":
+        addresses = [esp32_address(i) for i in range(devices)]
+        manager = ESP32DHT11SensoryMemoryManager(addresses, connect=False)
+        managers = [manager]
+        for i, address in enumerate(addresses):
+            sensor = VirtualSensor(address, seed=i)
+            deliver = (lambda sensor: lambda now: manager.queue_reading(sensor.address, sensor.esp32_reading(now)))(sensor)
+            fleet.append((sensor, deliver, manager, address))
+    else:
+        managers = []
+        for i in range(devices):
+            manager = DHT11SensoryMemoryManager(port=f"virtual{i}", connect=False)
+            manager.set_current_user(f"virtual-{i}@sensor-fleet.local")
+            managers.append(manager)
+            sensor = VirtualSensor(manager.port, seed=i)
+            deliver = (lambda sensor, manager: lambda now: manager.queue_frame(sensor.frame(now)))(sensor, manager)
+            fleet.append((sensor, deliver, manager, manager.current_user_email))
+    # Per-reading info logging and queue-full warnings would swamp the report
+    logging.getLogger("sensor_managers").setLevel(logging.ERROR)
+    for manager in managers:
+        manager.start_processing()
+    return managers, fleet
+
+
+def emit(fleet, rate, seconds, tracker):
+    """Drive every device at `rate` readings per second for `seconds`; returns emitter counters"""
+    interval = 1 / rate
+    start = time.monotonic()
+    end = start + seconds
+    schedule = [(start + random.uniform(0, interval), index) for index in range(len(fleet))]
+    heapq.heapify(schedule)
+    counters = {"emitted": 0, "accepted": 0, "dropped": 0, "max_lag_seconds": 0.0}
+    while schedule:
+        due, index = heapq.heappop(schedule)
+        if due >= end:
+            break
+        now = time.monotonic()
+        if due > now:
+            time.sleep(due - now)
+            now = time.monotonic()
+        counters["max_lag_seconds"] = max(counters["max_lag_seconds"], now - due)
+
+        _, deliver, manager, key = fleet[index]
+        # Only this thread queues readings, so a change in the counter means this one was dropped
+        dropped_before = manager.dropped_readings
+        deliver(time.time())
+        counters["emitted"] += 1
+        if manager.dropped_readings != dropped_before:
+            counters["dropped"] += 1
+        else:
+            counters["accepted"] += 1
+            tracker.emitted(key, now)
+        heapq.heappush(schedule, (due + interval, index))
+    counters["seconds"] = time.monotonic() - start
+    return counters
+
+
+def drain(managers, timeout):
+    """Wait for the processing threads to empty their queues, then flush sensor_buffer"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and any(manager.data_queue.unfinished_tasks for manager in managers):
+        time.sleep(0.05)
+    sensor_buffer.flush()
+    for manager in managers:
+        manager.running = False
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+def report(args, counters, total_seconds, tracker, sink):
+    latencies = sorted(tracker.latencies)
+    buffer = sensor_buffer.metrics()
+    change = sensor_filter.stats()
+    offered = args.devices * args.rate
+    emitted = counters["emitted"]
+
+    print(f"{args.devices} {args.manager} devices at {args.rate}/s each ({offered:.0f}/s offered), "
+          f"{args.sink} sink, {counters['seconds']:.1f} s")
+    print(f"  emitted      {emitted:>9} ({emitted / counters['seconds']:.1f}/s, "
+          f"emitter max lag {counters['max_lag_seconds'] * 1000:.0f} ms)")
+    print(f"  dropped      {counters['dropped']:>9} ({counters['dropped'] / emitted:.1%} at full data_queue)"
+          if emitted else "  dropped              0")
+    print(f"  written      {len(latencies):>9} ({len(latencies) / total_seconds:.1f}/s end to end; "
+          f"{buffer['written']} nodes, {buffer['rolled_up_only']} rollup only)")
+    if tracker.outstanding() or tracker.unmatched:
+        print(f"  unaccounted  {tracker.outstanding():>9} (never written), {tracker.unmatched} unmatched")
+    print(f"  latency ms   p50 {percentile(latencies, 0.5) * 1000:.1f}  p90 {percentile(latencies, 0.9) * 1000:.1f}  "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f}  max {percentile(latencies, 1.0) * 1000:.1f}")
+    print(f"  buffer       {buffer['batches']} batches, avg {buffer['avg_batch_size']:.1f} readings, "
+          f"avg flush {buffer['avg_flush_seconds'] * 1000:.1f} ms, {buffer['failed_batches']} failed, "
+          f"{buffer['dropped']} dropped")
+    print(f"  filter       {change['suppressed_ratio']:.1%} suppressed by deadband")
+    if isinstance(sink, MemorySink):
+        print(f"  sink         {sink.nodes} nodes, {sink.statements} statements")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=1.0, help="readings per second per device")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--manager", choices=("esp32", "dht11"), default="esp32")
+    parser.add_argument("--sink", choices=("memory", "neo4j"), default="memory")
+    parser.add_argument("--write-latency", type=float, default=0.0, help="seconds per batch in the memory sink")
+    parser.add_argument("--batch-size", type=int, help="override SENSOR_BATCH_SIZE")
+    parser.add_argument("--flush-interval", type=float, help="override SENSOR_FLUSH_INTERVAL")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.batch_size:
+        sensor_buffer.batch_size = args.batch_size
+    if args.flush_interval:
+        sensor_buffer.flush_interval = args.flush_interval
+    if args.sink == "memory":
+        sink = MemorySink(args.write_latency)
+    else:
+        from neo4j_pool import get_neo4j_session
+        sink = get_neo4j_session
+    tracker = LatencyTracker()
+    sensor_buffer.session_factory = RecordingSessions(sink, tracker)
+
+    managers, fleet = build_fleet(args.manager, args.devices)
+    start = time.monotonic()
+    counters = emit(fleet, args.rate, args.seconds, tracker)
+    drain(managers, args.drain_timeout)
+    report(args, counters, time.monotonic() - start, tracker, sink)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Round-trip benchmark for sensory-memory ingestion.
+
+Compares the legacy per-sentence/per-word autocommit writer with the batched
+UNWIND writer in sensory_memory.py.  By default both run against a counting
+stub session, so no database is needed:
+
+    python benchmarks/sensory_memory_roundtrips.py
+
+Pass --neo4j to also time both writers against the database configured in
+neo4j_pool.py (writes real Text/Sentence/Word nodes).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from nltk import sent_tokenize, word_tokenize
+
+from sensory_memory import write_sensory_memory
+
+
+SAMPLE_SENTENCE = "My father is Ahmed and he lives in Lahore with my mother and sister."
+
+
+class _StubResult:
+    def single(self):
+        return {"text_id": "stub", "sentence_ids": [], "word_ids": []}
+
+
+class CountingSession:
+    """Stand-in for a Neo4j session that only counts round-trips"""
+
+    def __init__(self):
+        self.round_trips = 0
+
+    def run(self, query, parameters=None, **kwargs):
+        self.round_trips += 1
+        return _StubResult()
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        self.round_trips += 1
+        return transaction_function(_NoCountTx(), *args, **kwargs)
+
+
+class _NoCountTx:
+    def run(self, query, parameters=None, **kwargs):
+        return _StubResult()
+
+
+def legacy_save_sensory_memory(neo4j_session, text, timestamp, ip_address):
+    """The original writer: one autocommit statement per node and edge"""
+    neo4j_session.run("""
+        MERGE (t:Text:SensoryMemory {full_text: $text, timestamp: $timestamp, ip_address: $ip_address})
+    """, text=text, timestamp=timestamp, ip_address=ip_address)
+    prev_sentence = None
+    for sentence in sent_tokenize(text):
+        neo4j_session.run("""
+            MATCH (t:Text:SensoryMemory {full_text: $text})
+            MERGE (s:Sentence:SensoryMemory {sentence_text: $sentence})
+            MERGE (t)-[:HAS_A_SENTENCE]->(s)
+        """, text=text, sentence=sentence)
+        if prev_sentence:
+            neo4j_session.run("""
+                MATCH (s1:Sentence {sentence_text: $prev_sentence}), (s2:Sentence {sentence_text: $curr_sentence})
+                MERGE (s1)-[:NEXT_SENTENCE]->(s2)
+            """, prev_sentence=prev_sentence, curr_sentence=sentence)
+        prev_sentence = sentence
+        prev_word = None
+        for word in word_tokenize(sentence):
+            neo4j_session.run("""
+                MATCH (s:Sentence {sentence_text: $sentence})
+                MERGE (w:Word:SensoryMemory {word_text: $word})
+                MERGE (s)-[:HAS_A_WORD]->(w)
+            """, sentence=sentence, word=word)
+            if prev_word:
+                neo4j_session.run("""
+                    MATCH (w1:Word {word_text: $prev_word}), (w2:Word {word_text: $curr_word})
+                    MERGE (w1)-[:NEXT_WORD]->(w2)
+                """, prev_word=prev_word, curr_word=word)
+            prev_word = word
+
+
+def make_text(sentence_count):
+    return " ".join(SAMPLE_SENTENCE for _ in range(sentence_count))
+
+
+def count_round_trips(sizes):
+    print(f"{'sentences':>9} {'words':>6} {'legacy':>8} {'batched':>8}")
+    for size in sizes:
+        text = make_text(size)
+        words = sum(len(word_tokenize(s)) for s in sent_tokenize(text))
+        legacy = CountingSession()
+        legacy_save_sensory_memory(legacy, text, datetime.now().isoformat(), "127.0.0.1")
+        batched = CountingSession()
+        write_sensory_memory(batched, text, datetime.now().isoformat(), "127.0.0.1")
+        print(f"{size:>9} {words:>6} {legacy.round_trips:>8} {batched.round_trips:>8}")
+
+
+def time_against_neo4j(sizes, repeats):
+    from neo4j_pool import get_neo4j_session
+
+    print(f"\n{'sentences':>9} {'legacy ms':>10} {'batched ms':>11}")
+    neo4j_session = get_neo4j_session()
+    try:
+        for size in sizes:
+            text = make_text(size)
+            timings = []
+            for writer in (legacy_save_sensory_memory, write_sensory_memory):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    writer(neo4j_session, text, datetime.now().isoformat(), "127.0.0.1")
+                timings.append((time.perf_counter() - start) * 1000 / repeats)
+            print(f"{size:>9} {timings[0]:>10.1f} {timings[1]:>11.1f}")
+    finally:
+        neo4j_session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 3, 10, 30])
+    parser.add_argument("--neo4j", action="store_true", help="also time both writers against Neo4j")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    count_round_trips(args.sizes)
+    if args.neo4j:
+        time_against_neo4j(args.sizes, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
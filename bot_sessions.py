@@ -0,0 +1,190 @@
+"""
+Per-user AIML predicate sessions.
+
+aiml.Kernel keeps predicates per sessionID, but every call in the app used the
+default session and Kernel.respond() serialises all callers behind a single
+global lock.  SessionKernel maps each logged-in user or ESP32 device to its own
+session and replaces the global lock with one lock per session, so different
+users are answered in parallel while one user's requests stay ordered.
+
+Inside `with myBot.session(session_id):` every getPredicate/setPredicate/respond
+call that does not pass a sessionID goes to that session, so helpers such as
+prompt_check() and find_dob() need no extra argument.  The session is held in
+a context variable, so it follows the request thread (and copy_context()).
+
+Pattern matching only reads the shared brain; <learn> at request time would
+still modify it, so AIML files are learned once at startup.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+import aiml
+from aiml import Utils
+
+
+_current_session = contextvars.ContextVar("aiml_session", default=None)
+
+
+def bot_session_id(email, device=None):
+    """Predicate session key for a user, or for one of their devices"""
+    return f"{device}:{email}" if device else f"user:{email}"
+
+
+class SessionKernel(aiml.Kernel):
+    def __init__(self):
+        super().__init__()
+        self._session_locks = {}
+        self._session_locks_guard = threading.Lock()
+
+    def _resolve_session(self, sessionID):
+        if sessionID is not None:
+            return sessionID
+        return _current_session.get() or self._globalSessionID
+
+    def session_lock(self, sessionID):
+        with self._session_locks_guard:
+            lock = self._session_locks.get(sessionID)
+            if lock is None:
+                lock = self._session_locks[sessionID] = threading.RLock()
+            return lock
+
+    @contextmanager
+    def session(self, sessionID):
+        """Hold `sessionID`'s lock and make it the default session in this block"""
+        with self.session_lock(sessionID):
+            self._addSession(sessionID)
+            token = _current_session.set(sessionID)
+            try:
+                yield sessionID
+            finally:
+                _current_session.reset(token)
+
+    def current_session(self):
+        return self._resolve_session(None)
+
+    def end_session(self, sessionID):
+        """Forget a session's predicates and history, e.g. on logout"""
+        with self.session_lock(sessionID):
+            self._deleteSession(sessionID)
+        with self._session_locks_guard:
+            self._session_locks.pop(sessionID, None)
+
+    def getPredicate(self, name, sessionID=None):
+        return super().getPredicate(name, self._resolve_session(sessionID))
+
+    def setPredicate(self, name, value, sessionID=None):
+        super().setPredicate(name, value, self._resolve_session(sessionID))
+
+    def respond(self, input_, sessionID=None):
+        """Kernel.respond() with a per-session lock instead of the global one"""
+        if len(input_) == 0:
+            return u""
+        sessionID = self._resolve_session(sessionID)
+
+        try:
+            input_ = self._cod.dec(input_)
+        except (UnicodeError, AttributeError):
+            pass
+
+        with self.session_lock(sessionID):
+            self._addSession(sessionID)
+            finalResponse = u""
+            for s in Utils.sentences(input_):
+                inputHistory = self.getPredicate(self._inputHistory, sessionID)
+                inputHistory.append(s)
+                while len(inputHistory) > self._maxHistorySize:
+                    inputHistory.pop(0)
+
+                response = self._respond(s, sessionID)
+
+                outputHistory = self.getPredicate(self._outputHistory, sessionID)
+                outputHistory.append(response)
+                while len(outputHistory) > self._maxHistorySize:
+                    outputHistory.pop(0)
+
+                finalResponse += (response + u"  ")
+            return self._cod.enc(finalResponse.strip())
+
+    def _match(self, input_, sessionID):
+        outputHistory = self.getPredicate(self._outputHistory, sessionID)
+        that = outputHistory[-1] if outputHistory else ""
+        return self._brain.match(self._subbers['normal'].sub(input_),
+                                 self._subbers['normal'].sub(that),
+                                 self._subbers['normal'].sub(self.getPredicate("topic", sessionID)))
+
+    def _render(self, elem, input_, sessionID, that=None):
+        # <star/> re-reads the current input from the input stack, and <star/>,
+        # <thatstar/> and <that/> the last output, so a re-render puts back the
+        # output that was last when the template was matched
+        inputStack = self.getPredicate(self._inputStack, sessionID)
+        outputHistory = self.getPredicate(self._outputHistory, sessionID)
+        inputStack.append(input_)
+        if that is not None:
+            outputHistory.append(that)
+        try:
+            return self._processElement(elem, sessionID).strip()
+        finally:
+            inputStack.pop()
+            if that is not None:
+                outputHistory.pop()
+
+    def _predicates(self, sessionID):
+        reserved = (self._inputHistory, self._outputHistory, self._inputStack)
+        return {name: value for name, value in self._sessions[sessionID].items() if name not in reserved}
+
+    def respond_two_phase(self, input_, between=None, sessionID=None):
+        """
+        Replacement for respond(); between(); respond().
+
+        Phase one matches each sentence and renders its template, which runs
+        the <set>s that between() (prompt_check) acts on.  Phase two
+        re-renders the same matched templates against the predicates between()
+        filled in, without matching again; if between() changed nothing, the
+        phase one text is returned as is.  The input and output history get
+        one entry per sentence, as with a single respond().
+        """
+        if len(input_) == 0:
+            return u""
+        sessionID = self._resolve_session(sessionID)
+
+        try:
+            input_ = self._cod.dec(input_)
+        except (UnicodeError, AttributeError):
+            pass
+
+        with self.session_lock(sessionID):
+            self._addSession(sessionID)
+            topic = self.getPredicate("topic", sessionID)
+            inputHistory = self.getPredicate(self._inputHistory, sessionID)
+            outputHistory = self.getPredicate(self._outputHistory, sessionID)
+
+            matched, responses = [], []
+            for s in Utils.sentences(input_):
+                inputHistory.append(s)
+                while len(inputHistory) > self._maxHistorySize:
+                    inputHistory.pop(0)
+                that = outputHistory[-1] if outputHistory else u""
+                elem = self._match(s, sessionID)
+                response = self._render(elem, s, sessionID) if elem is not None else u""
+                matched.append((s, elem, that))
+                responses.append(response)
+                outputHistory.append(response)
+                while len(outputHistory) > self._maxHistorySize:
+                    outputHistory.pop(0)
+
+            if between is not None:
+                before = self._predicates(sessionID)
+                between()
+                if self._predicates(sessionID) != before:
+                    # Stars are resolved against the topic and that the match was made under
+                    self.setPredicate("topic", topic, sessionID)
+                    responses = [self._render(elem, s, sessionID, that) if elem is not None else u""
+                                 for s, elem, that in matched]
+                    kept = min(len(responses), len(outputHistory))
+                    outputHistory[len(outputHistory) - kept:] = responses[len(responses) - kept:]
+
+            return self._cod.enc(u"  ".join(responses).strip())
+
+    def session_count(self):
+        return len(self._sessions)
@@ -0,0 +1,165 @@
+"""
+Precompiled AIML brain.
+
+Learning the "aiml files" directory means parsing every category's XML on each
+process start (and again when conversation.py re-imports app).  load_brain()
+instead restores the pattern graph from a pickled snapshot, as long as the
+snapshot was built from the same AIML sources.  Otherwise it learns the files
+and rewrites the snapshot.  The sources are identified by a SHA-256 over every
+file's name and contents together with the Python and python-aiml versions.
+The snapshot holds the same three PatternMgr fields as Kernel.saveBrain(), but
+pickle restores them several times faster than saveBrain's marshal format.
+
+Configuration (environment, with defaults):
+
+    AIML_BRAIN_SNAPSHOT   aiml_brain.brn   (empty string disables the snapshot)
+
+    python brain_snapshot.py           # rebuild the snapshot, time both load paths
+    python brain_snapshot.py --check   # only report whether the snapshot is fresh
+"""
+import argparse
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import time
+from glob import glob
+
+import aiml
+from aiml.constants import VERSION as AIML_VERSION
+
+
+logger = logging.getLogger(__name__)
+
+AIML_GLOB = "aiml files/*.aiml"
+SNAPSHOT_PATH = os.environ.get("AIML_BRAIN_SNAPSHOT", "aiml_brain.brn")
+
+
+def source_hash(files):
+    digest = hashlib.sha256()
+    digest.update(f"python {sys.version_info[:2]} python-aiml {AIML_VERSION}\n".encode())
+    for file in sorted(files):
+        digest.update(os.path.basename(file).encode() + b"\0")
+        with open(file, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def read_meta(snapshot_path):
+    """The snapshot header: source hash, file and category counts"""
+    try:
+        with open(snapshot_path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+
+def is_fresh(files, snapshot_path=SNAPSHOT_PATH, digest=None):
+    meta = read_meta(snapshot_path)
+    return bool(meta) and meta.get("hash") == (digest or source_hash(files))
+
+
+def save_snapshot(kernel, files, snapshot_path=SNAPSHOT_PATH, digest=None):
+    """Write the header and the kernel's pattern graph, replacing the file atomically"""
+    brain = kernel._brain
+    meta = {
+        "hash": digest or source_hash(files),
+        "files": len(files),
+        "categories": kernel.numCategories(),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump((brain._templateCount, brain._botName, brain._root), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+    return meta
+
+
+def restore_snapshot(kernel, snapshot_path=SNAPSHOT_PATH):
+    """Load the pattern graph into `kernel`, replacing its brain"""
+    brain = kernel._brain
+    # The graph is hundreds of thousands of small dicts and lists; the cycle
+    # collector would otherwise run repeatedly while they are created.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(snapshot_path, "rb") as f:
+            pickle.load(f)
+            brain._templateCount, brain._botName, brain._root = pickle.load(f)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def learn_files(kernel, files):
+    for file in files:
+        kernel.learn(file)
+
+
+def load_brain(kernel, files=None, snapshot_path=SNAPSHOT_PATH):
+    """
+    Fill `kernel` from the snapshot when it matches `files`, otherwise learn
+    the files and rewrite the snapshot.  Returns how the brain was loaded and
+    how long it took.
+    """
+    files = sorted(files if files is not None else glob(AIML_GLOB))
+    start = time.perf_counter()
+    digest = source_hash(files)
+    source = "learned"
+
+    if snapshot_path and is_fresh(files, snapshot_path, digest):
+        try:
+            restore_snapshot(kernel, snapshot_path)
+            source = "snapshot"
+        except Exception as e:
+            logger.warning(f"AIML brain snapshot {snapshot_path} unreadable, relearning: {e}")
+            kernel.resetBrain()
+
+    if source == "learned":
+        learn_files(kernel, files)
+        if snapshot_path:
+            try:
+                save_snapshot(kernel, files, snapshot_path, digest)
+            except OSError as e:
+                logger.warning(f"Could not write AIML brain snapshot {snapshot_path}: {e}")
+
+    report = {
+        "source": source,
+        "seconds": round(time.perf_counter() - start, 3),
+        "categories": kernel.numCategories(),
+        "files": len(files),
+    }
+    logger.info(f"AIML brain {source}: {report['categories']} categories from {report['files']} files "
+                f"in {report['seconds']}s")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Build and check the precompiled AIML brain")
+    arg_parser.add_argument("--check", action="store_true", help="only report whether the snapshot is fresh")
+    args = arg_parser.parse_args()
+
+    aiml_files = sorted(glob(AIML_GLOB))
+    if args.check:
+        fresh = is_fresh(aiml_files)
+        print(f"{SNAPSHOT_PATH}: {'fresh' if fresh else 'stale or missing'} ({read_meta(SNAPSHOT_PATH)})")
+        sys.exit(0 if fresh else 1)
+
+    learning = aiml.Kernel()
+    learning.verbose(False)
+    start = time.perf_counter()
+    learn_files(learning, aiml_files)
+    learn_seconds = time.perf_counter() - start
+    meta = save_snapshot(learning, aiml_files)
+
+    restoring = aiml.Kernel()
+    restoring.verbose(False)
+    report = load_brain(restoring, aiml_files)
+    print(f"{meta['categories']} categories from {meta['files']} files")
+    print(f"learn from XML:     {learn_seconds:.3f}s")
+    print(f"load from snapshot: {report['seconds']:.3f}s ({report['source']})")
@@ -12,297 +12,12 @@ import secrets
 import time
 from datetime import datetime
 from app import *
-import serial
 import json
-import threading
 import time
 from datetime import datetime
-import queue
-import logging
-
-
-class ESP32DHT11SensoryMemoryManager:
-    def __init__(self, esp32_ip="192.168.43.23"):  # Your ESP32 IP from logs
-        self.esp32_ip = esp32_ip
-        self.sensor_endpoint = f"http://{esp32_ip}/sensor"
-        self.esp32_status_endpoint = f"http://{esp32_ip}/"
-
-        self.sensor_data = {
-            'temperature': None,
-            'humidity': None,
-            'timestamp': None,
-            'sensor_type': 'DHT11',
-            'memory_type': 'SensoryMemory',
-            'status': 'disconnected',
-            'comfort_score': 0,
-            'recommendations': []
-        }
-
-        self.data_queue = queue.Queue(maxsize=100)
-        self.running = False
-        self.lock = threading.Lock()
-        self.current_user_email = None
-
-        # Setup logging
-        logging.basicConfig(level=logging.INFO)
-        self.logger = logging.getLogger(__name__)
-
-        # Test connection and start monitoring
-        self.connect()
-
-    def connect(self):
-        """Test ESP32 connection and start monitoring"""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(self.esp32_status_endpoint, timeout=5)
-                if response.status_code == 200:
-                    self.running = True
-                    self.sensor_data['status'] = 'connected'
-                    self.logger.info(f"Connected to ESP32 DHT11 on {self.esp32_ip}")
-
-                    # Start monitoring thread
-                    self.start_monitoring()
-                    return True
-
-            except Exception as e:
-                self.logger.error(f"ESP32 connection attempt {attempt + 1} failed: {e}")
-                if attempt == max_retries - 1:
-                    self.sensor_data['status'] = 'error'
-                    self.logger.warning("ESP32 DHT11 sensor unavailable - continuing without sensor")
-                    return False
-                time.sleep(2)
-
-    def start_monitoring(self):
-        """Start background monitoring thread"""
-        self.reader_thread = threading.Thread(target=self.read_sensor_data, daemon=True)
-        self.processor_thread = threading.Thread(target=self.process_sensor_data, daemon=True)
-
-        self.reader_thread.start()
-        self.processor_thread.start()
-
-    def read_sensor_data(self):
-        """Continuous reading thread for ESP32 sensor data"""
-        while self.running:
-            try:
-                response = requests.get(self.sensor_endpoint, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
-                    self.data_queue.put(data, timeout=1)
-                else:
-                    self.logger.warning(f"ESP32 sensor request failed: {response.status_code}")
-
-            except requests.RequestException as e:
-                self.logger.error(f"ESP32 sensor read error: {e}")
-                with self.lock:
-                    self.sensor_data['status'] = 'disconnected'
-
-            except Exception as e:
-                self.logger.error(f"Unexpected sensor read error: {e}")
-
-            time.sleep(30)  # Read every 30 seconds
-
-    def process_sensor_data(self):
-        """Process queued sensor data from ESP32"""
-        while self.running:
-            try:
-                data = self.data_queue.get(timeout=1)
-
-                with self.lock:
-                    if self.validate_sensor_data(data):
-                        # Update sensor data with ESP32 information
-                        self.sensor_data.update({
-                            'temperature': data.get('temperature'),
-                            'humidity': data.get('humidity'),
-                            'timestamp': data.get('timestamp'),
-                            'sensor_type': 'DHT11',
-                            'memory_type': 'SensoryMemory',
-                            'status': data.get('status', 'valid'),
-                            'comfort_score': data.get('comfort_score', 0),
-                            'recommendations': data.get('recommendations', '').split('; ') if data.get(
-                                'recommendations') else [],
-                            'python_timestamp': datetime.now().isoformat(),
-                            'esp32_ip': data.get('esp32_ip')
-                        })
-
-                        # Save to Neo4j
-                        threading.Thread(
-                            target=self.save_esp32_sensory_memory,
-                            args=(data.copy(),),
-                            daemon=True
-                        ).start()
-
-                        self.logger.info(f"ESP32 DHT11 updated: {data.get('temperature')}°C, {data.get('humidity')}%")
-
-                self.data_queue.task_done()
-
-            except queue.Empty:
-                continue
-            except Exception as e:
-                self.logger.error(f"ESP32 data processing error: {e}")
-
-    def validate_sensor_data(self, data):
-        """Validate ESP32 DHT11 sensor data"""
-        if not isinstance(data, dict):
-            return False
-
-        # Check if data has required fields
-        if 'temperature' not in data or 'humidity' not in data:
-            return False
-
-        temp = data.get('temperature')
-        humidity = data.get('humidity')
-
-        # Validate data ranges
-        if temp is not None and (temp < -40 or temp > 80):  # Extended range for ESP32
-            self.logger.warning(f"Temperature out of range: {temp}")
-            return False
-
-        if humidity is not None and (humidity < 0 or humidity > 100):
-            self.logger.warning(f"Humidity out of range: {humidity}")
-            return False
-
-        return True
-
-    def save_esp32_sensory_memory(self, sensor_data):
-        """Save ESP32 DHT11 data to Neo4j as DHT11:SensoryMemory"""
-        try:
-            driver = connect_neo4j()
-            if not driver:
-                self.logger.warning("Neo4j not available, skipping ESP32 sensor data save")
-                return
-
-            neo4j_session = driver.session()
-            timestamp = datetime.now().isoformat()
-
-            # Create DHT11:SensoryMemory node with ESP32 data
-            neo4j_session.run("""
-                CREATE (s:DHT11:SensoryMemory {
-                    temperature: $temperature,
-                    humidity: $humidity,
-                    timestamp: $timestamp,
-                    sensor_type: $sensor_type,
-                    memory_type: $memory_type,
-                    status: $status,
-                    data_quality: $quality,
-                    comfort_score: $comfort_score,
-                    recommendations: $recommendations,
-                    data_source: $data_source,
-                    esp32_ip: $esp32_ip,
-                    unit_temperature: 'Celsius',
-                    unit_humidity: 'Percent'
-                })
-            """,
-                              temperature=sensor_data.get('temperature'),
-                              humidity=sensor_data.get('humidity'),
-                              timestamp=timestamp,
-                              sensor_type='DHT11',
-                              memory_type='SensoryMemory',
-                              status=sensor_data.get('status', 'valid'),
-                              quality='esp32_validated',
-                              comfort_score=sensor_data.get('comfort_score', 0),
-                              recommendations=sensor_data.get('recommendations', ''),
-                              data_source='ESP32',
-                              esp32_ip=sensor_data.get('esp32_ip', self.esp32_ip)
-                              )
-
-            # Link to current user if available
-            if hasattr(self, 'current_user_email') and self.current_user_email:
-                neo4j_session.run("""
-                    MATCH (u:User {email: $email}), (s:DHT11:SensoryMemory {timestamp: $timestamp})
-                    MERGE (u)-[:HAS_SENSOR_READING]->(s)
-                """, email=self.current_user_email, timestamp=timestamp)
-
-            neo4j_session.close()
-            driver.close()
-
-            self.logger.info(f"Saved ESP32 DHT11:SensoryMemory - Temp: {sensor_data.get('temperature')}°C")
-
-        except Exception as e:
-            self.logger.error(f"Neo4j ESP32 save error: {e}")
-
-    def set_current_user(self, email):
-        """Set current user for sensor data linking"""
-        self.current_user_email = email
-        self.logger.info(f"ESP32 DHT11 sensor linked to user: {email}")
-
-    def get_latest_readings(self):
-        """Thread-safe data access"""
-        with self.lock:
-            return self.sensor_data.copy()
-
-    def get_environmental_context(self):
-        """Get comprehensive environmental context from ESP32"""
-        with self.lock:
-            data = self.sensor_data.copy()
-
-            if data['status'] not in ['valid', 'connected']:
-                return None
-
-            temp = data.get('temperature')
-            humidity = data.get('humidity')
-
-            if temp is None or humidity is None:
-                return None
-
-            return {
-                'temperature': temp,
-                'humidity': humidity,
-                'comfort_level': data.get('comfort_score', 0),
-                'recommendations': data.get('recommendations', []),
-                'timestamp': data.get('timestamp'),
-                'sensor_type': 'DHT11',
-                'memory_type': 'SensoryMemory',
-                'data_source': 'ESP32',
-                'esp32_ip': data.get('esp32_ip')
-            }
-
-    def calculate_comfort_score(self, temp, humidity):
-        """Calculate comfort score (handled by ESP32, but kept for compatibility)"""
-        temp_score = max(0, min(100, 100 - abs(temp - 23) * 10))
-        humidity_score = max(0, min(100, 100 - abs(humidity - 50) * 2))
-        return (temp_score + humidity_score) / 2
-
-    def get_recommendations(self, temp, humidity):
-        """Get environmental recommendations (handled by ESP32, but kept for compatibility)"""
-        recommendations = []
-
-        if temp > 26:
-            recommendations.append("Room temperature is high - consider cooling")
-        elif temp < 20:
-            recommendations.append("Room temperature is low - consider warming")
-
-        if humidity > 60:
-            recommendations.append("Humidity is high - consider dehumidifying")
-        elif humidity < 40:
-            recommendations.append("Humidity is low - consider humidifying")
-
-        if not recommendations:
-            recommendations.append("Environmental conditions are optimal")
-
-        return recommendations
-
-    def disconnect(self):
-        """Clean shutdown"""
-        self.running = False
-        self.logger.info("ESP32 DHT11 sensor manager disconnected")
-
-    def get_esp32_status(self):
-        """Get ESP32 device status"""
-        try:
-            response = requests.get(self.esp32_status_endpoint, timeout=3)
-            if response.status_code == 200:
-                return {
-                    'status': 'connected',
-                    'ip': self.esp32_ip,
-                    'response_time': response.elapsed.total_seconds()
-                }
-        except Exception as e:
-            return {
-                'status': 'disconnected',
-                'error': str(e),
-                'ip': self.esp32_ip
-            }
+from sensor_buffer import sensor_buffer
+from sensor_filter import sensor_filter
+from sensor_managers import ESP32DHT11SensoryMemoryManager
 
 
 # Initialize global ESP32 sensor manager
@@ -312,7 +27,7 @@ dht11_sensor = ESP32DHT11SensoryMemoryManager()
 # Updated functions to work with ESP32 system
 def get_dht11_temperature():
     """Get current temperature from ESP32 DHT11 sensor"""
-    temp = dht11_sensor.get_latest_readings().get('temperature')
+    temp = dht11_sensor.snapshot.temperature
     if temp is not None:
         myBot.setPredicate("dht11_temperature", str(temp))
         myBot.setPredicate("dht11_temp_unit", "°C")
@@ -325,7 +40,7 @@ def get_dht11_temperature():
 
 def get_dht11_humidity():
     """Get current humidity from ESP32 DHT11 sensor"""
-    humidity = dht11_sensor.get_latest_readings().get('humidity')
+    humidity = dht11_sensor.snapshot.humidity
     if humidity is not None:
         myBot.setPredicate("dht11_humidity", str(humidity))
         myBot.setPredicate("dht11_humidity_unit", "%")
@@ -338,8 +53,7 @@ def get_dht11_humidity():
 
 def get_dht11_status():
     """Get ESP32 DHT11 sensor status"""
-    data = dht11_sensor.get_latest_readings()
-    status = data.get('status', 'unknown')
+    status = dht11_sensor.snapshot.status
     myBot.setPredicate("dht11_status", status)
     myBot.setPredicate("sensor_type", "DHT11")
     myBot.setPredicate("data_source", "ESP32")
@@ -348,7 +62,7 @@ def get_dht11_status():
 
 def analyze_dht11_environment():
     """Analyze environment using ESP32 DHT11 readings"""
-    context = dht11_sensor.get_environmental_context()
+    context = dht11_sensor.snapshot.context
 
     if context:
         myBot.setPredicate("dht11_comfort_score", str(int(context['comfort_level'])))
@@ -362,45 +76,10 @@ def analyze_dht11_environment():
 
 
 def get_dht11_memory_data():
-    """Get recent ESP32 DHT11 sensory memory data from Neo4j"""
-    try:
-        driver = connect_neo4j()
-        if not driver:
-            return []
-
-        neo4j_session = driver.session()
-
-        # Get recent DHT11 readings from ESP32
-        query = """
-        MATCH (s:DHT11:SensoryMemory)
-        WHERE s.data_source = 'ESP32'
-        RETURN s.temperature as temp, s.humidity as humidity, s.timestamp as timestamp, 
-               s.comfort_score as comfort_score, s.recommendations as recommendations
-        ORDER BY s.timestamp DESC
-        LIMIT 10
-        """
-
-        result = neo4j_session.run(query)
-        readings = []
-
-        for record in result:
-            readings.append({
-                'temperature': record['temp'],
-                'humidity': record['humidity'],
-                'timestamp': record['timestamp'],
-                'comfort_score': record['comfort_score'],
-                'recommendations': record['recommendations'],
-                'data_source': 'ESP32'
-            })
-
-        neo4j_session.close()
-        driver.close()
-
-        return readings
-
-    except Exception as e:
-        print(f"Error retrieving ESP32 DHT11 memory data: {e}")
-        return []
+    """Get the current user's recent ESP32 DHT11 readings, from memory once the sensor has seen enough of them"""
+    # From the device that sent the latest reading
+    esp32_ip = dht11_sensor.snapshot.readings.get('esp32_ip') or dht11_sensor.esp32_ip
+    return dht11_sensor.recent_for(esp32_ip).latest(dht11_sensor.current_user_email, 10)
 
 
 def get_esp32_device_status():
@@ -472,63 +151,52 @@ def get_bot_response(query, user_email=None, user_fact_file=None, username=None)
                 f.write("fact(user, voice_enabled, true).\n")
 
         # Load knowledge base
-        kb.from_file(fact_file)
+        knowledge_bases.activate(fact_file)
 
-        # Set bot predicate
-        myBot.setPredicate("username", user_name)
+        with myBot.session(bot_session_id(email)):
+            # Set bot predicate
+            myBot.setPredicate("username", user_name)
 
-        # Process the query
-        myBot.respond(query)
-        prompt_check()
-        response = myBot.respond(query)
+            # Match once, resolve prompt_check, then re-render the matched template
+            response = myBot.respond_two_phase(query, prompt_check)
 
-        # ENHANCED interaction logging
-        print(f"DEBUG: Checking interaction logging for email: {email}")
+            # ENHANCED interaction logging
+            print(f"DEBUG: Checking interaction logging for email: {email}")
 
-        # Log interaction for ALL users (not just non-default)
-        if email and email.strip() != "":
-            try:
-                print(f"DEBUG: Starting interaction logging for {email}")
+            # Log interaction for ALL users (not just non-default)
+            if email and email.strip() != "":
+                try:
+                    print(f"DEBUG: Starting interaction logging for {email}")
 
-                mock_session = {
-                    'email': email,
-                    'username': user_name,
-                    'fact_file': fact_file
-                }
+                    mock_session = {
+                        'email': email,
+                        'username': user_name,
+                        'fact_file': fact_file
+                    }
 
-                print(f"DEBUG: Mock session created: {mock_session}")
+                    print(f"DEBUG: Mock session created: {mock_session}")
 
-                # # Try synchronous call first for debugging
-                # print(f"DEBUG: Calling async_create_interaction synchronously...")
-                # async_create_interaction(email, query, response, mock_session)
-                # print(f"DEBUG: Synchronous call completed successfully")
+                    # # Try synchronous call first for debugging
+                    # print(f"DEBUG: Calling async_create_interaction synchronously...")
+                    # async_create_interaction(email, query, response, mock_session)
+                    # print(f"DEBUG: Synchronous call completed successfully")
 
-                # Then do async call
-                print(f"DEBUG: Starting async thread...")
-                thread = Thread(target=async_create_interaction, args=(email, query, response, mock_session))
-                thread.daemon = True
-                thread.start()
-                print(f"DEBUG: Async thread started")
+                    # Then queue it for the interaction writer
+                    print(f"DEBUG: Queueing interaction...")
+                    interaction_writer.submit(email, email, query, response, mock_session)
+                    print(f"DEBUG: Interaction queued")
 
-            except Exception as e:
-                print(f"ERROR: Interaction logging failed: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            print(f"DEBUG: Skipping interaction logging - no valid email")
+                except Exception as e:
+                    print(f"ERROR: Interaction logging failed: {e}")
+                    import traceback
+                    traceback.print_exc()
+            else:
+                print(f"DEBUG: Skipping interaction logging - no valid email")
 
-        set_sentiment()
+            set_sentiment()
 
-        # Clear predicates
-        for key in [
-            "mood", "word", "dob_person", "age_person", "gender_person",
-            "rel", "person1", "gender", "dob", "relation", "person",
-            "other_dob_person", "other_dob", "other_gender_person", "other_gender",
-            "other_person1", "other_person2", "other_relation", "delete", "user_input_name",
-            "get_dht11_temperature", "get_dht11_humidity", "get_dht11_status",
-            "analyze_dht11_environment", "get_dht11_memory"
-        ]:
-            myBot.setPredicate(key, "")
+            # Clear predicates
+            prompt_handlers.clear(myBot.setPredicate, extra=QUERY_PREDICATES)
 
         return {
             "response": response,
@@ -548,6 +216,14 @@ def get_bot_response(query, user_email=None, user_fact_file=None, username=None)
         }
 
 
+# Readings get_bot_response_with_sensor() sets before matching
+SENSOR_PREDICATES = (
+    "dht11_temperature", "dht11_humidity", "dht11_status",
+    "dht11_comfort_score", "dht11_recommendations", "sensor_type",
+    "dht11_temp_unit", "dht11_humidity_unit",
+)
+
+
 def get_bot_response_with_sensor(query, user_email, user_fact_file, username, sensor_data):
     """Enhanced bot response with sensor data integration"""
     if not query or query.strip() == "":
@@ -566,62 +242,52 @@ def get_bot_response_with_sensor(query, user_email, user_fact_file, username, se
                 f.write("fact(user, voice_enabled, true).\n")
 
         # Load knowledge base
-        kb.from_file(user_fact_file)
-
-        # Set bot predicate
-        myBot.setPredicate("username", username)
-
-        # Set sensor data predicates if available
-        if sensor_data and sensor_data.get('status') == 'valid':
-            myBot.setPredicate("dht11_temperature", str(sensor_data.get('temperature', 'unavailable')))
-            myBot.setPredicate("dht11_humidity", str(sensor_data.get('humidity', 'unavailable')))
-            myBot.setPredicate("dht11_comfort_score", str(int(sensor_data.get('comfort_score', 0))))
-            myBot.setPredicate("dht11_recommendations", sensor_data.get('recommendations', 'No recommendations'))
-            myBot.setPredicate("dht11_status", "valid")
-            myBot.setPredicate("sensor_type", "DHT11")
-            myBot.setPredicate("dht11_temp_unit", "°C")
-            myBot.setPredicate("dht11_humidity_unit", "%")
-        else:
-            myBot.setPredicate("dht11_temperature", "unavailable")
-            myBot.setPredicate("dht11_humidity", "unavailable")
-            myBot.setPredicate("dht11_status", "error")
+        knowledge_bases.activate(user_fact_file)
+
+        with myBot.session(bot_session_id(user_email, device="esp32")):
+            # Set bot predicate
+            myBot.setPredicate("username", username)
+
+            # Set sensor data predicates if available
+            if sensor_data and sensor_data.get('status') == 'valid':
+                myBot.setPredicate("dht11_temperature", str(sensor_data.get('temperature', 'unavailable')))
+                myBot.setPredicate("dht11_humidity", str(sensor_data.get('humidity', 'unavailable')))
+                myBot.setPredicate("dht11_comfort_score", str(int(sensor_data.get('comfort_score', 0))))
+                myBot.setPredicate("dht11_recommendations", sensor_data.get('recommendations', 'No recommendations'))
+                myBot.setPredicate("dht11_status", "valid")
+                myBot.setPredicate("sensor_type", "DHT11")
+                myBot.setPredicate("dht11_temp_unit", "°C")
+                myBot.setPredicate("dht11_humidity_unit", "%")
+            else:
+                myBot.setPredicate("dht11_temperature", "unavailable")
+                myBot.setPredicate("dht11_humidity", "unavailable")
+                myBot.setPredicate("dht11_status", "error")
 
-        # Process the query
-        myBot.respond(query)
-        prompt_check()
-        response = myBot.respond(query)
+            # Match once, resolve prompt_check, then re-render the matched template
+            response = myBot.respond_two_phase(query, prompt_check)
 
-        # Log interaction
-        try:
-            mock_session = {
-                'email': user_email,
-                'username': username,
-                'fact_file': user_fact_file
-            }
-            Thread(target=async_create_interaction, args=(user_email, query, response, mock_session)).start()
-        except Exception as e:
-            print(f"Interaction logging error: {e}")
-
-        # Save sensor data to Neo4j if available
-        if sensor_data and sensor_data.get('status') == 'valid':
+            # Log interaction
             try:
-                Thread(target=save_esp32_sensor_data, args=(sensor_data, user_email)).start()
+                mock_session = {
+                    'email': user_email,
+                    'username': username,
+                    'fact_file': user_fact_file
+                }
+                interaction_writer.submit(user_email, user_email, query, response, mock_session)
             except Exception as e:
-                print(f"Sensor data save error: {e}")
-
-        set_sentiment()
-
-        # Clear predicates
-        for key in [
-            "mood", "word", "dob_person", "age_person", "gender_person",
-            "rel", "person1", "gender", "dob", "relation", "person",
-            "other_dob_person", "other_dob", "other_gender_person", "other_gender",
-            "other_person1", "other_person2", "other_relation", "delete", "user_input_name",
-            "dht11_temperature", "dht11_humidity", "dht11_status",
-            "dht11_comfort_score", "dht11_recommendations", "sensor_type",
-            "dht11_temp_unit", "dht11_humidity_unit"
-        ]:
-            myBot.setPredicate(key, "")
+                print(f"Interaction logging error: {e}")
+
+            # Save sensor data to Neo4j if available
+            if sensor_data and sensor_data.get('status') == 'valid':
+                try:
+                    Thread(target=save_esp32_sensor_data, args=(sensor_data, user_email)).start()
+                except Exception as e:
+                    print(f"Sensor data save error: {e}")
+
+            set_sentiment()
+
+            # Clear predicates, and the sensor readings set for this message
+            prompt_handlers.clear(myBot.setPredicate, extra=SENSOR_PREDICATES + QUERY_PREDICATES)
 
         return {
             "response": response,
@@ -640,55 +306,30 @@ def get_bot_response_with_sensor(query, user_email, user_fact_file, username, se
 
 
 def save_esp32_sensor_data(sensor_data, user_email):
-    """Save ESP32 sensor data to Neo4j"""
-    try:
-        driver = connect_neo4j()
-        if not driver:
-            return
-
-        neo4j_session = driver.session()
-        timestamp = datetime.now().isoformat()
-
-        # Create sensor reading node
-        neo4j_session.run("""
-            CREATE (s:DHT11:SensoryMemory {
-                temperature: $temperature,
-                humidity: $humidity,
-                timestamp: $timestamp,
-                sensor_type: $sensor_type,
-                memory_type: $memory_type,
-                status: $status,
-                comfort_score: $comfort_score,
-                recommendations: $recommendations,
-                data_source: $data_source
-            })
-        """,
-                          temperature=sensor_data.get('temperature'),
-                          humidity=sensor_data.get('humidity'),
-                          timestamp=timestamp,
-                          sensor_type='DHT11',
-                          memory_type='SensoryMemory',
-                          status=sensor_data.get('status'),
-                          comfort_score=sensor_data.get('comfort_score'),
-                          recommendations=sensor_data.get('recommendations'),
-                          data_source='ESP32'
-                          )
-
-        # Link to user
-        neo4j_session.run("""
-            MERGE (u:User {email: $email})
-            WITH u
-            MATCH (s:DHT11:SensoryMemory {timestamp: $timestamp})
-            MERGE (u)-[:HAS_SENSOR_READING]->(s)
-        """, email=user_email, timestamp=timestamp)
-
-        neo4j_session.close()
-        driver.close()
-
-        print(f"Saved ESP32 sensor data - Temp: {sensor_data.get('temperature')}°C")
-
-    except Exception as e:
-        print(f"Neo4j save error: {e}")
+    """Queue ESP32 sensor data for Neo4j, linked to the user"""
+    timestamp = datetime.now().isoformat()
+    esp32_ip = sensor_data.get('esp32_ip') or dht11_sensor.esp32_ip
+    dht11_sensor.recent_for(esp32_ip).record(user_email, timestamp, sensor_data.get('temperature'),
+                                             sensor_data.get('humidity'), sensor_data.get('comfort_score'),
+                                             sensor_data.get('recommendations'))
+    raw = {
+        'temperature': sensor_data.get('temperature'),
+        'humidity': sensor_data.get('humidity'),
+        'comfort_score': sensor_data.get('comfort_score')
+    }
+    persist, values = sensor_filter.apply((esp32_ip, user_email), raw)
+    sensor_buffer.add({
+        'temperature': values['temperature'],
+        'humidity': values['humidity'],
+        'timestamp': timestamp,
+        'sensor_type': 'DHT11',
+        'memory_type': 'SensoryMemory',
+        'status': sensor_data.get('status'),
+        'comfort_score': values['comfort_score'],
+        'recommendations': sensor_data.get('recommendations'),
+        'data_source': 'ESP32',
+        'esp32_ip': esp32_ip
+    }, user_email, persist, raw)
 
 
 # =====================================
@@ -715,7 +356,7 @@ def login():
             create_episode(email, session)
             fact_path = f"prolog/facts/{email.replace('@', '_at_')}.pl"
             session["fact_file"] = fact_path
-            myBot.setPredicate("username", session["username"])
+            myBot.setPredicate("username", session["username"], bot_session_id(email))
             return redirect(url_for('home') + '?success=login')
         else:
             return redirect(url_for('login') + '?error=invalid')
@@ -727,6 +368,7 @@ def login():
 def logout():
     if "email" in session:
         end_episode(session["email"], session)
+        myBot.end_session(bot_session_id(session["email"]))
     session.clear()
     return redirect(url_for('login'))
 
@@ -1144,8 +786,7 @@ def analytics():
         return jsonify({"error": "Please log in to view analytics."}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         analytics_data = {
             "user_stats": get_user_statistics(session['email'], neo4j_session),
@@ -1162,7 +803,6 @@ def analytics():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -1173,8 +813,7 @@ def get_complete_graph_data():
         return jsonify({"error": "Not authenticated"}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
     except Exception as e:
         return jsonify({"error": "Database connection failed"}), 503
 
@@ -1272,7 +911,6 @@ def get_complete_graph_data():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -1290,8 +928,7 @@ def chat_history():
         return jsonify({"error": "Please log in to view chat history."}), 401
 
     try:
-        driver = connect_neo4j()
-        neo4j_session = driver.session()
+        neo4j_session = get_neo4j_session()
 
         chat_history = get_user_chat_history(session['email'], neo4j_session)
         return jsonify({"history": chat_history}), 200
@@ -1302,7 +939,6 @@ def chat_history():
     finally:
         try:
             neo4j_session.close()
-            driver.close()
         except:
             pass
 
@@ -1397,4 +1033,5 @@ if __name__ == "__main__":
     print("  GET /analytics - Analytics data")
     print("  GET /api/graph_data - Graph visualization")
     print("  GET /chat-history - Chat history")
+    ensure_schema()
     app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,43 @@
+"""
+Immutable snapshot of a sensor manager's latest state.
+
+The sensor managers' readers (get_latest_readings,
+get_environmental_context and the get_dht11_* predicate helpers) used to
+take the manager's lock, copy its sensor_data dict, and in the DHT11 case
+recompute the comfort score and recommendations on every call.  Now the
+processing thread derives everything once per reading, builds an
+EnvironmentSnapshot, and publishes it by rebinding the manager's `snapshot`
+attribute.  Rebinding an attribute is atomic, so readers just read
+`manager.snapshot` without locking.  They always see one whole snapshot,
+never a half-updated one.  Everything in it is read-only: the mappings are
+MappingProxyType views and lists become tuples.
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+
+
+def _freeze(values):
+    return MappingProxyType({key: tuple(value) if isinstance(value, list) else value
+                             for key, value in values.items()})
+
+
+@dataclass(frozen=True)
+class EnvironmentSnapshot:
+    readings: MappingProxyType   # what get_latest_readings() returns a copy of
+    context: MappingProxyType    # what get_environmental_context() returns a copy of; None if unavailable
+
+    @classmethod
+    def capture(cls, readings, context=None):
+        return cls(_freeze(readings), _freeze(context) if context is not None else None)
+
+    @property
+    def temperature(self):
+        return self.readings.get('temperature')
+
+    @property
+    def humidity(self):
+        return self.readings.get('humidity')
+
+    @property
+    def status(self):
+        return self.readings.get('status', 'unknown')
@@ -0,0 +1,261 @@
+"""
+Asynchronous poller for many ESP32 DHT11 devices.
+
+ESP32DHT11SensoryMemoryManager used to run two threads per device and open
+a new connection with requests.get() for every reading.  ESP32Poller runs
+one asyncio event loop on one background thread.  Each device gets a small
+polling task, and all of them share one aiohttp ClientSession, whose
+connector keeps a connection alive to every device.
+
+Each device keeps its own interval:
+
+  * after a successful reading the interval shrinks towards
+    ESP32_POLL_MIN_INTERVAL while readings are changing (by at least the
+    SENSOR_DEADBAND thresholds of sensor_filter), and grows back towards
+    ESP32_POLL_MAX_INTERVAL while they are steady;
+  * after a failure the device is retried with exponential backoff, capped
+    at ESP32_MAX_BACKOFF and jittered so that devices which dropped out
+    together do not come back in lockstep.
+
+Every reading goes to the `on_reading(address, data)` callback, which is
+called on the poller thread and must not block.  status() reports each
+device's state, interval, latency and error counts.
+
+Devices are addresses ("192.168.43.23", or "127.0.0.1:8081" for a stub
+from esp32_stub.py).  They can be added and removed while the poller runs.
+
+Configuration (environment, with defaults):
+
+    ESP32_DEVICES              192.168.43.23   (comma separated)
+    ESP32_POLL_INTERVAL        30    (seconds)
+    ESP32_POLL_MIN_INTERVAL    5
+    ESP32_POLL_MAX_INTERVAL    120
+    ESP32_POLL_TIMEOUT         5
+    ESP32_MAX_BACKOFF          300
+    ESP32_POLL_CONNECTIONS     100   (open connections across all devices)
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+import aiohttp
+
+from sensor_filter import sensor_filter
+
+
+logger = logging.getLogger(__name__)
+
+
+def configured_devices():
+    return [address.strip() for address in os.environ.get("ESP32_DEVICES", "192.168.43.23").split(",")
+            if address.strip()]
+
+
+class DeviceState:
+    def __init__(self, address, interval):
+        self.address = address
+        self.sensor_url = f"http://{address}/sensor"
+        self.status = "connecting"
+        self.interval = interval
+        self.failures = 0
+        self.polls = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_latency = None
+        self.last_reading = None
+        self.task = None
+
+    def snapshot(self):
+        return {
+            "address": self.address,
+            "status": self.status,
+            "interval": round(self.interval, 2),
+            "consecutive_failures": self.failures,
+            "polls": self.polls,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+            "last_latency": self.last_latency,
+        }
+
+
+def _changed(previous, current):
+    # The same SENSOR_DEADBAND thresholds that decide which readings get a node
+    return previous is None or sensor_filter.changed(previous, current)
+
+
+class ESP32Poller:
+    def __init__(self, on_reading, interval=None, min_interval=None, max_interval=None, timeout=None,
+                 max_backoff=None, connections=None):
+        self.on_reading = on_reading
+        self.interval = interval or float(os.environ.get("ESP32_POLL_INTERVAL", "30"))
+        self.min_interval = min_interval or float(os.environ.get("ESP32_POLL_MIN_INTERVAL", "5"))
+        self.max_interval = max_interval or float(os.environ.get("ESP32_POLL_MAX_INTERVAL", "120"))
+        self.timeout = timeout or float(os.environ.get("ESP32_POLL_TIMEOUT", "5"))
+        self.max_backoff = max_backoff or float(os.environ.get("ESP32_MAX_BACKOFF", "300"))
+        self.connections = connections or int(os.environ.get("ESP32_POLL_CONNECTIONS", "100"))
+
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._started = threading.Event()
+
+    def start(self, addresses=()):
+        """Start the event loop thread (idempotent) and poll `addresses`"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="esp32-poller", daemon=True)
+                self._thread.start()
+        self._started.wait()
+        for address in addresses:
+            self.add_device(address)
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._open_session())
+        self._started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._close_session())
+            self._loop.close()
+
+    async def _open_session(self):
+        # One kept-alive connection per device, held open across its longest interval
+        connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=1,
+                                         keepalive_timeout=self.max_interval + 30)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def _close_session(self):
+        tasks = [device.task for device in self._devices.values() if device.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._session.close()
+
+    def add_device(self, address):
+        """Start polling `address`; returns False if it is already polled"""
+        with self._lock:
+            if address in self._devices:
+                return False
+            device = self._devices[address] = DeviceState(address, self.interval)
+        self._loop.call_soon_threadsafe(self._start_task, device)
+        return True
+
+    def _start_task(self, device):
+        device.task = self._loop.create_task(self._poll_device(device), name=f"esp32-{device.address}")
+
+    def remove_device(self, address):
+        with self._lock:
+            device = self._devices.pop(address, None)
+        if device is not None:
+            self._loop.call_soon_threadsafe(lambda: device.task and device.task.cancel())
+        return device is not None
+
+    def devices(self):
+        with self._lock:
+            return list(self._devices)
+
+    async def _poll_device(self, device):
+        # Spread the first polls so many devices do not all start at once
+        await asyncio.sleep(random.uniform(0, min(device.interval, 1.0)))
+        while True:
+            try:
+                delay = await self._poll_once(device)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Never let one bad poll end the device's task
+                logger.exception(f"ESP32 {device.address} poll raised")
+                delay = self._failed(device, e)
+            await asyncio.sleep(delay)
+
+    async def _poll_once(self, device):
+        """Poll `device` once; returns the seconds to wait before the next poll"""
+        start = time.perf_counter()
+        device.polls += 1
+        try:
+            async with self._session.get(device.sensor_url) as response:
+                if response.status != 200:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                      status=response.status, message=response.reason)
+                data = await response.json(content_type=None)
+            if not isinstance(data, dict):
+                raise ValueError(f"unexpected payload {data!r}")
+            for key in ("temperature", "humidity"):
+                if data.get(key) is not None:
+                    try:
+                        data[key] = float(data[key])
+                    except (TypeError, ValueError):
+                        raise ValueError(f"non-numeric {key} {data[key]!r}") from None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._failed(device, e)
+
+        device.last_latency = round(time.perf_counter() - start, 4)
+        device.last_success = time.time()
+        device.status = "connected"
+        if device.failures:
+            logger.info(f"ESP32 {device.address} is back after {device.failures} failed polls")
+        device.failures = 0
+        data.setdefault("esp32_ip", device.address)
+
+        if _changed(device.last_reading, data):
+            device.interval = max(self.min_interval, device.interval / 2)
+        else:
+            device.interval = min(self.max_interval, device.interval * 1.5)
+        device.last_reading = data
+        try:
+            self.on_reading(device.address, data)
+        except Exception:
+            logger.exception(f"ESP32 reading callback failed for {device.address}")
+        return device.interval
+
+    def _failed(self, device, error):
+        device.failures += 1
+        device.errors += 1
+        device.last_error = f"{type(error).__name__}: {error}"
+        device.status = "disconnected"
+        backoff = min(self.max_backoff, self.interval * 2 ** (device.failures - 1))
+        delay = random.uniform(backoff / 2, backoff)
+        if device.failures == 1 or device.failures % 10 == 0:
+            logger.warning(f"ESP32 {device.address} poll failed ({device.last_error}), "
+                           f"{device.failures} in a row, retrying in {delay:.1f}s")
+        return delay
+
+    def status(self, address=None):
+        """Per-device status dicts keyed by address, or one device's status"""
+        with self._lock:
+            devices = dict(self._devices)
+        if address is not None:
+            device = devices.get(address)
+            return device.snapshot() if device is not None else None
+        return {address: device.snapshot() for address, device in devices.items()}
+
+    def stop(self, timeout=5):
+        """Stop polling every device; a later start() runs a fresh event loop"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+        if loop is None or thread is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"ESP32 poller did not stop within {timeout}s")
+            return
+        with self._lock:
+            self._devices.clear()
+            self._loop = None
+            self._thread = None
+            self._session = None
+            self._started.clear()
@@ -0,0 +1,146 @@
+"""
+Local stand-in for an ESP32 DHT11 device.
+
+Serves the same two endpoints as the firmware, on 127.0.0.1:
+
+    GET /         device status
+    GET /sensor   {"temperature", "humidity", "timestamp", "status",
+                   "comfort_score", "recommendations", "esp32_ip"}
+
+Readings follow a slow random walk.  A device can be told to answer slowly,
+fail a fraction of requests, or go offline, which is what the poller's
+backoff and status reporting need exercising against.
+
+    python esp32_stub.py --devices 20 --port 8081
+    ESP32_DEVICES=127.0.0.1:8081,127.0.0.1:8082,... python conversation.py
+
+In code, StubDevice(port).start() runs one on a background thread and
+stop() shuts it down.
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+
+def comfort(temperature, humidity):
+    # Same formula as the firmware (and ESP32DHT11SensoryMemoryManager.calculate_comfort_score)
+    temp_score = max(0, min(100, 100 - abs(temperature - 23) * 10))
+    humidity_score = max(0, min(100, 100 - abs(humidity - 50) * 2))
+    return (temp_score + humidity_score) / 2
+
+
+class StubDevice:
+    def __init__(self, port, host="127.0.0.1", failure_rate=0.0, latency=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.online = True
+        self.requests = 0
+        self._random = random.Random(seed if seed is not None else port)
+        self.temperature = round(self._random.uniform(19, 27), 1)
+        self.humidity = round(self._random.uniform(35, 65), 1)
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._started = threading.Event()
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def reading(self):
+        self.temperature = round(min(50, max(0, self.temperature + self._random.gauss(0, 0.3))), 1)
+        self.humidity = round(min(95, max(5, self.humidity + self._random.gauss(0, 1.0))), 1)
+        score = comfort(self.temperature, self.humidity)
+        recommendations = []
+        if self.temperature > 26:
+            recommendations.append("Room temperature is high - consider cooling")
+        elif self.temperature < 20:
+            recommendations.append("Room temperature is low - consider warming")
+        if self.humidity > 60:
+            recommendations.append("Humidity is high - consider dehumidifying")
+        elif self.humidity < 40:
+            recommendations.append("Humidity is low - consider humidifying")
+        return {
+            "temperature": self.temperature,
+            "humidity": self.humidity,
+            "timestamp": datetime.now().isoformat(),
+            "status": "valid",
+            "comfort_score": score,
+            "recommendations": "; ".join(recommendations or ["Environmental conditions are optimal"]),
+            "esp32_ip": self.address,
+        }
+
+    async def _respond(self, body):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not self.online or self._random.random() < self.failure_rate:
+            return web.json_response({"error": "sensor read failed"}, status=503)
+        return web.json_response(body())
+
+    async def _status(self, request):
+        return await self._respond(lambda: {"device": "ESP32 DHT11 stub", "ip": self.address,
+                                            "uptime": time.monotonic()})
+
+    async def _sensor(self, request):
+        return await self._respond(self.reading)
+
+    def app(self):
+        application = web.Application()
+        application.router.add_get("/", self._status)
+        application.router.add_get("/sensor", self._sensor)
+        return application
+
+    async def serve(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    def start(self):
+        """Serve on a background thread; returns once the port is listening"""
+        self._thread = threading.Thread(target=self._run, name=f"esp32-stub-{self.port}", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self.serve())
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def stop(self, timeout=5):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+
+
+async def _serve_forever(devices):
+    for device in devices:
+        await device.serve()
+    print("Serving stub ESP32 devices:", ",".join(device.address for device in devices))
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run stub ESP32 DHT11 devices on localhost")
+    arg_parser.add_argument("--devices", type=int, default=1)
+    arg_parser.add_argument("--port", type=int, default=8081, help="port of the first device")
+    arg_parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = arg_parser.parse_args()
+    stubs = [StubDevice(args.port + i, failure_rate=args.failure_rate, latency=args.latency)
+             for i in range(args.devices)]
+    try:
+        asyncio.run(_serve_forever(stubs))
+    except KeyboardInterrupt:
+        pass
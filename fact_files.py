@@ -0,0 +1,297 @@
+"""
+Prolog fact files: compaction and a pre-parsed sidecar.
+
+The files in prolog/facts/ are append-only logs of what a user has told the
+bot, so restating a fact appends it again, and every knowledge base build
+re-parses each line through pytholog's string parser (pl_read also feeds it
+comments and blank lines).
+
+compact_file() rewrites a .pl file with one normalised clause per line,
+duplicates dropped (first occurrence kept) and comments kept in place.  The
+.pl file stays the human-readable source of truth.  Next to it,
+`<name>.plc` holds the clauses already parsed into pytholog Facts, together
+with the size and SHA-256 of the part of the .pl file they cover.
+load_clauses() uses the sidecar for that prefix and parses only lines
+appended since, so an out-of-date sidecar costs a reparse of the new lines
+and an edited .pl file is never shadowed by a stale one.
+
+The running app compacts its users' files in the background (see
+FactStore.compact_all()); the command line tool is for when it is stopped:
+
+    python fact_files.py                 # compact every file in prolog/facts/
+    python fact_files.py a.pl b.pl       # compact the given files
+    python fact_files.py --check         # report duplicates and sidecar state only
+"""
+import argparse
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import re
+import sys
+import tempfile
+import time
+from bisect import insort_left
+from glob import glob
+
+from pytholog.fact import Fact
+from pytholog.goal import Goal
+from pytholog.pq import FactHeap
+
+
+logger = logging.getLogger(__name__)
+
+FACTS_GLOB = "prolog/facts/*.pl"
+SIDECAR_SUFFIX = ".plc"
+SIDECAR_FORMAT = 1
+
+try:
+    from importlib.metadata import version as _package_version
+    PYTHOLOG_VERSION = _package_version("pytholog")
+except Exception:
+    PYTHOLOG_VERSION = "unknown"
+
+
+def sidecar_path(path):
+    return os.path.splitext(path)[0] + SIDECAR_SUFFIX
+
+
+def normalize_clause(line):
+    """The clause on `line` as pytholog stores it (no whitespace or final '.'), or None for comments and blanks"""
+    line = line.strip()
+    if not line or line.startswith("%"):
+        return None
+    return re.sub(r"\s+", "", re.sub(r"\.+$", "", line)) or None
+
+
+def parse_clauses(lines):
+    """(Fact, goals) pairs for every clause in `lines`, parsed the way KnowledgeBase.add_kn() does"""
+    parsed = []
+    for line in lines:
+        clause = normalize_clause(line)
+        if clause is not None:
+            fact = Fact(clause)
+            parsed.append((fact, [Goal(Fact(r.to_string())) for r in fact.rhs]))
+    return parsed
+
+
+def add_parsed(kb, parsed):
+    """KnowledgeBase.add_kn() for clauses that are already parsed"""
+    db = kb.db
+    for fact, goals in parsed:
+        bucket = db.get(fact.lh.predicate)
+        if bucket is None:
+            bucket = db[fact.lh.predicate] = {"facts": FactHeap(), "goals": FactHeap(), "terms": FactHeap()}
+        bucket["facts"].push(fact)
+        bucket["terms"].push(fact.terms)
+        bucket["goals"].push(goals)
+
+
+def sort_buckets(parsed, buckets=()):
+    """
+    The kb.db buckets add_parsed() would build from `parsed`, as sorted
+    lists per predicate, optionally on top of earlier `buckets`.
+    FactHeap.push() is insort(), so pushing items one by one leaves them in
+    stable-sorted order.
+    """
+    grouped = {predicate: (list(facts), list(terms), list(goals)) for predicate, facts, terms, goals in buckets}
+    for fact, goals in parsed:
+        facts, terms, goal_lists = grouped.setdefault(fact.lh.predicate, ([], [], []))
+        facts.append(fact)
+        terms.append(fact.terms)
+        goal_lists.append(goals)
+    return [(predicate, sorted(facts), sorted(terms), sorted(goal_lists))
+            for predicate, (facts, terms, goal_lists) in grouped.items()]
+
+
+def add_sorted(kb, buckets):
+    """add_parsed() for sort_buckets() output, without a comparison per clause"""
+    db = kb.db
+    for predicate, *columns in buckets:
+        bucket = db.get(predicate)
+        if bucket is None:
+            bucket = db[predicate] = {"facts": FactHeap(), "terms": FactHeap(), "goals": FactHeap()}
+        for name, items in zip(("facts", "terms", "goals"), columns):
+            existing = bucket[name]._container
+            merged = list(items)
+            # Clauses already in the bucket (usually a rule or two) sort before equal new ones
+            for item in reversed(existing):
+                insort_left(merged, item)
+            bucket[name]._container = merged
+
+
+def read_sidecar(path):
+    """(meta, sorted buckets) from `path`'s sidecar, or None if it is missing or from another version"""
+    # Thousands of small objects; keep the cycle collector from running while they are created
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(sidecar_path(path), "rb") as f:
+            meta = pickle.load(f)
+            if meta.get("format") != SIDECAR_FORMAT or meta.get("pytholog") != PYTHOLOG_VERSION:
+                return None
+            return meta, pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+        return None
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _replace_file(target, write, fsync=False):
+    """
+    Write `target` through a temp file of its own in the same directory, then
+    rename it into place.  mkstemp gives each writer its own temp file, so
+    threads writing the same target cannot interleave.
+    """
+    directory, name = os.path.split(target)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if os.path.exists(target):
+            # mkstemp creates the file 0600; keep the mode the target had
+            os.chmod(tmp_path, os.stat(target).st_mode & 0o7777)
+        os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_sidecar(path, buckets, covered):
+    """Write sort_buckets() output as the sidecar for `covered`, the start of `path`, replacing it atomically"""
+    meta = {
+        "format": SIDECAR_FORMAT,
+        "pytholog": PYTHOLOG_VERSION,
+        "size": len(covered),
+        "sha256": hashlib.sha256(covered).hexdigest(),
+        "clauses": sum(len(facts) for _, facts, _, _ in buckets),
+    }
+    def write(f):
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(buckets, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    _replace_file(sidecar_path(path), write)
+    return meta
+
+
+def _usable_prefix(sidecar, data):
+    if sidecar is None:
+        return None
+    meta, buckets = sidecar
+    size = meta["size"]
+    if size > len(data) or hashlib.sha256(data[:size]).hexdigest() != meta["sha256"]:
+        return None
+    return size, meta["clauses"], buckets
+
+
+def load_clauses(kb, path, refresh_sidecar=True):
+    """
+    Add every clause in `path` to `kb`, from the sidecar where it is current.
+    Lines appended after the sidecar was written are parsed, and the sidecar
+    is refreshed to cover them.  Returns (clauses from sidecar, clauses parsed).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    prefix = _usable_prefix(read_sidecar(path), data)
+    if prefix is None:
+        covered, cached, buckets = 0, 0, []
+    else:
+        covered, cached, buckets = prefix
+    tail = parse_clauses(data[covered:].decode("utf-8").splitlines())
+    add_sorted(kb, buckets)
+    add_parsed(kb, tail)
+
+    if refresh_sidecar and (tail or prefix is None):
+        try:
+            write_sidecar(path, sort_buckets(tail, buckets), data)
+        except OSError as e:
+            logger.warning(f"Could not write {sidecar_path(path)}: {e}")
+    return cached, len(tail)
+
+
+def compact_lines(lines):
+    """Normalised, deduplicated lines of a fact file, and how many duplicates were dropped"""
+    seen = set()
+    compacted = []
+    duplicates = 0
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("%"):
+            compacted.append(stripped)
+            continue
+        clause = normalize_clause(stripped)
+        if clause in seen:
+            duplicates += 1
+            continue
+        seen.add(clause)
+        compacted.append(clause + ".")
+    return compacted, duplicates
+
+
+def compact_file(path):
+    """
+    Rewrite `path` deduplicated and normalised, and write its sidecar.  The
+    caller must keep other writers off the file (see FactStore.compact()).
+    Returns a report of what changed.
+    """
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        original = f.read()
+    lines = original.decode("utf-8").splitlines()
+    compacted, duplicates = compact_lines(lines)
+    data = ("\n".join(compacted) + "\n").encode("utf-8") if compacted else b""
+
+    rewritten = data != original
+    if rewritten:
+        _replace_file(path, lambda f: f.write(data), fsync=True)
+
+    meta = write_sidecar(path, sort_buckets(parse_clauses(compacted)), data)
+    return {
+        "path": path,
+        "rewritten": rewritten,
+        "duplicates": duplicates,
+        "clauses": meta["clauses"],
+        "bytes_before": len(original),
+        "bytes_after": len(data),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def check_file(path):
+    """What compact_file() would do, without writing anything"""
+    with open(path, "rb") as f:
+        data = f.read()
+    compacted, duplicates = compact_lines(data.decode("utf-8").splitlines())
+    prefix = _usable_prefix(read_sidecar(path), data)
+    return {
+        "path": path,
+        "duplicates": duplicates,
+        "clauses": sum(1 for line in compacted if not line.startswith("%")),
+        "sidecar_covers": 0 if prefix is None else prefix[0],
+        "bytes": len(data),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Deduplicate Prolog fact files and rebuild their sidecars")
+    arg_parser.add_argument("files", nargs="*", help=f"fact files (default: {FACTS_GLOB})")
+    arg_parser.add_argument("--check", action="store_true", help="only report, change nothing")
+    args = arg_parser.parse_args()
+
+    duplicates_found = 0
+    for fact_path in args.files or sorted(glob(FACTS_GLOB)):
+        report = check_file(fact_path) if args.check else compact_file(fact_path)
+        duplicates_found += report["duplicates"]
+        print(report)
+    sys.exit(1 if args.check and duplicates_found else 0)
@@ -0,0 +1,211 @@
+"""
+Fact assertion for the per-user knowledge bases.
+
+The append_*_fact helpers used to only append text to the user's .pl file, so
+a new fact was invisible until the next full reparse, and appends from
+concurrent request threads could interleave.  FactStore.assert_fact() instead
+asserts the clause straight into the user's cached KnowledgeBase, so it
+answers on the very next message, and persists it by appending to the user's
+.pl file, which serves as an append-only log.
+
+Each fact file has one writer lock.  Writes are flushed to the OS immediately
+and fsync'd in batches by a background thread: every FACT_LOG_FSYNC_INTERVAL
+seconds, or sooner once FACT_LOG_FSYNC_BATCH writes are pending, and once more
+at exit.  A file's append handle stays open only until its batch is synced.
+
+Once started with start_compactor(), a background thread also compacts the
+fact files (fact_files.compact_file(): duplicates dropped, clauses
+normalised, pre-parsed sidecar rewritten) every FACT_COMPACT_INTERVAL
+seconds, skipping files that have not changed since their last compaction.
+A file is compacted under its writer lock, so appends wait for the rewrite.
+
+Configuration (environment, with defaults):
+
+    FACT_LOG_FSYNC_INTERVAL   0.5
+    FACT_LOG_FSYNC_BATCH      32
+    FACT_COMPACT_INTERVAL     3600   (seconds; 0 disables background compaction)
+"""
+import atexit
+import logging
+import os
+import threading
+from glob import glob
+
+from fact_files import FACTS_GLOB, compact_file
+from knowledge_cache import _file_stamp, knowledge_bases
+
+
+logger = logging.getLogger(__name__)
+
+
+class _FactLog:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.handle = None
+        self.unsynced = 0
+
+    def append(self, line):
+        if self.handle is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.handle = open(self.path, "a")
+        self.handle.write(line)
+        self.handle.flush()
+        self.unsynced += 1
+
+    def sync(self):
+        if self.handle is not None and self.unsynced:
+            os.fsync(self.handle.fileno())
+            self.unsynced = 0
+
+    def close(self):
+        if self.handle is not None:
+            self.sync()
+            self.handle.close()
+            self.handle = None
+
+
+class FactStore:
+    def __init__(self, knowledge_bases=knowledge_bases, fsync_interval=None, fsync_batch=None):
+        self.knowledge_bases = knowledge_bases
+        self.fsync_interval = fsync_interval or float(os.environ.get("FACT_LOG_FSYNC_INTERVAL", "0.5"))
+        self.fsync_batch = fsync_batch or int(os.environ.get("FACT_LOG_FSYNC_BATCH", "32"))
+        self._logs = {}
+        self._logs_lock = threading.Lock()
+        self._pending = 0
+        self._wake = threading.Condition()
+        self._flusher = None
+        self._compactor = None
+        self._compacted = {}
+        self._stop = threading.Event()
+        self._counters = {"asserted": 0, "duplicates": 0, "fsyncs": 0, "compactions": 0,
+                          "duplicates_compacted": 0}
+
+    def _log(self, fact_file):
+        path = os.path.abspath(fact_file)
+        with self._logs_lock:
+            log = self._logs.get(path)
+            if log is None:
+                log = self._logs[path] = _FactLog(path)
+            return log
+
+    def assert_fact(self, fact_file, clause):
+        """
+        Assert `clause` (e.g. "father(ahmed,ali)") into the user's live knowledge
+        base and append it to their fact file.  Returns False if the clause was
+        already known.
+        """
+        clause = clause.strip().rstrip(".").replace(" ", "")
+        log = self._log(fact_file)
+        with log.lock:
+            entry = self.knowledge_bases.get(fact_file)
+            with entry.lock:
+                if entry.contains(clause):
+                    self._count("duplicates")
+                    return False
+                log.append(clause + ".\n")
+                entry.add(clause)
+                # The file now matches the live base, so the next get() must not reparse it
+                self.knowledge_bases.mark_current(fact_file, entry)
+        self._count("asserted")
+        self._schedule_sync()
+        return True
+
+    def _count(self, name):
+        with self._wake:
+            self._counters[name] += 1
+
+    def _schedule_sync(self):
+        with self._wake:
+            self._pending += 1
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="fact-log-fsync", daemon=True)
+                self._flusher.start()
+            if self._pending >= self.fsync_batch:
+                self._wake.notify()
+
+    def _flush_loop(self):
+        while True:
+            with self._wake:
+                self._wake.wait_for(lambda: self._pending >= self.fsync_batch, timeout=self.fsync_interval)
+                if not self._pending:
+                    continue
+                self._pending = 0
+            self.sync()
+
+    def sync(self):
+        """fsync and close every fact file with unsynced writes"""
+        with self._logs_lock:
+            logs = list(self._logs.values())
+        for log in logs:
+            with log.lock:
+                if log.unsynced:
+                    try:
+                        log.close()
+                        self._count("fsyncs")
+                    except OSError as e:
+                        logger.error(f"fsync of {log.path} failed: {e}")
+
+    def compact(self, fact_file):
+        """Deduplicate and normalise `fact_file` and rewrite its sidecar, holding off appends meanwhile"""
+        log = self._log(fact_file)
+        with log.lock:
+            # The append handle would keep writing to the replaced file
+            log.close()
+            report = compact_file(fact_file)
+            self._compacted[log.path] = _file_stamp(fact_file)
+        with self._wake:
+            self._counters["compactions"] += 1
+            self._counters["duplicates_compacted"] += report["duplicates"]
+        if report["rewritten"]:
+            # The cached knowledge base may hold the dropped duplicates; rebuild it from the sidecar
+            self.knowledge_bases.invalidate(fact_file)
+            logger.info(f"Compacted {fact_file}: {report['duplicates']} duplicates dropped, "
+                        f"{report['bytes_before']} -> {report['bytes_after']} bytes")
+        return report
+
+    def compact_all(self, pattern=FACTS_GLOB):
+        """Compact every fact file that changed since this process last compacted it"""
+        reports = []
+        for fact_file in sorted(glob(pattern)):
+            if self._compacted.get(os.path.abspath(fact_file)) == _file_stamp(fact_file):
+                continue
+            try:
+                reports.append(self.compact(fact_file))
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error(f"Compacting {fact_file} failed: {e}")
+        return reports
+
+    def start_compactor(self, interval=None):
+        interval = interval if interval is not None else float(os.environ.get("FACT_COMPACT_INTERVAL", "3600"))
+        if interval <= 0 or self._compactor is not None:
+            return self
+        self._compactor = threading.Thread(target=self._compact_loop, args=(interval,),
+                                           name="fact-compactor", daemon=True)
+        self._compactor.start()
+        return self
+
+    def _compact_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.compact_all()
+
+    def close(self):
+        self._stop.set()
+        with self._logs_lock:
+            logs = list(self._logs.values())
+            self._logs.clear()
+        for log in logs:
+            with log.lock:
+                log.close()
+
+    def stats(self):
+        with self._wake:
+            stats = dict(self._counters)
+            stats["pending_fsync"] = self._pending
+        return stats
+
+
+fact_store = FactStore()
+atexit.register(fact_store.close)
@@ -0,0 +1,499 @@
+"""
+Bottom-up materialised family relations.
+
+pytholog answers find_person's rel(Y, x) questions by searching kb.pl's rules
+top-down on every call, which grows combinatorially with the family tree.
+FamilyIndex instead evaluates every rule once, bottom-up, over a user's facts
+(semi-naive, stratified for \\+) and stores each derived relation as a table
+indexed on its bound arguments, so lookups are dictionary hits.  The index is
+rebuilt only when the user's facts change.
+
+The parser covers the Datalog subset kb.pl uses: facts and rules whose bodies
+combine literals with ',' and ';' (and parentheses), negation as failure
+(\\+), unification (=, \\=), integer comparisons (<, >, =<, >=) and compound
+terms such as date(Y,M,D).  Clauses may span several lines.
+
+This changes find_person's answers.  pytholog raises on kb.pl's sibling rule
+(X \\= Y) and on saas/sasur's parenthesised ';', and find_person answered
+"unknown".  FamilyIndex evaluates them, so sibling, brother, sister,
+p_uncle, p_aunt, cousin, taya, chacha, mama, bhatija, bhanja, saas and sasur
+now find relatives where they used to find none (8-17% of all queries on
+benchmarks/family_relations.py's trees).  Those answers
+are pinned on a fixture family by `benchmarks/family_relations.py --check`.
+"""
+import logging
+import os
+import re
+import threading
+from itertools import product
+
+
+logger = logging.getLogger(__name__)
+
+COMPARISONS = {
+    "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b,
+    "=<": lambda a, b: a <= b,
+    ">=": lambda a, b: a >= b,
+}
+BUILTINS = set(COMPARISONS) | {"=", "\\="}
+
+_TOKEN_RE = re.compile(r"\s*(?:(:-|\\\+|\\=|=<|>=|[(),;.<>=])|(-?\d+)|([A-Za-z_][A-Za-z0-9_]*))")
+
+
+class Var:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class Rule:
+    def __init__(self, head, args, body):
+        self.head = head
+        self.args = args
+        self.body = _plan(body)
+
+    def __repr__(self):
+        return f"{self.head}{self.args} :- {self.body}"
+
+
+class PrologSyntaxError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------- parsing
+
+def _tokenize(text):
+    text = "\n".join(line.split("%", 1)[0] for line in text.splitlines())
+    tokens, pos = [], 0
+    while True:
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            if text[pos:].strip():
+                raise PrologSyntaxError(f"Unexpected character {text[pos:].strip()[:1]!r}")
+            return tokens
+        symbol, number, name = match.groups()
+        tokens.append(("sym", symbol) if symbol else ("num", int(number)) if number else ("name", name))
+        pos = match.end()
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.variables = {}
+
+    def peek(self):
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise PrologSyntaxError("Unexpected end of input")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, symbol):
+        kind, value = self.next()
+        if kind != "sym" or value != symbol:
+            raise PrologSyntaxError(f"Expected {symbol!r}, got {value!r}")
+
+    def clauses(self):
+        while self.pos < len(self.tokens):
+            start = self.pos
+            try:
+                yield self.clause()
+            except PrologSyntaxError as e:
+                # Skip to the end of the broken clause and carry on
+                self.pos = start
+                while self.pos < len(self.tokens) and self.tokens[self.pos] != ("sym", "."):
+                    self.pos += 1
+                self.pos += 1
+                logger.warning(f"Skipping unparsable clause: {e}")
+
+    def clause(self):
+        self.variables = {}
+        head = self.term()
+        pred, args = _as_literal(head)
+        body = [[]]
+        if self.peek() == ":-":
+            self.next()
+            body = _dnf(self.disjunction())
+        self.expect(".")
+        return pred, args, body
+
+    def term(self):
+        kind, value = self.next()
+        if kind == "num":
+            return value
+        if kind != "name":
+            raise PrologSyntaxError(f"Expected a term, got {value!r}")
+        if self.peek() == "(":
+            self.next()
+            args = [self.term()]
+            while self.peek() == ",":
+                self.next()
+                args.append(self.term())
+            self.expect(")")
+            return (value, *args)
+        if value[0].isupper() or value[0] == "_":
+            if value == "_":
+                return Var("_")
+            return self.variables.setdefault(value, Var(value))
+        return value
+
+    def disjunction(self):
+        parts = [self.conjunction()]
+        while self.peek() == ";":
+            self.next()
+            parts.append(self.conjunction())
+        return ("or", parts) if len(parts) > 1 else parts[0]
+
+    def conjunction(self):
+        goals = [self.goal()]
+        while self.peek() == ",":
+            self.next()
+            goals.append(self.goal())
+        return ("and", goals)
+
+    def goal(self):
+        if self.peek() == "(":
+            self.next()
+            goal = self.disjunction()
+            self.expect(")")
+            return goal
+        if self.peek() == "\\+":
+            self.next()
+            goal = self.goal()
+            if goal[0] != "lit":
+                raise PrologSyntaxError("\\+ is only supported on a single literal")
+            return ("not",) + goal[1:]
+        left = self.term()
+        if self.peek() in BUILTINS:
+            op = self.next()[1]
+            return ("cmp", op, left, self.term())
+        return ("lit",) + _as_literal(left)
+
+
+def _as_literal(term):
+    if isinstance(term, tuple):
+        return term[0], term[1:]
+    if isinstance(term, str):
+        return term, ()
+    raise PrologSyntaxError(f"{term!r} is not a literal")
+
+
+def _dnf(node):
+    """Body tree -> list of alternative conjunctions"""
+    kind = node[0]
+    if kind == "or":
+        return [conj for part in node[1] for conj in _dnf(part)]
+    if kind == "and":
+        return [sum(combo, []) for combo in product(*(_dnf(goal) for goal in node[1]))]
+    return [[node]]
+
+
+def parse(text):
+    """Parse Prolog source into (facts, rules)"""
+    facts, rules = [], []
+    for pred, args, bodies in _Parser(_tokenize(text)).clauses():
+        if bodies == [[]]:
+            if _is_ground(args):
+                facts.append((pred, args))
+            continue
+        for body in bodies:
+            rules.append(Rule(pred, args, body))
+    return facts, rules
+
+
+# ---------------------------------------------------------------- terms
+
+def _is_ground(term):
+    if isinstance(term, Var):
+        return False
+    if isinstance(term, tuple):
+        return all(_is_ground(arg) for arg in term)
+    return True
+
+
+def _variables(term, into):
+    if isinstance(term, Var):
+        if term.name != "_":
+            into.add(term)
+    elif isinstance(term, tuple):
+        for arg in term:
+            _variables(arg, into)
+    return into
+
+
+def _resolve(term, bindings):
+    if isinstance(term, Var):
+        return bindings.get(term, term)
+    if isinstance(term, tuple):
+        return tuple(_resolve(arg, bindings) for arg in term)
+    return term
+
+
+def _unify(pattern, value, bindings):
+    """Match a (possibly partially bound) pattern against a ground value"""
+    if isinstance(pattern, Var):
+        if pattern.name == "_":
+            return bindings
+        bound = bindings.get(pattern)
+        if bound is None:
+            bindings = dict(bindings)
+            bindings[pattern] = value
+            return bindings
+        return bindings if bound == value else None
+    if isinstance(pattern, tuple):
+        if not isinstance(value, tuple) or len(pattern) != len(value) or pattern[0] != value[0]:
+            return None
+        for sub_pattern, sub_value in zip(pattern[1:], value[1:]):
+            bindings = _unify(sub_pattern, sub_value, bindings)
+            if bindings is None:
+                return None
+        return bindings
+    return bindings if pattern == value else None
+
+
+def _plan(body):
+    """
+    Order a conjunction for bottom-up evaluation: positive literals keep their
+    order, and each negation or built-in runs as soon as its variables are bound.
+    """
+    positive = [goal for goal in body if goal[0] == "lit"]
+    waiting = [goal for goal in body if goal[0] != "lit"]
+    bound, plan = set(), []
+
+    def ready(goal):
+        if goal[0] == "not":
+            return _variables(goal[2], set()) <= bound
+        left, right = _variables(goal[2], set()), _variables(goal[3], set())
+        if goal[1] == "=":
+            # Unification only needs one side bound
+            return left <= bound or right <= bound
+        return left | right <= bound
+
+    def release():
+        progress = True
+        while progress:
+            progress = False
+            for goal in list(waiting):
+                if ready(goal):
+                    plan.append(goal)
+                    waiting.remove(goal)
+                    if goal[0] == "cmp" and goal[1] == "=":
+                        _variables(goal[2], bound)
+                        _variables(goal[3], bound)
+                    progress = True
+
+    release()
+    for goal in positive:
+        plan.append(goal)
+        _variables(goal[2], bound)
+        release()
+    if waiting:
+        raise PrologSyntaxError(f"Unsafe goals, variables never bound: {waiting}")
+    return plan
+
+
+# ---------------------------------------------------------------- evaluation
+
+class Relation:
+    def __init__(self):
+        self.rows = []
+        self._seen = set()
+        self._indexes = {}
+
+    def add(self, row):
+        if row in self._seen:
+            return False
+        self._seen.add(row)
+        self.rows.append(row)
+        for positions, index in self._indexes.items():
+            index.setdefault(tuple(row[i] for i in positions), []).append(row)
+        return True
+
+    def __contains__(self, row):
+        return row in self._seen
+
+    def __len__(self):
+        return len(self.rows)
+
+    def lookup(self, positions, key):
+        if not positions:
+            return self.rows
+        index = self._indexes.get(positions)
+        if index is None:
+            index = self._indexes[positions] = {}
+            for row in self.rows:
+                index.setdefault(tuple(row[i] for i in positions), []).append(row)
+        return index.get(key, ())
+
+
+_EMPTY = Relation()
+
+
+def _solve(goals, i, bindings, relations, delta_index, delta):
+    if i == len(goals):
+        yield bindings
+        return
+    goal = goals[i]
+    kind = goal[0]
+    if kind == "lit":
+        pattern = tuple(_resolve(arg, bindings) for arg in goal[2])
+        relation = delta if i == delta_index else relations.get(goal[1], _EMPTY)
+        positions = tuple(n for n, arg in enumerate(pattern) if _is_ground(arg))
+        for row in relation.lookup(positions, tuple(pattern[n] for n in positions)):
+            if len(row) != len(pattern):
+                continue
+            extended = bindings
+            for arg, value in zip(pattern, row):
+                extended = _unify(arg, value, extended)
+                if extended is None:
+                    break
+            if extended is not None:
+                yield from _solve(goals, i + 1, extended, relations, delta_index, delta)
+    elif kind == "not":
+        row = tuple(_resolve(arg, bindings) for arg in goal[2])
+        if row not in relations.get(goal[1], _EMPTY):
+            yield from _solve(goals, i + 1, bindings, relations, delta_index, delta)
+    else:
+        op, left, right = goal[1], _resolve(goal[2], bindings), _resolve(goal[3], bindings)
+        if op == "=":
+            if _is_ground(left):
+                extended = _unify(right, left, bindings)
+            else:
+                extended = _unify(left, right, bindings)
+            if extended is not None:
+                yield from _solve(goals, i + 1, extended, relations, delta_index, delta)
+        elif op == "\\=":
+            if left != right:
+                yield from _solve(goals, i + 1, bindings, relations, delta_index, delta)
+        elif isinstance(left, int) and isinstance(right, int) and COMPARISONS[op](left, right):
+            yield from _solve(goals, i + 1, bindings, relations, delta_index, delta)
+
+
+def _derive(rule, relations, delta_index=None, delta=None):
+    rows = []
+    for bindings in _solve(rule.body, 0, {}, relations, delta_index, delta):
+        row = tuple(_resolve(arg, bindings) for arg in rule.args)
+        if _is_ground(row):
+            rows.append(row)
+    return rows
+
+
+def stratify(rules):
+    """Assign each derived predicate a stratum so \\+ only reads lower strata"""
+    heads = {rule.head for rule in rules}
+    stratum = {head: 0 for head in heads}
+    changed = True
+    while changed:
+        changed = False
+        for rule in rules:
+            for goal in rule.body:
+                if goal[0] not in ("lit", "not") or goal[1] not in heads:
+                    continue
+                needed = stratum[goal[1]] + (1 if goal[0] == "not" else 0)
+                if stratum[rule.head] < needed:
+                    if needed > len(heads):
+                        raise PrologSyntaxError(f"{rule.head} depends on its own negation")
+                    stratum[rule.head] = needed
+                    changed = True
+    strata = [[] for _ in range(max(stratum.values(), default=-1) + 1)]
+    for rule in rules:
+        strata[stratum[rule.head]].append(rule)
+    return strata
+
+
+def materialize(facts, rules):
+    """Semi-naive, stratified bottom-up evaluation; returns {predicate: Relation}"""
+    relations = {}
+    for pred, args in facts:
+        relations.setdefault(pred, Relation()).add(args)
+
+    for stratum in stratify(rules):
+        local = {rule.head for rule in stratum}
+        for head in local:
+            relations.setdefault(head, Relation())
+
+        delta = {head: Relation() for head in local}
+        for rule in stratum:
+            for row in _derive(rule, relations):
+                if relations[rule.head].add(row):
+                    delta[rule.head].add(row)
+
+        while any(delta.values()):
+            new_delta = {head: Relation() for head in local}
+            for rule in stratum:
+                for i, goal in enumerate(rule.body):
+                    if goal[0] == "lit" and goal[1] in local and delta[goal[1]]:
+                        for row in _derive(rule, relations, i, delta[goal[1]]):
+                            if relations[rule.head].add(row):
+                                new_delta[rule.head].add(row)
+            delta = new_delta
+    return relations
+
+
+def format_term(term):
+    if isinstance(term, tuple):
+        return f"{term[0]}({','.join(format_term(arg) for arg in term[1:])})"
+    return str(term)
+
+
+class FamilyIndex:
+    def __init__(self, relations):
+        self.relations = relations
+
+    def subjects(self, relation, obj):
+        """Every X with relation(X, obj), in derivation order"""
+        table = self.relations.get(relation)
+        if table is None:
+            return []
+        return [format_term(row[0]) for row in table.lookup((1,), (obj,)) if len(row) == 2]
+
+    def holds(self, relation, *args):
+        return tuple(args) in self.relations.get(relation, _EMPTY)
+
+    def rows(self, relation):
+        return list(self.relations.get(relation, _EMPTY).rows)
+
+    def size(self):
+        return sum(len(table) for table in self.relations.values())
+
+
+_rules_cache = {}
+_rules_lock = threading.Lock()
+
+
+def load_rules(path):
+    """Parsed rules (and facts) of a rule file, reparsed only when it changes"""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _rules_lock:
+        cached = _rules_cache.get(path)
+        if cached is None or cached[0] != stamp:
+            with open(path) as f:
+                cached = _rules_cache[path] = (stamp, parse(f.read()))
+        return cached[1]
+
+
+def read_facts(fact_file):
+    """(facts, rules) of a user's fact file, or two empty lists if it does not exist"""
+    fact_text = ""
+    if fact_file and os.path.exists(fact_file):
+        with open(fact_file) as f:
+            # Names are written with their spaces (e.g. multi-word usernames);
+            # pytholog drops spaces from facts, so do the same
+            fact_text = "\n".join(line.replace(" ", "") for line in f.read().splitlines())
+    return parse(fact_text)
+
+
+def build_index(rules_path, fact_file=None):
+    rule_facts, rules = load_rules(rules_path)
+    facts, fact_rules = read_facts(fact_file)
+    return FamilyIndex(materialize(rule_facts + facts, rules + fact_rules))
@@ -0,0 +1,183 @@
+"""
+Write-behind worker pool for interaction logging.
+
+Chat handlers enqueue finished exchanges here instead of spawning a thread per
+message.  Work is sharded by user across a fixed set of worker threads, each
+with its own bounded queue, so one user's interactions are always written in
+the order they happened while different users are written in parallel.
+
+Configuration (environment, with defaults):
+
+    INTERACTION_WRITER_WORKERS     4
+    INTERACTION_WRITER_QUEUE_SIZE  1000   (total, split across workers)
+    INTERACTION_WRITER_OVERFLOW    block  (block | drop_newest | drop_oldest)
+    INTERACTION_WRITER_PUT_TIMEOUT 2      (seconds 'block' waits before dropping)
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+_STOP = object()
+
+
+class InteractionWriter:
+    def __init__(self, handler, workers=None, max_queue_size=None, overflow_policy=None, put_timeout=None):
+        self.handler = handler
+        self.workers = workers or int(os.environ.get("INTERACTION_WRITER_WORKERS", "4"))
+        self.max_queue_size = max_queue_size or int(os.environ.get("INTERACTION_WRITER_QUEUE_SIZE", "1000"))
+        self.overflow_policy = overflow_policy or os.environ.get("INTERACTION_WRITER_OVERFLOW", "block")
+        self.put_timeout = put_timeout if put_timeout is not None else \
+            float(os.environ.get("INTERACTION_WRITER_PUT_TIMEOUT", "2"))
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy {self.overflow_policy!r}, expected one of {OVERFLOW_POLICIES}")
+
+        shard_size = max(1, self.max_queue_size // self.workers)
+        self._queues = [queue.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._accepting = True
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "dropped": 0,
+            "peak_queue_depth": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+            "total_lag_seconds": 0.0,
+        }
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._start_lock:
+            if self._threads:
+                return
+            for index, shard in enumerate(self._queues):
+                thread = threading.Thread(target=self._worker, args=(shard,),
+                                          name=f"interaction-writer-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _shard_for(self, key):
+        return self._queues[zlib.crc32(str(key).encode()) % self.workers]
+
+    def submit(self, key, *args):
+        """
+        Queue handler(*args) on the worker that owns `key` (e.g. the user's
+        email).  Returns False if the item was dropped by the overflow policy.
+        """
+        if not self._accepting:
+            logger.warning("Interaction writer is draining, dropping interaction")
+            self._count("dropped")
+            return False
+        self.start()
+
+        shard = self._shard_for(key)
+        item = (time.monotonic(), args)
+        try:
+            if self.overflow_policy == "block":
+                shard.put(item, timeout=self.put_timeout)
+            elif self.overflow_policy == "drop_newest":
+                shard.put_nowait(item)
+            else:
+                self._put_drop_oldest(shard, item)
+        except queue.Full:
+            logger.warning(f"Interaction queue full ({self.overflow_policy}), dropping interaction for {key}")
+            self._count("dropped")
+            return False
+
+        with self._metrics_lock:
+            self._metrics["enqueued"] += 1
+            depth = self.queue_depth()
+            if depth > self._metrics["peak_queue_depth"]:
+                self._metrics["peak_queue_depth"] = depth
+        return True
+
+    def _put_drop_oldest(self, shard, item):
+        while True:
+            try:
+                shard.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    shard.get_nowait()
+                    shard.task_done()
+                    self._count("dropped")
+                except queue.Empty:
+                    pass
+
+    def _worker(self, shard):
+        while True:
+            item = shard.get()
+            try:
+                if item is _STOP:
+                    return
+                enqueued_at, args = item
+                lag = time.monotonic() - enqueued_at
+                with self._metrics_lock:
+                    self._metrics["last_lag_seconds"] = lag
+                    self._metrics["total_lag_seconds"] += lag
+                    if lag > self._metrics["max_lag_seconds"]:
+                        self._metrics["max_lag_seconds"] = lag
+                try:
+                    self.handler(*args)
+                    self._count("processed")
+                except Exception as e:
+                    logger.error(f"Interaction writer error: {e}")
+                    self._count("failed")
+            finally:
+                shard.task_done()
+
+    def _count(self, name):
+        with self._metrics_lock:
+            self._metrics[name] += 1
+
+    def queue_depth(self):
+        return sum(shard.qsize() for shard in self._queues)
+
+    def metrics(self):
+        """Queue depth, throughput, drop and lag counters"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue_depth"] = self.queue_depth()
+        metrics["workers"] = self.workers
+        metrics["max_queue_size"] = self.max_queue_size
+        metrics["overflow_policy"] = self.overflow_policy
+        done = metrics["processed"] + metrics["failed"]
+        metrics["avg_lag_seconds"] = metrics["total_lag_seconds"] / done if done else 0.0
+        return metrics
+
+    def drain(self, timeout=30):
+        """Shutdown hook: stop accepting work and flush what is queued"""
+        self._accepting = False
+        if not self._threads:
+            return True
+        deadline = time.monotonic() + timeout
+        for shard in self._queues:
+            try:
+                shard.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        drained = not any(thread.is_alive() for thread in self._threads)
+        if drained:
+            logger.info(f"Interaction writer drained: {self.metrics()}")
+        else:
+            logger.warning(f"Interaction writer drain timed out with {self.queue_depth()} queued")
+        return drained
+
+    def register_shutdown(self, timeout=30):
+        atexit.register(self.drain, timeout)
+        return self
@@ -0,0 +1,215 @@
+"""
+Per-user Prolog knowledge bases.
+
+Every chat request used to call kb.from_file(fact_file) on one global pytholog
+KnowledgeBase: the user's facts were re-parsed on every message, piled up as
+duplicates, leaked into other users' queries, and pytholog's query memo kept
+returning answers from before new facts were appended.
+
+KnowledgeBaseCache builds one KnowledgeBase per fact file from prolog/kb.pl's
+rules plus that file (read through their pre-parsed sidecars, see
+fact_files), and keeps it until either file's mtime or size changes.
+Cached bases are evicted least recently used when there are too many of them
+or their estimated size passes the memory cap.  pytholog's query memo rewrites
+cached answers in place, so each base is queried under its own lock.  Queries
+run through query_executor, which bounds their steps and time and raises
+QueryTimeout instead of hanging the request.  Each entry also carries the
+user's materialised FamilyIndex for find_related().
+
+Configuration (environment, with defaults):
+
+    PROLOG_KB_CACHE_SIZE    64   (knowledge bases kept)
+    PROLOG_KB_CACHE_MB      64   (estimated memory cap)
+"""
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pytholog as pl
+
+from fact_files import load_clauses
+from family_index import build_index
+from query_executor import query_executor
+
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = "prolog/kb.pl"
+
+_active_fact_file = contextvars.ContextVar("prolog_fact_file", default=None)
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def approximate_size(root):
+    """Deep sys.getsizeof over containers and plain objects"""
+    seen = set()
+    stack = [root]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(vars(obj))
+    return total
+
+
+class CachedKnowledgeBase:
+    def __init__(self, kb, stamps, size, rules_path, fact_file):
+        self.kb = kb
+        self.stamps = stamps
+        self.size = size
+        self.rules_path = rules_path
+        self.fact_file = fact_file
+        self.lock = threading.Lock()
+        self._family = None
+
+    def family_index(self):
+        """Every kb.pl relation materialised over this user's facts, built on first use"""
+        with self.lock:
+            if self._family is None:
+                self._family = build_index(self.rules_path, self.fact_file)
+            return self._family
+
+    def query(self, expr):
+        if isinstance(expr, str):
+            expr = pl.Expr(expr)
+        with self.lock:
+            return query_executor.run(self.kb, expr)
+
+    def contains(self, clause):
+        """Whether the normalised clause is already asserted (call with lock held)"""
+        fact = clause.replace(" ", "")
+        predicate = fact[:fact.index("(")] if "(" in fact else ""
+        bucket = self.kb.db.get(predicate)
+        return bucket is not None and any(existing.fact == fact for existing in bucket["facts"])
+
+    def add(self, clause):
+        """Assert a clause into the live knowledge base (call with lock held)"""
+        self.kb([clause])
+        # pytholog memoises answers per query; they may now be incomplete
+        self.kb.clear_cache()
+        self._family = None
+
+
+class KnowledgeBaseCache:
+    def __init__(self, rules_path=RULES_PATH, max_entries=None, max_bytes=None):
+        self.rules_path = rules_path
+        self.max_entries = max_entries or int(os.environ.get("PROLOG_KB_CACHE_SIZE", "64"))
+        self.max_bytes = max_bytes or int(os.environ.get("PROLOG_KB_CACHE_MB", "64")) * 1024 * 1024
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._counters = {"hits": 0, "builds": 0, "evictions": 0}
+
+    def _stamps(self, fact_file):
+        return _file_stamp(self.rules_path), _file_stamp(fact_file) if fact_file else None
+
+    def get(self, fact_file=None):
+        """The knowledge base for `fact_file` (rules only if None), rebuilt if either file changed"""
+        key = os.path.abspath(fact_file) if fact_file else None
+        stamps = self._stamps(fact_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamps == stamps:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            # Another request may have rebuilt it while we waited
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.stamps == stamps:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry
+            entry = self._build(fact_file, stamps)
+            self._store(key, entry)
+            return entry
+
+    def _build(self, fact_file, stamps):
+        start = time.perf_counter()
+        kb = pl.KnowledgeBase("family")
+        load_clauses(kb, self.rules_path)
+        if fact_file and stamps[1] is not None:
+            load_clauses(kb, fact_file)
+        entry = CachedKnowledgeBase(kb, stamps, approximate_size(kb.db), self.rules_path, fact_file)
+        logger.info(f"Built knowledge base for {fact_file or self.rules_path} "
+                    f"({entry.size // 1024} KiB) in {time.perf_counter() - start:.3f}s")
+        return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._counters["builds"] += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            # Never evict the entry we are about to hand out
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self._build_locks.pop(evicted_key, None)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, fact_file):
+        with self._lock:
+            entry = self._entries.pop(os.path.abspath(fact_file), None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def mark_current(self, fact_file, entry):
+        """Record that `entry` already reflects `fact_file` as it is on disk now"""
+        entry.stamps = self._stamps(fact_file)
+
+    def activate(self, fact_file):
+        """Make `fact_file` the knowledge base query() uses for this request"""
+        _active_fact_file.set(fact_file)
+        return self.get(fact_file)
+
+    def active_fact_file(self):
+        return _active_fact_file.get()
+
+    def query(self, expr, fact_file=None):
+        """Run `expr` against the given or active user's knowledge base"""
+        return self.get(fact_file or _active_fact_file.get()).query(expr)
+
+    def find_related(self, relation, person, fact_file=None):
+        """Every X with relation(X, person), looked up in the user's family index"""
+        entry = self.get(fact_file or _active_fact_file.get())
+        return entry.family_index().subjects(relation, person.replace(" ", ""))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["estimated_bytes"] = self._bytes
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        stats["queries"] = query_executor.stats()
+        return stats
+
+
+knowledge_bases = KnowledgeBaseCache()
@@ -0,0 +1,204 @@
+"""
+Two-tier WordNet lexical cache.
+
+check_meanings ("what is X") and save_semantic_memory look up the same common
+words over and over, and every lookup walks synsets, lemmas, antonyms,
+hypernyms and lexnames again.  LexicalCache stores the result of that walk per
+(word, wordnet POS) in an in-memory LRU backed by a SQLite file, so it
+survives restarts.  Entries are tagged with the WordNet version and dropped
+if the corpus changes.
+
+Configuration (environment, with defaults):
+
+    LEXICAL_CACHE_SIZE   5000                    (entries kept in memory)
+    LEXICAL_CACHE_PATH   lexical_cache.sqlite3   (empty string disables disk)
+
+    python lexical_cache.py            # print cache statistics
+    python lexical_cache.py --clear    # empty both tiers
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+from nlp_resources import wordnet
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LexicalEntry:
+    word: str
+    pos: str                 # wordnet POS, or "" for any part of speech
+    definitions: tuple       # every synset's definition, for check_meanings
+    definition: str          # first synset only, from here on
+    synonyms: tuple
+    antonyms: tuple
+    hypernym: str
+    domain: str
+
+    @property
+    def found(self):
+        return bool(self.definitions)
+
+
+def lookup_wordnet(word, pos=None):
+    """Walk WordNet for `word` and build an uncached LexicalEntry"""
+    synsets = wordnet().synsets(word, pos=pos) if pos else wordnet().synsets(word)
+    if not synsets:
+        return LexicalEntry(word, pos or "", (), "", (), (), "", "")
+    synset = synsets[0]
+    hypernyms = synset.hypernyms()
+    return LexicalEntry(
+        word=word,
+        pos=pos or "",
+        definitions=tuple(s.definition() for s in synsets),
+        definition=synset.definition(),
+        synonyms=tuple(sorted(set(lemma.name() for lemma in synset.lemmas()))),
+        antonyms=tuple(sorted(set(ant.name() for lemma in synset.lemmas() for ant in lemma.antonyms()))),
+        hypernym=hypernyms[0].lemmas()[0].name() if hypernyms else "",
+        domain=synset.lexname().split(".")[-1],
+    )
+
+
+class LexicalCache:
+    def __init__(self, max_size=None, path=None):
+        self.max_size = max_size or int(os.environ.get("LEXICAL_CACHE_SIZE", "5000"))
+        self.path = path if path is not None else os.environ.get("LEXICAL_CACHE_PATH", "lexical_cache.sqlite3")
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._db_failed = False
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, word, pos=None):
+        """Return the LexicalEntry for (word, pos), filling both tiers on a miss"""
+        key = (word.lower(), pos or "")
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry
+
+        entry = self._disk_get(key)
+        if entry is not None:
+            self._count("disk_hits")
+        else:
+            self._count("misses")
+            entry = lookup_wordnet(word, pos)
+            self._disk_put(key, entry)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _connection(self):
+        # Called with _db_lock held.  A broken or read-only cache file only
+        # costs us the disk tier, never the lookup itself.
+        if self._db is None and self.path and not self._db_failed:
+            try:
+                db = sqlite3.connect(self.path, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS lexicon (
+                        word TEXT NOT NULL, pos TEXT NOT NULL, entry TEXT NOT NULL,
+                        PRIMARY KEY (word, pos))
+                """)
+                version = wordnet().get_version()
+                row = db.execute("SELECT value FROM meta WHERE key = 'wordnet_version'").fetchone()
+                if row is None or row[0] != version:
+                    db.execute("DELETE FROM lexicon")
+                    db.execute("INSERT OR REPLACE INTO meta VALUES ('wordnet_version', ?)", (version,))
+                db.commit()
+                self._db = db
+            except (sqlite3.Error, LookupError) as e:
+                logger.warning(f"Lexical cache disk tier disabled ({self.path}): {e}")
+                self._db_failed = True
+        return self._db
+
+    def _disk_get(self, key):
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return None
+            try:
+                row = db.execute("SELECT entry FROM lexicon WHERE word = ? AND pos = ?", key).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Lexical cache read failed: {e}")
+                return None
+        if row is None:
+            return None
+        data = json.loads(row[0])
+        return LexicalEntry(**{name: tuple(value) if isinstance(value, list) else value
+                               for name, value in data.items()})
+
+    def _disk_put(self, key, entry):
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute("INSERT OR REPLACE INTO lexicon VALUES (?, ?, ?)", (*key, json.dumps(asdict(entry))))
+                db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Lexical cache write failed: {e}")
+
+    def disk_size(self):
+        with self._db_lock:
+            db = self._connection()
+            if db is None:
+                return 0
+            return db.execute("SELECT count(*) FROM lexicon").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM lexicon")
+                db.commit()
+
+    def stats(self):
+        """Hit/miss counters for both tiers"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_size"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["max_size"] = self.max_size
+        stats["path"] = self.path
+        return stats
+
+
+lexicon = LexicalCache()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Inspect the WordNet lexical cache")
+    arg_parser.add_argument("--clear", action="store_true", help="empty the memory and disk tiers")
+    args = arg_parser.parse_args()
+
+    if args.clear:
+        lexicon.clear()
+    print(f"{lexicon.disk_size()} entries on disk at {lexicon.path}")
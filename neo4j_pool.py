@@ -0,0 +1,185 @@
+"""
+Process-wide Neo4j driver shared by every memory helper.
+
+The driver (and its Bolt connection pool) is created lazily on first use and
+reused for the lifetime of the process, so helpers only borrow a session and
+hand it back with session.close().  Connection details come from the
+environment, falling back to the local Neo4j Desktop defaults:
+
+    NEO4J_URI                     bolt://localhost:7687
+    NEO4J_USER                    neo4j
+    NEO4J_PASSWORD                12345678@
+    NEO4J_MAX_POOL_SIZE           50     (connections kept in the pool)
+    NEO4J_ACQUISITION_TIMEOUT     30     (seconds to wait for a free connection)
+    NEO4J_LIVENESS_CHECK_TIMEOUT  60     (idle seconds before a pooled
+                                          connection is pinged on borrow)
+    NEO4J_MAX_CONNECTION_LIFETIME 3600   (seconds before a connection is recycled)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from neo4j import GraphDatabase
+
+
+logger = logging.getLogger(__name__)
+
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "12345678@")
+NEO4J_MAX_POOL_SIZE = int(os.environ.get("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT = float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "30"))
+NEO4J_LIVENESS_CHECK_TIMEOUT = float(os.environ.get("NEO4J_LIVENESS_CHECK_TIMEOUT", "60"))
+NEO4J_MAX_CONNECTION_LIFETIME = float(os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+
+_driver = None
+_driver_lock = threading.Lock()
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "driver_created_at": None,
+    "sessions_opened": 0,
+    "sessions_closed": 0,
+    "sessions_in_use": 0,
+    "peak_sessions_in_use": 0,
+    "queries_run": 0,
+    "query_errors": 0,
+    "total_query_seconds": 0.0,
+}
+
+
+def get_driver():
+    """Return the shared driver, creating it on first use"""
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(
+                    NEO4J_URI,
+                    auth=(NEO4J_USER, NEO4J_PASSWORD),
+                    max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                    connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+                    liveness_check_timeout=NEO4J_LIVENESS_CHECK_TIMEOUT,
+                    max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME,
+                )
+                with _metrics_lock:
+                    _metrics["driver_created_at"] = time.time()
+                logger.info(f"Neo4j driver created for {NEO4J_URI} (pool size {NEO4J_MAX_POOL_SIZE})")
+    return _driver
+
+
+class PooledSession:
+    """Borrowed Neo4j session; close() returns its connection to the pool"""
+
+    def __init__(self, session):
+        self._session = session
+        self._closed = False
+
+    def run(self, query, parameters=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = self._session.run(query, parameters, **kwargs)
+        except Exception:
+            with _metrics_lock:
+                _metrics["query_errors"] += 1
+            raise
+        finally:
+            with _metrics_lock:
+                _metrics["queries_run"] += 1
+                _metrics["total_query_seconds"] += time.perf_counter() - start
+        return result
+
+    def _execute(self, method, transaction_function, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(transaction_function, *args, **kwargs)
+        except Exception:
+            with _metrics_lock:
+                _metrics["query_errors"] += 1
+            raise
+        finally:
+            with _metrics_lock:
+                _metrics["queries_run"] += 1
+                _metrics["total_query_seconds"] += time.perf_counter() - start
+
+    def execute_write(self, transaction_function, *args, **kwargs):
+        return self._execute(self._session.execute_write, transaction_function, *args, **kwargs)
+
+    def execute_read(self, transaction_function, *args, **kwargs):
+        return self._execute(self._session.execute_read, transaction_function, *args, **kwargs)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._session.close()
+        finally:
+            with _metrics_lock:
+                _metrics["sessions_closed"] += 1
+                _metrics["sessions_in_use"] -= 1
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def get_neo4j_session(**kwargs):
+    """Borrow a session from the shared driver's connection pool"""
+    session = PooledSession(get_driver().session(**kwargs))
+    with _metrics_lock:
+        _metrics["sessions_opened"] += 1
+        _metrics["sessions_in_use"] += 1
+        if _metrics["sessions_in_use"] > _metrics["peak_sessions_in_use"]:
+            _metrics["peak_sessions_in_use"] = _metrics["sessions_in_use"]
+    return session
+
+
+def verify_connectivity():
+    """Check that the database is reachable through the pool"""
+    try:
+        get_driver().verify_connectivity()
+        return True
+    except Exception as e:
+        logger.warning(f"Neo4j connectivity check failed: {e}")
+        return False
+
+
+def pool_metrics():
+    """Snapshot of pool configuration and session/query usage counters"""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics["uri"] = NEO4J_URI
+    metrics["max_pool_size"] = NEO4J_MAX_POOL_SIZE
+    metrics["acquisition_timeout"] = NEO4J_ACQUISITION_TIMEOUT
+    metrics["liveness_check_timeout"] = NEO4J_LIVENESS_CHECK_TIMEOUT
+    metrics["driver_active"] = _driver is not None
+    if metrics["queries_run"]:
+        metrics["avg_query_ms"] = metrics["total_query_seconds"] * 1000 / metrics["queries_run"]
+    else:
+        metrics["avg_query_ms"] = 0.0
+    return metrics
+
+
+def close_driver():
+    """Shutdown hook: close the shared driver and every pooled connection"""
+    global _driver
+    with _driver_lock:
+        if _driver is None:
+            return
+        driver, _driver = _driver, None
+    try:
+        driver.close()
+        logger.info(f"Neo4j driver closed: {pool_metrics()}")
+    except Exception as e:
+        logger.warning(f"Error closing Neo4j driver: {e}")
+
+
+atexit.register(close_driver)
@@ -0,0 +1,208 @@
+"""
+Schema bootstrap for the memory graph.
+
+Creates the uniqueness constraints and range/text indexes behind every
+MERGE/MATCH lookup in the memory pipeline, waits for them to come ONLINE and
+reports how many of those lookups are backed by an index.  Every statement
+uses IF NOT EXISTS, so running it on each startup is safe.
+
+    python neo4j_schema.py           # migrate, then print the coverage report
+    python neo4j_schema.py --report  # only print the coverage report
+"""
+import argparse
+import logging
+import time
+
+from neo4j_pool import get_neo4j_session
+
+
+logger = logging.getLogger(__name__)
+
+# (name, statement, label, property)
+SCHEMA = [
+    # Identity keys
+    ("user_email_unique",
+     "CREATE CONSTRAINT user_email_unique IF NOT EXISTS FOR (n:User) REQUIRE n.email IS UNIQUE",
+     "User", "email"),
+    ("episode_session_id_unique",
+     "CREATE CONSTRAINT episode_session_id_unique IF NOT EXISTS FOR (n:Episode) REQUIRE n.session_id IS UNIQUE",
+     "Episode", "session_id"),
+    ("interaction_id_unique",
+     "CREATE CONSTRAINT interaction_id_unique IF NOT EXISTS FOR (n:Interaction) REQUIRE n.interaction_id IS UNIQUE",
+     "Interaction", "interaction_id"),
+
+    # Sensory memory: sentences and full texts can be long, so they get text
+    # indexes (which also serve equality) instead of size-limited range indexes
+    ("text_full_text",
+     "CREATE TEXT INDEX text_full_text IF NOT EXISTS FOR (n:Text) ON (n.full_text)",
+     "Text", "full_text"),
+    ("text_timestamp",
+     "CREATE RANGE INDEX text_timestamp IF NOT EXISTS FOR (n:Text) ON (n.timestamp)",
+     "Text", "timestamp"),
+    ("sentence_text",
+     "CREATE TEXT INDEX sentence_text IF NOT EXISTS FOR (n:Sentence) ON (n.sentence_text)",
+     "Sentence", "sentence_text"),
+    ("word_text",
+     "CREATE RANGE INDEX word_text IF NOT EXISTS FOR (n:Word) ON (n.word_text)",
+     "Word", "word_text"),
+
+    # Semantic memory
+    ("description_text",
+     "CREATE RANGE INDEX description_text IF NOT EXISTS FOR (n:Description) ON (n.description)",
+     "Description", "description"),
+    ("synonym_text",
+     "CREATE RANGE INDEX synonym_text IF NOT EXISTS FOR (n:Synonym) ON (n.synonym)",
+     "Synonym", "synonym"),
+    ("antonym_text",
+     "CREATE RANGE INDEX antonym_text IF NOT EXISTS FOR (n:Antonym) ON (n.antonym)",
+     "Antonym", "antonym"),
+    ("category_name",
+     "CREATE RANGE INDEX category_name IF NOT EXISTS FOR (n:Category) ON (n.name)",
+     "Category", "name"),
+    ("domain_name",
+     "CREATE RANGE INDEX domain_name IF NOT EXISTS FOR (n:Domain) ON (n.domain_name)",
+     "Domain", "domain_name"),
+
+    # Social memory, agent and sensor readings
+    ("person_name",
+     "CREATE RANGE INDEX person_name IF NOT EXISTS FOR (n:Person) ON (n.name)",
+     "Person", "name"),
+    ("agent_name",
+     "CREATE RANGE INDEX agent_name IF NOT EXISTS FOR (n:Agent) ON (n.name)",
+     "Agent", "name"),
+    ("dht11_timestamp",
+     "CREATE RANGE INDEX dht11_timestamp IF NOT EXISTS FOR (n:DHT11) ON (n.timestamp)",
+     "DHT11", "timestamp"),
+    ("dht11_rollup_bucket",
+     "CREATE RANGE INDEX dht11_rollup_bucket IF NOT EXISTS FOR (n:DHT11Rollup) ON (n.resolution, n.source, n.start)",
+     "DHT11Rollup", "resolution"),
+]
+
+
+def _run_statements(neo4j_session):
+    created, failed = [], []
+    for name, statement, label, prop in SCHEMA:
+        try:
+            neo4j_session.run(statement).consume()
+            created.append(name)
+        except Exception as e:
+            # Typically existing duplicate data blocking a uniqueness constraint
+            logger.error(f"Schema statement {name} failed: {e}")
+            failed.append(name)
+    return created, failed
+
+
+def _index_states(neo4j_session):
+    result = neo4j_session.run("""
+        SHOW INDEXES
+        YIELD name, type, state, populationPercent, labelsOrTypes, properties, owningConstraint
+        RETURN name, type, state, populationPercent, labelsOrTypes, properties, owningConstraint
+    """)
+    return [record.data() for record in result]
+
+
+def wait_until_online(neo4j_session, names, timeout=300, poll_interval=1.0):
+    """Poll SHOW INDEXES until every named index/constraint index is ONLINE"""
+    deadline = time.monotonic() + timeout
+    while True:
+        states = {}
+        for index in _index_states(neo4j_session):
+            states[index["name"]] = index["state"]
+            if index["owningConstraint"]:
+                states[index["owningConstraint"]] = index["state"]
+        pending = {name: states.get(name, "MISSING") for name in names if states.get(name) != "ONLINE"}
+        if not pending:
+            return {}
+        if any(state == "FAILED" for state in pending.values()) or time.monotonic() >= deadline:
+            return pending
+        time.sleep(poll_interval)
+
+
+def index_coverage(neo4j_session):
+    """
+    Report which of the pipeline's (label, property) lookups are served by an
+    ONLINE index, plus the node count behind each lookup.
+    """
+    indexes = _index_states(neo4j_session)
+    lookups = []
+    for name, statement, label, prop in SCHEMA:
+        covering = [
+            index["name"] for index in indexes
+            if index["state"] == "ONLINE"
+            and index["labelsOrTypes"] == [label]
+            and index["properties"]
+            and index["properties"][0] == prop
+        ]
+        node_count = neo4j_session.run(f"MATCH (n:`{label}`) RETURN count(n) AS c").single()["c"]
+        lookups.append({
+            "label": label,
+            "property": prop,
+            "indexes": covering,
+            "covered": bool(covering),
+            "nodes": node_count,
+        })
+    covered = sum(1 for lookup in lookups if lookup["covered"])
+    return {
+        "lookups": lookups,
+        "covered": covered,
+        "total": len(lookups),
+        "coverage_percent": round(100.0 * covered / len(lookups), 1) if lookups else 100.0,
+        "indexes_in_graph": len(indexes),
+    }
+
+
+def ensure_schema(wait=True, timeout=300):
+    """
+    Startup migration: create constraints and indexes, wait for them to come
+    ONLINE and return the coverage report.  Never raises, so a database that
+    is down at startup does not stop the app from serving.
+    """
+    neo4j_session = get_neo4j_session()
+    try:
+        start = time.perf_counter()
+        created, failed = _run_statements(neo4j_session)
+        pending = wait_until_online(neo4j_session, created, timeout) if wait else {}
+        report = index_coverage(neo4j_session)
+        report["failed"] = failed
+        report["pending"] = pending
+        report["seconds"] = round(time.perf_counter() - start, 2)
+        logger.info(f"Neo4j schema ready: {report['covered']}/{report['total']} lookups indexed "
+                    f"({report['coverage_percent']}%) in {report['seconds']}s")
+        if failed or pending:
+            logger.warning(f"Neo4j schema incomplete - failed: {failed}, not online: {pending}")
+        return report
+    except Exception as e:
+        logger.warning(f"Neo4j schema bootstrap skipped: {e}")
+        return None
+    finally:
+        neo4j_session.close()
+
+
+def print_report(report):
+    print(f"{'label':<12} {'property':<15} {'nodes':>8}  index")
+    for lookup in report["lookups"]:
+        index = ", ".join(lookup["indexes"]) if lookup["covered"] else "-- MISSING --"
+        print(f"{lookup['label']:<12} {lookup['property']:<15} {lookup['nodes']:>8}  {index}")
+    print(f"\nCoverage: {report['covered']}/{report['total']} lookups ({report['coverage_percent']}%), "
+          f"{report['indexes_in_graph']} indexes in graph")
+    for key in ("failed", "pending"):
+        if report.get(key):
+            print(f"{key.capitalize()}: {report[key]}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Create and report Neo4j constraints and indexes")
+    arg_parser.add_argument("--report", action="store_true", help="only print the index coverage report")
+    args = arg_parser.parse_args()
+
+    if args.report:
+        neo4j_session = get_neo4j_session()
+        try:
+            print_report(index_coverage(neo4j_session))
+        finally:
+            neo4j_session.close()
+    else:
+        report = ensure_schema()
+        if report:
+            print_report(report)
@@ -0,0 +1,104 @@
+"""
+Shared, pre-warmed NLTK resources.
+
+NLTK's pos_tag() and ne_chunk() build a new PerceptronTagger / maxent chunker
+on every call, SentimentIntensityAnalyzer() re-reads the VADER lexicon, and
+WordNet and punkt load lazily on first use.  This registry loads each model
+exactly once, can warm all of them on a background thread at startup, and
+records how long each took.  The loaded objects are only read after loading,
+so they are shared across request and worker threads.
+"""
+import logging
+import threading
+import time
+
+from nltk import sent_tokenize, word_tokenize
+from nltk.chunk import ne_chunker
+from nltk.corpus import wordnet as wn
+from nltk.sentiment import SentimentIntensityAnalyzer
+from nltk.tag import PerceptronTagger
+
+
+logger = logging.getLogger(__name__)
+
+
+def _load_punkt():
+    # sent_tokenize caches its PunktTokenizer; word_tokenize shares it
+    word_tokenize(sent_tokenize("Warm up the tokenizer. It is cached afterwards.")[0])
+    return sent_tokenize
+
+
+def _load_wordnet():
+    wn.ensure_loaded()
+    wn.synsets("warm")
+    return wn
+
+
+class NLPResourceRegistry:
+    LOADERS = {
+        "punkt": _load_punkt,
+        "tagger": PerceptronTagger,
+        "chunker": ne_chunker,
+        "vader": SentimentIntensityAnalyzer,
+        "wordnet": _load_wordnet,
+    }
+
+    def __init__(self):
+        self._resources = {}
+        self._load_times = {}
+        self._locks = {name: threading.Lock() for name in self.LOADERS}
+
+    def get(self, name):
+        """Return the named resource, loading it on first use"""
+        resource = self._resources.get(name)
+        if resource is not None:
+            return resource
+        with self._locks[name]:
+            resource = self._resources.get(name)
+            if resource is None:
+                start = time.perf_counter()
+                resource = self.LOADERS[name]()
+                self._load_times[name] = time.perf_counter() - start
+                self._resources[name] = resource
+                logger.info(f"Loaded NLTK resource {name} in {self._load_times[name]:.2f}s")
+        return resource
+
+    def warm_up(self, names=None):
+        """Load every (or the named) resource now; returns load times"""
+        for name in names or self.LOADERS:
+            try:
+                self.get(name)
+            except LookupError as e:
+                logger.error(f"NLTK resource {name} is missing, run download.py: {e}")
+        return self.load_times()
+
+    def warm_up_async(self, names=None):
+        """Warm resources on a background thread so startup is not blocked"""
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="nlp-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, name):
+        return name in self._resources
+
+    def load_times(self):
+        return dict(self._load_times)
+
+
+nlp = NLPResourceRegistry()
+
+
+def pos_tag(tokens):
+    return nlp.get("tagger").tag(list(tokens))
+
+
+def ne_chunk(tagged_tokens):
+    return nlp.get("chunker").parse(list(tagged_tokens))
+
+
+def sentiment_analyzer():
+    return nlp.get("vader")
+
+
+def wordnet():
+    return nlp.get("wordnet")
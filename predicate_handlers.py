@@ -0,0 +1,150 @@
+"""
+Predicate handlers for prompt_check().
+
+AIML templates ask the app for work by <set>ting predicates (dob_person,
+word, get_dht11_temperature, ...).  prompt_check() used to read a hardcoded
+list of those keys and run every handler one after another, and the same key
+list was repeated wherever the predicates were cleared after a reply.
+
+Each handler is now registered once with the predicates it reads:
+
+    @prompt_handlers.handler("dob_person")
+    def _find_dob(values):
+        find_dob(values["dob_person"])
+
+A handler runs when all of its predicates are non-empty, or when its `when`
+callable says so.  `after` names handlers that must finish first if they run
+in the same message, e.g. fact writers wait for the fact lookups so answers
+still reflect the facts from before the message.  Independent handlers run
+concurrently on one shared thread pool, each in a copy of the caller's
+context so the AIML session, the active knowledge base and Flask's session
+follow them.  Every handler's latency is recorded.
+
+Configuration (environment, with defaults):
+
+    PROMPT_HANDLER_WORKERS    8
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+logger = logging.getLogger(__name__)
+
+
+class PredicateHandler:
+    def __init__(self, name, keys, func, when=None, after=()):
+        self.name = name
+        self.keys = keys
+        self.func = func
+        self.when = when
+        self.after = tuple(after)
+
+    def triggered(self, values):
+        if self.when is not None:
+            return bool(self.when(values))
+        return all(values[key] for key in self.keys)
+
+
+class PredicateRegistry:
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.environ.get("PROMPT_HANDLER_WORKERS", "8"))
+        self._handlers = {}
+        self._keys = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._latency = {}
+
+    def register(self, name, keys, func, when=None, after=()):
+        if name in self._handlers:
+            raise ValueError(f"Predicate handler {name!r} is already registered")
+        missing = [dependency for dependency in after if dependency not in self._handlers]
+        if missing:
+            raise ValueError(f"{name!r} runs after unregistered handlers {missing}")
+        self._handlers[name] = PredicateHandler(name, tuple(keys), func, when, after)
+        for key in keys:
+            self._keys[key] = None
+
+    def handler(self, *keys, when=None, after=()):
+        """Decorator form of register(); the handler is named after the function"""
+        def decorate(func):
+            self.register(func.__name__.lstrip("_"), keys, func, when, after)
+            return func
+        return decorate
+
+    def keys(self):
+        """Every predicate a handler reads, in registration order"""
+        return list(self._keys)
+
+    def clear(self, set_predicate, extra=()):
+        """Reset the handlers' predicates (plus `extra`) once a reply is done"""
+        for key in self.keys() + list(extra):
+            set_predicate(key, "")
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="prompt-handler")
+            return self._executor
+
+    def _run(self, handler, values):
+        start = time.perf_counter()
+        failed = False
+        try:
+            handler.func(values)
+        except Exception:
+            failed = True
+            logger.exception(f"Predicate handler {handler.name} failed")
+        finally:
+            self._record(handler.name, time.perf_counter() - start, failed)
+        return handler.name
+
+    def _record(self, name, seconds, failed):
+        with self._lock:
+            latency = self._latency.get(name)
+            if latency is None:
+                latency = self._latency[name] = {"calls": 0, "errors": 0, "total_seconds": 0.0,
+                                                 "max_seconds": 0.0, "last_seconds": 0.0}
+            latency["calls"] += 1
+            latency["errors"] += failed
+            latency["total_seconds"] += seconds
+            latency["max_seconds"] = max(latency["max_seconds"], seconds)
+            latency["last_seconds"] = seconds
+
+    def dispatch(self, get_predicate):
+        """
+        Read every registered predicate with `get_predicate`, run the
+        triggered handlers, and return their names in completion order.
+        """
+        values = {key: get_predicate(key).strip() for key in self._keys}
+        pending = {name: handler for name, handler in self._handlers.items() if handler.triggered(values)}
+        if len(pending) <= 1:
+            return [self._run(handler, values) for handler in pending.values()]
+
+        running, order = {}, []
+        while pending or running:
+            unfinished = set(pending) | set(running.values())
+            for name, handler in list(pending.items()):
+                # Dependencies that were not triggered this time do not hold anything up
+                if not unfinished.intersection(handler.after):
+                    del pending[name]
+                    context = contextvars.copy_context()
+                    running[self._pool().submit(context.run, self._run, handler, values)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                order.append(running.pop(future))
+        return order
+
+    def stats(self):
+        with self._lock:
+            stats = {name: dict(latency) for name, latency in self._latency.items()}
+        for latency in stats.values():
+            latency["mean_seconds"] = latency["total_seconds"] / latency["calls"]
+        return stats
+
+
+prompt_handlers = PredicateRegistry()
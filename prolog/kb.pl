@@ -35,7 +35,7 @@ cousin(X,Y) :- parent(Z,X), parent(W,Y), sibling(Z,W), X \= Y.
 
 % Helper: Older
 older(X,Y) :- dob(X, date(Y1,M1,D1)), dob(Y, date(Y2,M2,D2)),
-              (Y1 < Y2 ; (Y1 = Y2, M1 < M2) ; (Y1 = Y2, M1 = Y2, D1 < D2)).
+              (Y1 < Y2 ; (Y1 = Y2, M1 < M2) ; (Y1 = Y2, M1 = M2, D1 < D2)).
 
 
 
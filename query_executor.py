@@ -0,0 +1,193 @@
+"""
+Bounded Prolog queries.
+
+pytholog's kb.query() searches until its goal queue is empty.  A recursive
+rule over cyclic facts never empties it, and a large fact set can keep a
+request thread busy for seconds.  QueryExecutor runs the same breadth-first
+search as pytholog's rule_query, with three guards:
+
+  * a step budget: every goal taken off the queue is one step;
+  * a deadline, checked every few hundred steps;
+  * a cycle guard that drops a rule goal whose bound arguments repeat one of
+    its own ancestors, since no proof can need itself as a premise.
+
+A query that runs out of steps or time raises QueryTimeout rather than
+returning a partial answer, and is not memoised.  Completed answers are
+memoised in the knowledge base's own cache, so kb.clear_cache() after new
+facts are asserted drops them too.
+
+Configuration (environment, with defaults):
+
+    PROLOG_QUERY_MAX_STEPS      20000
+    PROLOG_QUERY_TIMEOUT        0.5    (seconds)
+    PROLOG_SLOW_QUERY           0.1    (seconds; slower queries are counted and logged)
+"""
+import logging
+import os
+import threading
+import time
+
+from pytholog.expr import Expr
+from pytholog.fact import Fact
+from pytholog.goal import Goal
+from pytholog.pq import SearchQueue
+from pytholog.querizer import simple_query
+from pytholog.search_util import child_assigned, filter_eq, parent_inherits, prob_calc
+from pytholog.unify import unify
+from pytholog.util import answer_handler, is_variable
+
+
+logger = logging.getLogger(__name__)
+
+# Steps between deadline checks
+_CLOCK_EVERY = 256
+
+
+class QueryTimeout(Exception):
+    """A query ran out of resolution steps or time before finishing"""
+
+    def __init__(self, expr, reason, steps, seconds):
+        super().__init__(f"{expr} aborted after {steps} steps and {seconds:.3f}s ({reason})")
+        self.expr = expr
+        self.reason = reason
+        self.steps = steps
+        self.seconds = seconds
+
+
+def _call_key(goal):
+    """(rule, bound head arguments) if every head argument is bound, else None"""
+    values = []
+    for term in goal.fact.lh.terms:
+        if is_variable(term):
+            term = goal.domain.get(term)
+            if term is None:
+                return None
+        values.append(term)
+    return id(goal.fact), tuple(values)
+
+
+def _repeats_ancestor(goal):
+    key = _call_key(goal)
+    if key is None:
+        return False
+    ancestor = goal.parent
+    while ancestor is not None and ancestor.parent is not None:
+        if ancestor.fact is goal.fact and _call_key(ancestor) == key:
+            return True
+        ancestor = ancestor.parent
+    return False
+
+
+def _child_to_parent(child, queue):
+    # pytholog.search_util.child_to_parent, unchanged
+    parent = child.parent.__copy__()
+    unify(parent.fact.rhs[parent.ind], child.fact.lh, parent.domain, child.domain)
+    parent.ind += 1
+    queue.push(parent)
+
+
+class QueryExecutor:
+    def __init__(self, max_steps=None, timeout=None, slow_seconds=None):
+        self.max_steps = max_steps or int(os.environ.get("PROLOG_QUERY_MAX_STEPS", "20000"))
+        self.timeout = timeout or float(os.environ.get("PROLOG_QUERY_TIMEOUT", "0.5"))
+        self.slow_seconds = slow_seconds or float(os.environ.get("PROLOG_SLOW_QUERY", "0.1"))
+        self._lock = threading.Lock()
+        self._counters = {"queries": 0, "memo_hits": 0, "slow": 0, "aborted_steps": 0,
+                          "aborted_deadline": 0, "cycles_pruned": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def run(self, kb, expr):
+        """
+        Answer `expr` against pytholog KnowledgeBase `kb` like kb.query(expr):
+        a list of binding dicts, ["Yes"] or ["No"], or None for an unknown
+        predicate.  Raises QueryTimeout if the budget runs out.
+        """
+        if isinstance(expr, str):
+            expr = Expr(expr)
+        self._count("queries")
+        if expr.predicate not in kb.db:
+            return None
+
+        memo_key = ("bounded", expr.to_string())
+        answer = kb._cache.get(memo_key)
+        if answer is not None:
+            self._count("memo_hits")
+        else:
+            start = time.perf_counter()
+            if any(kb.db[expr.predicate]["goals"]):
+                answer = self._search(kb, expr, start)
+            else:
+                answer = simple_query(kb, expr)
+            seconds = time.perf_counter() - start
+            if seconds >= self.slow_seconds:
+                self._count("slow")
+                logger.warning(f"Slow Prolog query {expr.to_string()}: {seconds:.3f}s")
+            kb._cache[memo_key] = answer
+        # Callers get their own dicts; the memo must not be edited through them
+        return [dict(row) if isinstance(row, dict) else row for row in answer]
+
+    def _search(self, kb, expr, start):
+        """pytholog's rule_query search loop with the step, time and cycle guards"""
+        deadline = start + self.timeout
+        root = Goal(Fact("start(search):-from(random_point)"))
+        root.fact.rhs = [expr]
+        queue = SearchQueue()
+        queue.push(root)
+        answer = []
+        steps = pruned = 0
+
+        while not queue.empty:
+            steps += 1
+            if steps > self.max_steps:
+                self._abort(expr, "aborted_steps", "step budget", steps - 1, start, pruned)
+            if steps % _CLOCK_EVERY == 0 and time.perf_counter() > deadline:
+                self._abort(expr, "aborted_deadline", "deadline", steps, start, pruned)
+
+            goal = queue.pop()
+            if goal.ind >= len(goal.fact.rhs):
+                if goal.parent is None:
+                    answer.append(goal.domain if goal.domain else "Yes")
+                    continue
+                _child_to_parent(goal, queue)
+                continue
+
+            if goal.ind == 0 and goal.parent is not None and _repeats_ancestor(goal):
+                pruned += 1
+                continue
+
+            rule = goal.fact.rhs[goal.ind]
+            if rule.predicate == "":
+                prob_calc(goal, rule, queue)
+            elif rule.predicate == "neq":
+                filter_eq(rule, goal, queue)
+            elif rule.predicate in kb.db:
+                facts = kb.db[rule.predicate]["facts"]
+                if goal.parent is None:
+                    parent_inherits(rule, facts, goal, queue)
+                else:
+                    child_assigned(rule, facts, goal, queue)
+
+        if pruned:
+            self._count("cycles_pruned", pruned)
+        return answer_handler(answer)
+
+    def _abort(self, expr, counter, reason, steps, start, pruned):
+        self._count(counter)
+        if pruned:
+            self._count("cycles_pruned", pruned)
+        error = QueryTimeout(expr.to_string(), reason, steps, time.perf_counter() - start)
+        logger.warning(str(error))
+        raise error
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["max_steps"] = self.max_steps
+        stats["timeout"] = self.timeout
+        return stats
+
+
+query_executor = QueryExecutor()
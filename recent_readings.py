@@ -0,0 +1,182 @@
+"""
+Recent sensor readings, kept in memory per device and user.
+
+get_dht11_memory_data() used to run `MATCH (s:DHT11:SensoryMemory) ...
+ORDER BY s.timestamp DESC LIMIT n` over every reading from every user each
+time a template asked for the latest readings.  Each sensor manager now
+keeps a RecentReadings for its device.  It holds one fixed-size ring per
+user: timestamps and recommendations in preallocated lists, numeric values
+in float arrays (NaN for missing).  A reading is recorded the moment it is
+validated, before sensor_buffer has written it to Neo4j.
+
+latest() is answered from the ring.  Only when the user's ring is cold (the
+process has not yet seen `limit` readings for them) is Neo4j asked, once,
+with a query scoped to the user's HAS_SENSOR_READING edges.  What it returns
+is merged into the ring, so the next call stays in memory.
+
+Configuration (environment, with defaults):
+
+    RECENT_READINGS_SIZE   120   (readings kept per device and user)
+"""
+import logging
+import math
+import os
+import threading
+from array import array
+
+from neo4j_pool import get_neo4j_session
+
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = ("temperature", "humidity", "comfort_score")
+
+# Only this ring's device: one ESP32 (by address), or the serial DHT11 (neither property set)
+DEVICE_FILTER = "coalesce(s.data_source, '') = coalesce($data_source, '') " \
+                "AND coalesce(s.esp32_ip, '') = coalesce($esp32_ip, '')"
+
+USER_READINGS_QUERY = f"""
+MATCH (:User {{email: $email}})-[:HAS_SENSOR_READING]->(s:DHT11:SensoryMemory)
+WHERE {DEVICE_FILTER}
+RETURN s.timestamp AS timestamp, s.temperature AS temperature, s.humidity AS humidity,
+       s.comfort_score AS comfort_score, s.recommendations AS recommendations
+ORDER BY s.timestamp DESC
+LIMIT $limit
+"""
+
+# Readings taken while nobody was logged in are not linked to a user
+UNLINKED_READINGS_QUERY = f"""
+MATCH (s:DHT11:SensoryMemory)
+WHERE s.timestamp IS NOT NULL AND {DEVICE_FILTER}
+RETURN s.timestamp AS timestamp, s.temperature AS temperature, s.humidity AS humidity,
+       s.comfort_score AS comfort_score, s.recommendations AS recommendations
+ORDER BY s.timestamp DESC
+LIMIT $limit
+"""
+
+
+def _float(value):
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _value(number):
+    return None if math.isnan(number) else number
+
+
+class ReadingRing:
+    """The last `capacity` readings of one device for one user, oldest overwritten first"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._timestamps = [None] * capacity
+        self._recommendations = [None] * capacity
+        self._columns = {field: array("d", [math.nan]) * capacity for field in NUMERIC_FIELDS}
+        self._next = 0
+        self.size = 0
+        self.backfilled = False
+
+    def append(self, timestamp, temperature=None, humidity=None, comfort_score=None, recommendations=None):
+        slot = self._next
+        self._timestamps[slot] = timestamp
+        self._recommendations[slot] = recommendations
+        self._columns["temperature"][slot] = _float(temperature)
+        self._columns["humidity"][slot] = _float(humidity)
+        self._columns["comfort_score"][slot] = _float(comfort_score)
+        self._next = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def latest(self, limit):
+        """Up to `limit` readings as dicts, newest first"""
+        readings = []
+        for back in range(1, min(limit, self.size) + 1):
+            slot = (self._next - back) % self.capacity
+            reading = {field: _value(self._columns[field][slot]) for field in NUMERIC_FIELDS}
+            reading["timestamp"] = self._timestamps[slot]
+            reading["recommendations"] = self._recommendations[slot]
+            readings.append(reading)
+        return readings
+
+
+class RecentReadings:
+    def __init__(self, device, data_source=None, capacity=None):
+        self.device = device
+        self.data_source = data_source
+        self.capacity = capacity or int(os.environ.get("RECENT_READINGS_SIZE", "120"))
+        self._rings = {}
+        self._lock = threading.Lock()
+        self._counters = {"recorded": 0, "served_from_memory": 0, "served_from_neo4j": 0, "neo4j_errors": 0}
+
+    def _ring(self, user_email):
+        ring = self._rings.get(user_email)
+        if ring is None:
+            ring = self._rings[user_email] = ReadingRing(self.capacity)
+        return ring
+
+    def record(self, user_email, timestamp, temperature=None, humidity=None, comfort_score=None,
+               recommendations=None):
+        """Remember a validated reading taken for `user_email` (None if nobody is logged in)"""
+        with self._lock:
+            self._ring(user_email).append(timestamp, temperature, humidity, comfort_score, recommendations)
+            self._counters["recorded"] += 1
+
+    def latest(self, user_email, limit=5):
+        """
+        The user's `limit` most recent readings on this device, newest first,
+        as dicts in the shape get_dht11_memory_data() returns.
+        """
+        with self._lock:
+            ring = self._ring(user_email)
+            warm = ring.size >= limit or ring.backfilled
+            readings = ring.latest(limit)
+            if warm:
+                self._counters["served_from_memory"] += 1
+        if not warm:
+            readings = self._backfill(user_email, limit)
+        return [self._shape(reading) for reading in readings]
+
+    def _backfill(self, user_email, limit):
+        try:
+            with get_neo4j_session() as neo4j_session:
+                rows = neo4j_session.run(USER_READINGS_QUERY if user_email else UNLINKED_READINGS_QUERY,
+                                         email=user_email, data_source=self.data_source,
+                                         esp32_ip=self.device if self.data_source == 'ESP32' else None,
+                                         limit=self.capacity).data()
+        except Exception as e:
+            logger.warning(f"Could not load recent {self.device} readings from Neo4j: {e}")
+            with self._lock:
+                self._counters["neo4j_errors"] += 1
+                return self._ring(user_email).latest(limit)
+
+        with self._lock:
+            ring = self._ring(user_email)
+            # Readings recorded since the process started may not have been flushed yet
+            merged = {reading["timestamp"]: reading for reading in rows}
+            merged.update((reading["timestamp"], reading) for reading in ring.latest(ring.size))
+            refilled = ReadingRing(self.capacity)
+            for timestamp in sorted(merged)[-self.capacity:]:
+                reading = merged[timestamp]
+                refilled.append(timestamp, reading["temperature"], reading["humidity"],
+                                reading["comfort_score"], reading["recommendations"])
+            refilled.backfilled = True
+            self._rings[user_email] = refilled
+            self._counters["served_from_neo4j"] += 1
+            return refilled.latest(limit)
+
+    def _shape(self, reading):
+        if self.data_source is not None:
+            reading["data_source"] = self.data_source
+        return reading
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["users"] = len(self._rings)
+            stats["readings_held"] = sum(ring.size for ring in self._rings.values())
+        stats["device"] = self.device
+        stats["capacity"] = self.capacity
+        return stats
@@ -0,0 +1,229 @@
+"""
+Buffered batch writes for DHT11 sensor readings.
+
+The sensor managers used to start a thread per reading.  Each thread borrowed
+a session, CREATEd the DHT11:SensoryMemory node, then ran a second query that
+found the node again by timestamp so it could link the current user.  Readings
+are now added to one process-wide buffer.  A flusher thread writes them with a
+single UNWIND statement per batch, in one write transaction, and the
+HAS_SENSOR_READING edge is created in that same statement.  The batch's
+minute/hour/day rollups (sensor_rollups) are updated in the same
+transaction, from the raw values, including readings that sensor_filter
+kept out of the graph.
+A batch is flushed once it holds SENSOR_BATCH_SIZE readings, or when the
+oldest reading has waited SENSOR_FLUSH_INTERVAL seconds.
+
+A batch that fails to write goes back to the front of the buffer and is
+retried one flush interval later.  While Neo4j is down the buffer keeps at most
+SENSOR_BUFFER_MAX readings and drops the oldest beyond that.
+
+Configuration (environment, with defaults):
+
+    SENSOR_BATCH_SIZE       50
+    SENSOR_FLUSH_INTERVAL   10     (seconds)
+    SENSOR_BUFFER_MAX       5000   (readings held while writes are failing)
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from neo4j_pool import get_neo4j_session
+from sensor_rollups import apply_rollups
+
+
+logger = logging.getLogger(__name__)
+
+SENSOR_BATCH_QUERY = """
+UNWIND $readings AS reading
+CREATE (s:DHT11:SensoryMemory)
+SET s = reading.properties
+WITH s, reading
+CALL {
+    WITH s, reading
+    WITH s, reading WHERE reading.email IS NOT NULL
+    MERGE (u:User {email: reading.email})
+    MERGE (u)-[:HAS_SENSOR_READING]->(s)
+}
+RETURN count(s) AS written
+"""
+
+
+def _write_readings(tx, readings):
+    nodes = [reading for reading in readings if reading["persist"]]
+    written = tx.run(SENSOR_BATCH_QUERY, readings=nodes).single()["written"] if nodes else 0
+    # Readings the change filter suppressed still count towards the rollups
+    apply_rollups(tx, [reading.get("rollup", reading["properties"]) for reading in readings])
+    return written
+
+
+class SensorBuffer:
+    def __init__(self, batch_size=None, flush_interval=None, max_buffered=None, session_factory=None):
+        self.batch_size = batch_size or int(os.environ.get("SENSOR_BATCH_SIZE", "50"))
+        self.flush_interval = flush_interval or float(os.environ.get("SENSOR_FLUSH_INTERVAL", "10"))
+        self.max_buffered = max_buffered or int(os.environ.get("SENSOR_BUFFER_MAX", "5000"))
+        # Where batches are written; anything with execute_write works (benchmarks/sensor_fleet.py)
+        self.session_factory = session_factory or get_neo4j_session
+
+        # (monotonic time added, {"properties": ..., "email": ..., "persist": ..., ["rollup": ...]})
+        self._readings = deque()
+        self._condition = threading.Condition()
+        # Only one flush at a time, so a retried batch keeps its place
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._retry_at = 0.0
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "added": 0,
+            "written": 0,
+            "rolled_up_only": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+    def start(self):
+        """Start the flusher thread (idempotent)"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="sensor-buffer", daemon=True)
+                self._thread.start()
+
+    def add(self, properties, user_email=None, persist=True, raw=None):
+        """
+        Queue one DHT11:SensoryMemory node with `properties`, linked to
+        `user_email` if given.  With persist=False (see sensor_filter) the
+        reading only updates the rollups.  `raw` holds the unsmoothed values
+        of metrics whose node properties were smoothed; the rollups use those.
+        Never blocks on Neo4j.
+        """
+        self.start()
+        reading = {"properties": dict(properties), "email": user_email or None, "persist": persist}
+        if raw:
+            reading["rollup"] = {**reading["properties"], **raw}
+        with self._condition:
+            self._readings.append((time.monotonic(), reading))
+            dropped = self._trim()
+            # The first reading starts the flush interval, a full batch ends it
+            if len(self._readings) == 1 or len(self._readings) >= self.batch_size:
+                self._condition.notify()
+        with self._metrics_lock:
+            self._metrics["added"] += 1
+            self._metrics["dropped"] += dropped
+
+    def _trim(self):
+        dropped = 0
+        while len(self._readings) > self.max_buffered:
+            self._readings.popleft()
+            dropped += 1
+        if dropped:
+            logger.warning(f"Sensor buffer full, dropped {dropped} oldest readings")
+        return dropped
+
+    def _flush_loop(self):
+        while True:
+            with self._condition:
+                while not self._stopping and not self._due():
+                    self._condition.wait(self._until_due())
+                if self._stopping:
+                    return
+            self.flush()
+
+    def _due(self):
+        if not self._readings or time.monotonic() < self._retry_at:
+            return False
+        if len(self._readings) >= self.batch_size:
+            return True
+        return time.monotonic() - self._readings[0][0] >= self.flush_interval
+
+    def _until_due(self):
+        if not self._readings:
+            return None
+        due_at = max(self._retry_at, self._readings[0][0] + self.flush_interval)
+        return max(0.0, due_at - time.monotonic())
+
+    def flush(self):
+        """Write everything buffered, a batch at a time; returns the number of readings written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._condition:
+                    batch = [self._readings.popleft() for _ in range(min(self.batch_size, len(self._readings)))]
+                if not batch:
+                    return written
+                if not self._write(batch):
+                    with self._condition:
+                        self._readings.extendleft(reversed(batch))
+                        dropped = self._trim()
+                        self._retry_at = time.monotonic() + self.flush_interval
+                    with self._metrics_lock:
+                        self._metrics["dropped"] += dropped
+                    return written
+                written += len(batch)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            with self.session_factory() as neo4j_session:
+                neo4j_session.execute_write(_write_readings, [reading for _, reading in batch])
+        except Exception as e:
+            logger.warning(f"Sensor batch of {len(batch)} readings not written, will retry: {e}")
+            with self._metrics_lock:
+                self._metrics["failed_batches"] += 1
+            return False
+
+        seconds = time.perf_counter() - start
+        waited = time.monotonic() - batch[0][0]
+        with self._metrics_lock:
+            metrics = self._metrics
+            nodes = sum(1 for _, reading in batch if reading["persist"])
+            metrics["written"] += nodes
+            metrics["rolled_up_only"] += len(batch) - nodes
+            metrics["batches"] += 1
+            metrics["last_batch_size"] = len(batch)
+            metrics["max_batch_size"] = max(metrics["max_batch_size"], len(batch))
+            metrics["last_flush_seconds"] = seconds
+            metrics["max_flush_seconds"] = max(metrics["max_flush_seconds"], seconds)
+            metrics["total_flush_seconds"] += seconds
+            metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], waited)
+        return True
+
+    def metrics(self):
+        """Batch size, flush latency, backlog and drop counters"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        with self._condition:
+            metrics["buffered"] = len(self._readings)
+        metrics["batch_size"] = self.batch_size
+        metrics["flush_interval"] = self.flush_interval
+        batches = metrics["batches"]
+        flushed = metrics["written"] + metrics["rolled_up_only"]
+        metrics["avg_batch_size"] = flushed / batches if batches else 0.0
+        metrics["avg_flush_seconds"] = metrics["total_flush_seconds"] / batches if batches else 0.0
+        return metrics
+
+    def close(self):
+        """Shutdown hook: stop the flusher and write what is left"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(5)
+        self.flush()
+        logger.info(f"Sensor buffer closed: {self.metrics()}")
+
+
+sensor_buffer = SensorBuffer()
+# Registered after neo4j_pool's close_driver, so it runs first at exit
+atexit.register(sensor_buffer.close)
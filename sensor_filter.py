@@ -0,0 +1,135 @@
+"""
+Change detection in front of the sensor graph.
+
+A DHT11 in a stable room reports the same temperature and humidity for
+hours, and every one of those readings used to become its own
+DHT11:SensoryMemory node.  ChangeFilter decides per stream (a device and the
+user it is linked to) whether a validated reading is worth a node:
+
+  * the first reading of a stream is always kept;
+  * after that a reading is kept when any metric has moved by at least its
+    deadband since the last kept reading, or a value appeared or vanished;
+  * if nothing has been kept for SENSOR_HEARTBEAT seconds the next reading
+    is kept anyway, so a quiet sensor is still visibly alive.
+
+With SENSOR_SMOOTHING set (the weight of the newest reading, 0 < a <= 1),
+each metric is an exponential moving average, and the smoothed values are
+both compared and written to the node.  Every reading, suppressed or not,
+still reaches sensor_buffer with its raw values, which go into the rollups,
+so the minute/hour/day aggregates count every reading unsmoothed.
+
+Configuration (environment, with defaults):
+
+    SENSOR_DEADBAND    temperature=0.5,humidity=2   (metric=threshold, comma separated)
+    SENSOR_HEARTBEAT   600   (seconds; 0 keeps no heartbeat)
+    SENSOR_SMOOTHING   0     (0 disables smoothing)
+"""
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_deadbands(text):
+    """{"temperature": 0.5, ...} from "temperature=0.5,humidity=2" """
+    deadbands = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        metric, _, threshold = item.partition("=")
+        deadbands[metric.strip()] = float(threshold)
+    return deadbands
+
+
+class _Stream:
+    def __init__(self):
+        self.smoothed = {}
+        self.kept = None
+        self.kept_at = None
+
+
+class ChangeFilter:
+    def __init__(self, deadbands=None, heartbeat=None, smoothing=None):
+        self.deadbands = deadbands if deadbands is not None else \
+            parse_deadbands(os.environ.get("SENSOR_DEADBAND", "temperature=0.5,humidity=2"))
+        self.heartbeat = heartbeat if heartbeat is not None else float(os.environ.get("SENSOR_HEARTBEAT", "600"))
+        self.smoothing = smoothing if smoothing is not None else float(os.environ.get("SENSOR_SMOOTHING", "0"))
+        if not 0 <= self.smoothing <= 1:
+            raise ValueError(f"SENSOR_SMOOTHING must be between 0 and 1, got {self.smoothing}")
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._counters = {"seen": 0, "persisted": 0, "suppressed": 0,
+                          "persisted_first": 0, "persisted_change": 0, "persisted_heartbeat": 0}
+
+    def _smooth(self, stream, values):
+        if not self.smoothing:
+            return dict(values)
+        smoothed = {}
+        for metric, value in values.items():
+            previous = stream.smoothed.get(metric)
+            if value is None or previous is None:
+                smoothed[metric] = value
+            else:
+                smoothed[metric] = round(self.smoothing * value + (1 - self.smoothing) * previous, 3)
+        stream.smoothed = smoothed
+        return smoothed
+
+    def changed(self, kept, values):
+        """True if any metric moved by at least its deadband from `kept` to `values`"""
+        for metric, deadband in self.deadbands.items():
+            before, after = kept.get(metric), values.get(metric)
+            if before is None or after is None:
+                if before is not after:
+                    return True
+                continue
+            delta = abs(after - before)
+            if delta >= deadband if deadband > 0 else delta != 0:
+                return True
+        return False
+
+    def apply(self, key, values, now=None):
+        """
+        (persist, values) for one validated reading of stream `key`.
+        `values` maps metric names to numbers (or None); the returned values
+        are the ones to write, smoothed if smoothing is on.
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _Stream()
+            values = self._smooth(stream, values)
+            if stream.kept is None:
+                reason = "persisted_first"
+            elif self.changed(stream.kept, values):
+                reason = "persisted_change"
+            elif self.heartbeat and now - stream.kept_at >= self.heartbeat:
+                reason = "persisted_heartbeat"
+            else:
+                reason = None
+
+            self._counters["seen"] += 1
+            if reason is None:
+                self._counters["suppressed"] += 1
+                return False, values
+            stream.kept = values
+            stream.kept_at = now
+            self._counters["persisted"] += 1
+            self._counters[reason] += 1
+            return True, values
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["streams"] = len(self._streams)
+        stats["suppressed_ratio"] = stats["suppressed"] / stats["seen"] if stats["seen"] else 0.0
+        stats["deadbands"] = dict(self.deadbands)
+        stats["heartbeat"] = self.heartbeat
+        stats["smoothing"] = self.smoothing
+        return stats
+
+
+sensor_filter = ChangeFilter()
@@ -0,0 +1,538 @@
+"""
+The DHT11 sensor managers: one serial-attached DHT11 (DHT11SensoryMemoryManager,
+used by app.py) and a fleet of ESP32 DHT11 boards polled over HTTP
+(ESP32DHT11SensoryMemoryManager, used by conversation.py).
+
+Both ingest the same way.  A reader (the serial line, the streaming reader or
+the ESP32 poller) puts raw readings on data_queue (at most 100).  When the
+queue is full the reading is dropped and counted in dropped_readings.  The
+processing thread validates each reading and publishes an
+EnvironmentSnapshot.  It then records the reading in the recent-readings
+ring, runs it through sensor_filter and hands it to sensor_buffer.
+
+They live in their own module so the ingestion path can be used without the
+Flask apps.  benchmarks/sensor_fleet.py drives it with virtual devices.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import serial
+
+from environment_snapshot import EnvironmentSnapshot
+from esp32_poller import ESP32Poller, configured_devices
+from recent_readings import RecentReadings
+from sensor_buffer import sensor_buffer
+from sensor_filter import sensor_filter
+from serial_frames import StreamingSerialReader
+
+
+class DHT11SensoryMemoryManager:
+    def __init__(self, port='COM3', baudrate=115200, mode=None, sample_rate=None, connect=True):
+        self.port = port
+        self.baudrate = baudrate
+        # 'poll': ask for a reading every 30 s; 'stream': the board pushes frames (see serial_frames)
+        self.mode = mode or os.environ.get("DHT11_SERIAL_MODE", "poll")
+        self.sample_rate = sample_rate
+        self.serial_connection = None
+        self.stream_reader = None
+        self.sensor_data = {
+            'temperature': None,
+            'humidity': None,
+            'timestamp': None,
+            'sensor_type': 'DHT11',
+            'memory_type': 'SensoryMemory',
+            'status': 'disconnected'
+        }
+        self.data_queue = queue.Queue(maxsize=100)
+        self.dropped_readings = 0
+        self.running = False
+        # Serialises writers of sensor_data; readers use the published snapshot
+        self.lock = threading.Lock()
+        self.publish_snapshot()
+        self.current_user_email = None
+        self.recent = RecentReadings(port)
+
+        # Setup logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        if connect:
+            self.connect()
+
+    def connect(self):
+        """Connect to Arduino with retry logic"""
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                # serial_for_url also takes loop:// and other pyserial URLs
+                self.serial_connection = serial.serial_for_url(
+                    self.port,
+                    self.baudrate,
+                    timeout=0.1 if self.mode == 'stream' else 2,
+                    write_timeout=2
+                )
+                time.sleep(2)  # Arduino initialization
+                self.running = True
+                self.set_status('connected')
+                self.logger.info(f"Connected to DHT11 on {self.port} ({self.mode} mode)")
+
+                # Start monitoring threads
+                self.start_monitoring()
+                return True
+
+            except Exception as e:
+                self.logger.error(f"Connection attempt {attempt + 1} failed: {e}")
+                if attempt == max_retries - 1:
+                    self.set_status('error')
+                    return False
+                time.sleep(2)
+
+    def start_monitoring(self):
+        """Start background monitoring threads"""
+        if self.mode == 'stream':
+            self.stream_reader = StreamingSerialReader(self.serial_connection, self.queue_frame,
+                                                       self.sample_rate).start()
+        else:
+            self.reader_thread = threading.Thread(target=self.read_sensor_data, daemon=True)
+            self.reader_thread.start()
+        self.start_processing()
+
+    def start_processing(self):
+        """Start the thread that drains data_queue (without a reader: see benchmarks/sensor_fleet.py)"""
+        self.running = True
+        self.processor_thread = threading.Thread(target=self.process_sensor_data, daemon=True)
+        self.processor_thread.start()
+
+    def queue_frame(self, data):
+        """Streaming reader callback: hand a frame to the processing thread"""
+        try:
+            self.data_queue.put_nowait(data)
+        except queue.Full:
+            self.dropped_readings += 1
+            self.logger.warning("DHT11 frame dropped, processing queue is full")
+
+    def stream_metrics(self):
+        """Frame rate and parse-error counters of the streaming reader (None in poll mode)"""
+        return self.stream_reader.metrics() if self.stream_reader else None
+
+    def read_sensor_data(self):
+        """Continuous reading thread"""
+        while self.running:
+            try:
+                if self.serial_connection and self.serial_connection.is_open:
+                    self.serial_connection.write(b'GET_SENSOR_DATA\n')
+
+                    response = self.serial_connection.readline().decode().strip()
+                    if response:
+                        try:
+                            data = json.loads(response)
+                            self.data_queue.put(data, timeout=1)
+                        except queue.Full:
+                            self.dropped_readings += 1
+                            self.logger.warning("DHT11 reading dropped, processing queue is full")
+                        except json.JSONDecodeError:
+                            self.logger.warning(f"Invalid JSON: {response}")
+
+                time.sleep(30)  # Read every 30 seconds
+
+            except Exception as e:
+                self.logger.error(f"Read error: {e}")
+                time.sleep(5)
+
+    def process_sensor_data(self):
+        """Process queued sensor data"""
+        while self.running:
+            try:
+                data = self.data_queue.get(timeout=1)
+
+                with self.lock:
+                    if self.validate_sensor_data(data):
+                        self.sensor_data.update(data)
+                        self.sensor_data['python_timestamp'] = datetime.now().isoformat()
+                        self.publish_snapshot()
+
+                        # Save to Neo4j as DHT11:SensoryMemory
+                        self.save_dht11_sensory_memory(data.copy())
+
+                self.data_queue.task_done()
+
+            except queue.Empty:
+                continue
+            except Exception as e:
+                self.logger.error(f"Processing error: {e}")
+
+    def validate_sensor_data(self, data):
+        """Validate DHT11 sensor data ranges"""
+        if not isinstance(data, dict):
+            return False
+
+        temp = data.get('temperature')
+        humidity = data.get('humidity')
+
+        # DHT11 specifications: 0-50°C, 20-80% RH
+        if temp is not None and (temp < 0 or temp > 50):
+            self.logger.warning(f"Temperature out of DHT11 range: {temp}")
+            return False
+
+        if humidity is not None and (humidity < 20 or humidity > 80):
+            self.logger.warning(f"Humidity out of DHT11 range: {humidity}")
+            return False
+
+        return True
+
+    def save_dht11_sensory_memory(self, sensor_data):
+        """Queue the reading as a DHT11:SensoryMemory node; sensor_buffer writes it in the next batch"""
+        timestamp = datetime.now().isoformat()
+        # The board sends no comfort score; publish_snapshot has just computed it for this reading
+        context = self.snapshot.context
+        comfort_score = context['comfort_level'] if context is not None else None
+        self.recent.record(self.current_user_email, timestamp,
+                           sensor_data.get('temperature'), sensor_data.get('humidity'), comfort_score)
+        # Unchanged readings only reach the rollups; see sensor_filter
+        raw = {
+            'temperature': sensor_data.get('temperature'),
+            'humidity': sensor_data.get('humidity')
+        }
+        persist, values = sensor_filter.apply((self.port, self.current_user_email), raw)
+        sensor_buffer.add({
+            'temperature': values['temperature'],
+            'humidity': values['humidity'],
+            'timestamp': timestamp,
+            'sensor_type': 'DHT11',
+            'memory_type': 'SensoryMemory',
+            'status': sensor_data.get('status'),
+            'data_quality': 'validated',
+            'comfort_score': comfort_score
+        }, self.current_user_email, persist, raw)
+
+    def set_current_user(self, email):
+        """Set current user for sensor data linking"""
+        self.current_user_email = email
+
+    def set_status(self, status):
+        with self.lock:
+            self.sensor_data['status'] = status
+            self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """Derive the environmental context once and publish it with the readings (caller holds self.lock)"""
+        data = self.sensor_data
+        context = None
+        temp = data['temperature']
+        humidity = data['humidity']
+        if data['status'] == 'valid' and temp is not None and humidity is not None:
+            context = {
+                'temperature': temp,
+                'humidity': humidity,
+                'comfort_level': self.calculate_comfort_score(temp, humidity),
+                'recommendations': self.get_recommendations(temp, humidity),
+                'timestamp': data.get('timestamp'),
+                'sensor_type': 'DHT11',
+                'memory_type': 'SensoryMemory'
+            }
+        self.snapshot = EnvironmentSnapshot.capture(data, context)
+
+    def get_latest_readings(self):
+        """Latest readings from the published snapshot (no lock)"""
+        return dict(self.snapshot.readings)
+
+    def get_environmental_context(self):
+        """Comfort score and recommendations, computed when the reading arrived"""
+        context = self.snapshot.context
+        return dict(context) if context is not None else None
+
+    def calculate_comfort_score(self, temp, humidity):
+        """Calculate comfort score (0-100) based on DHT11 readings"""
+        # Optimal ranges: 20-26°C temperature, 40-60% humidity
+        temp_score = max(0, min(100, 100 - abs(temp - 23) * 10))
+        humidity_score = max(0, min(100, 100 - abs(humidity - 50) * 2))
+        return (temp_score + humidity_score) / 2
+
+    def get_recommendations(self, temp, humidity):
+        """Get environmental recommendations based on DHT11 readings"""
+        recommendations = []
+
+        if temp > 26:
+            recommendations.append("Room temperature is high - consider cooling")
+        elif temp < 20:
+            recommendations.append("Room temperature is low - consider warming")
+
+        if humidity > 60:
+            recommendations.append("Humidity is high - consider dehumidifying")
+        elif humidity < 40:
+            recommendations.append("Humidity is low - consider humidifying")
+
+        if not recommendations:
+            recommendations.append("Environmental conditions are optimal")
+
+        return recommendations
+
+    def disconnect(self):
+        """Clean shutdown"""
+        self.running = False
+        if self.stream_reader:
+            self.stream_reader.stop()
+        if self.serial_connection:
+            self.serial_connection.close()
+        self.logger.info("DHT11 sensor manager disconnected")
+
+
+class ESP32DHT11SensoryMemoryManager:
+    def __init__(self, esp32_ips=None, connect=True):
+        # ESP32_DEVICES by default; the first device is the primary one
+        if isinstance(esp32_ips, str):
+            esp32_ips = [esp32_ips]
+        self.esp32_ips = list(esp32_ips or configured_devices())
+        self.esp32_ip = self.esp32_ips[0]
+
+        self.sensor_data = {
+            'temperature': None,
+            'humidity': None,
+            'timestamp': None,
+            'sensor_type': 'DHT11',
+            'memory_type': 'SensoryMemory',
+            'status': 'disconnected',
+            'comfort_score': 0,
+            'recommendations': []
+        }
+
+        self.data_queue = queue.Queue(maxsize=100)
+        self.dropped_readings = 0
+        self.running = False
+        # Serialises writers of sensor_data; readers use the published snapshot
+        self.lock = threading.Lock()
+        self.publish_snapshot()
+        self.current_user_email = None
+        self.recent_by_device = {}
+        self.poller = ESP32Poller(self.queue_reading)
+
+        # Setup logging
+        logging.basicConfig(level=logging.INFO)
+        self.logger = logging.getLogger(__name__)
+
+        # Start polling and processing
+        if connect:
+            self.connect()
+
+    def connect(self):
+        """Start polling every ESP32 and processing what they send"""
+        self.running = True
+        with self.lock:
+            self.sensor_data['status'] = 'connecting'
+            self.publish_snapshot()
+        self.start_monitoring()
+        self.logger.info(f"Polling {len(self.esp32_ips)} ESP32 DHT11 device(s): {', '.join(self.esp32_ips)}")
+        return True
+
+    def start_monitoring(self):
+        """Start the shared poller and the processing thread"""
+        self.poller.start(self.esp32_ips)
+        self.start_processing()
+
+    def start_processing(self):
+        """Start the thread that drains data_queue (without the poller: see benchmarks/sensor_fleet.py)"""
+        self.running = True
+        self.processor_thread = threading.Thread(target=self.process_sensor_data, daemon=True)
+        self.processor_thread.start()
+
+    def add_device(self, esp32_ip):
+        """Start polling another ESP32 while running"""
+        if esp32_ip not in self.esp32_ips:
+            self.esp32_ips.append(esp32_ip)
+        return self.poller.add_device(esp32_ip)
+
+    def queue_reading(self, esp32_ip, data):
+        """Poller callback (on the poller thread): hand the reading to the processing thread"""
+        try:
+            self.data_queue.put_nowait(data)
+        except queue.Full:
+            self.dropped_readings += 1
+            self.logger.warning(f"ESP32 reading from {esp32_ip} dropped, processing queue is full")
+
+    def recent_for(self, esp32_ip):
+        """The recent-readings ring of one device"""
+        recent = self.recent_by_device.get(esp32_ip)
+        if recent is None:
+            # setdefault, so two threads meeting a new device end up with the same ring
+            recent = self.recent_by_device.setdefault(esp32_ip, RecentReadings(esp32_ip, data_source='ESP32'))
+        return recent
+
+    def process_sensor_data(self):
+        """Process queued sensor data from ESP32"""
+        while self.running:
+            try:
+                data = self.data_queue.get(timeout=1)
+
+                with self.lock:
+                    if self.validate_sensor_data(data):
+                        # Update sensor data with ESP32 information
+                        self.sensor_data.update({
+                            'temperature': data.get('temperature'),
+                            'humidity': data.get('humidity'),
+                            'timestamp': data.get('timestamp'),
+                            'sensor_type': 'DHT11',
+                            'memory_type': 'SensoryMemory',
+                            'status': data.get('status', 'valid'),
+                            'comfort_score': data.get('comfort_score', 0),
+                            'recommendations': data.get('recommendations', '').split('; ') if data.get(
+                                'recommendations') else [],
+                            'python_timestamp': datetime.now().isoformat(),
+                            'esp32_ip': data.get('esp32_ip')
+                        })
+                        self.publish_snapshot()
+
+                        # Save to Neo4j
+                        self.save_esp32_sensory_memory(data.copy())
+
+                        self.logger.info(f"ESP32 DHT11 updated: {data.get('temperature')}°C, {data.get('humidity')}%")
+
+                self.data_queue.task_done()
+
+            except queue.Empty:
+                continue
+            except Exception as e:
+                self.logger.error(f"ESP32 data processing error: {e}")
+
+    def validate_sensor_data(self, data):
+        """Validate ESP32 DHT11 sensor data"""
+        if not isinstance(data, dict):
+            return False
+
+        # Check if data has required fields
+        if 'temperature' not in data or 'humidity' not in data:
+            return False
+
+        temp = data.get('temperature')
+        humidity = data.get('humidity')
+
+        # Validate data ranges
+        if temp is not None and (temp < -40 or temp > 80):  # Extended range for ESP32
+            self.logger.warning(f"Temperature out of range: {temp}")
+            return False
+
+        if humidity is not None and (humidity < 0 or humidity > 100):
+            self.logger.warning(f"Humidity out of range: {humidity}")
+            return False
+
+        return True
+
+    def save_esp32_sensory_memory(self, sensor_data):
+        """Queue ESP32 DHT11 data as a DHT11:SensoryMemory node; sensor_buffer writes it in the next batch"""
+        timestamp = datetime.now().isoformat()
+        esp32_ip = sensor_data.get('esp32_ip', self.esp32_ip)
+        self.recent_for(esp32_ip).record(self.current_user_email, timestamp, sensor_data.get('temperature'),
+                                         sensor_data.get('humidity'), sensor_data.get('comfort_score', 0),
+                                         sensor_data.get('recommendations', ''))
+        # Unchanged readings only reach the rollups; see sensor_filter
+        raw = {
+            'temperature': sensor_data.get('temperature'),
+            'humidity': sensor_data.get('humidity'),
+            'comfort_score': sensor_data.get('comfort_score', 0)
+        }
+        persist, values = sensor_filter.apply((esp32_ip, self.current_user_email), raw)
+        sensor_buffer.add({
+            'temperature': values['temperature'],
+            'humidity': values['humidity'],
+            'timestamp': timestamp,
+            'sensor_type': 'DHT11',
+            'memory_type': 'SensoryMemory',
+            'status': sensor_data.get('status', 'valid'),
+            'data_quality': 'esp32_validated',
+            'comfort_score': values['comfort_score'],
+            'recommendations': sensor_data.get('recommendations', ''),
+            'data_source': 'ESP32',
+            'esp32_ip': esp32_ip,
+            'unit_temperature': 'Celsius',
+            'unit_humidity': 'Percent'
+        }, self.current_user_email, persist, raw)
+
+    def set_current_user(self, email):
+        """Set current user for sensor data linking"""
+        self.current_user_email = email
+        self.logger.info(f"ESP32 DHT11 sensor linked to user: {email}")
+
+    def publish_snapshot(self):
+        """Derive the environmental context once and publish it with the readings (caller holds self.lock)"""
+        data = self.sensor_data
+        context = None
+        temp = data.get('temperature')
+        humidity = data.get('humidity')
+        if data['status'] in ['valid', 'connected'] and temp is not None and humidity is not None:
+            context = {
+                'temperature': temp,
+                'humidity': humidity,
+                'comfort_level': data.get('comfort_score', 0),
+                'recommendations': data.get('recommendations', []),
+                'timestamp': data.get('timestamp'),
+                'sensor_type': 'DHT11',
+                'memory_type': 'SensoryMemory',
+                'data_source': 'ESP32',
+                'esp32_ip': data.get('esp32_ip')
+            }
+        self.snapshot = EnvironmentSnapshot.capture(data, context)
+
+    def get_latest_readings(self):
+        """Latest readings from the published snapshot (no lock)"""
+        return dict(self.snapshot.readings)
+
+    def get_environmental_context(self):
+        """Environmental context from the published snapshot (no lock)"""
+        context = self.snapshot.context
+        return dict(context) if context is not None else None
+
+    def calculate_comfort_score(self, temp, humidity):
+        """Calculate comfort score (handled by ESP32, but kept for compatibility)"""
+        temp_score = max(0, min(100, 100 - abs(temp - 23) * 10))
+        humidity_score = max(0, min(100, 100 - abs(humidity - 50) * 2))
+        return (temp_score + humidity_score) / 2
+
+    def get_recommendations(self, temp, humidity):
+        """Get environmental recommendations (handled by ESP32, but kept for compatibility)"""
+        recommendations = []
+
+        if temp > 26:
+            recommendations.append("Room temperature is high - consider cooling")
+        elif temp < 20:
+            recommendations.append("Room temperature is low - consider warming")
+
+        if humidity > 60:
+            recommendations.append("Humidity is high - consider dehumidifying")
+        elif humidity < 40:
+            recommendations.append("Humidity is low - consider humidifying")
+
+        if not recommendations:
+            recommendations.append("Environmental conditions are optimal")
+
+        return recommendations
+
+    def disconnect(self):
+        """Clean shutdown"""
+        self.running = False
+        self.poller.stop()
+        self.logger.info("ESP32 DHT11 sensor manager disconnected")
+
+    def get_esp32_status(self, esp32_ip=None):
+        """Status of one ESP32 (the primary one by default), as last seen by the poller"""
+        esp32_ip = esp32_ip or self.esp32_ip
+        device = self.poller.status(esp32_ip)
+        if device is None:
+            return {'status': 'unknown', 'ip': esp32_ip}
+        status = {
+            'status': device['status'],
+            'ip': esp32_ip,
+            'response_time': device['last_latency'],
+            'poll_interval': device['interval'],
+            'consecutive_failures': device['consecutive_failures']
+        }
+        if device['last_error']:
+            status['error'] = device['last_error']
+        return status
+
+    def get_fleet_status(self):
+        """Poller status of every ESP32, keyed by address"""
+        return self.poller.status()
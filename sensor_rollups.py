@@ -0,0 +1,340 @@
+"""
+Time-series rollups and retention for DHT11:SensoryMemory readings.
+
+With one reading every 30 seconds, each device adds about 2,900 raw nodes a
+day.  Anything that wants a trend (the dashboards, get_dht11_memory_data)
+would otherwise sort through all of them.  Readings are therefore also
+summarised into DHT11Rollup nodes, one per (resolution, source, start):
+
+    resolution   minute | hour | day
+    source       the ESP32's address, else the data source, else "DHT11"
+    start        ISO timestamp the bucket starts at, comparable with
+                 DHT11.timestamp
+
+Each rollup keeps counts, sums, minima and maxima, so it can be updated
+incrementally, along with the means derived from them.  Temperature and
+humidity get min/max/mean, and the comfort score gets a mean.
+sensor_buffer applies rollup_deltas() for a batch in the same transaction
+that creates the batch's readings, so a batch that is retried is never
+counted twice.
+
+Retention: RetentionPolicy deletes raw readings older than
+SENSOR_RAW_RETENTION_DAYS, and minute and hour rollups older than their own
+limits, SENSOR_PRUNE_BATCH nodes per transaction.  Day rollups are kept.
+start_pruner() runs it every SENSOR_PRUNE_INTERVAL seconds.
+
+    python sensor_rollups.py --prune      # apply the retention policy once
+    python sensor_rollups.py --backfill   # rebuild the rollups the raw readings kept still cover
+
+Configuration (environment, with defaults; 0 keeps forever / disables):
+
+    SENSOR_RAW_RETENTION_DAYS      7
+    SENSOR_MINUTE_RETENTION_DAYS   30
+    SENSOR_HOUR_RETENTION_DAYS     365
+    SENSOR_PRUNE_BATCH             5000
+    SENSOR_PRUNE_INTERVAL          3600   (seconds)
+"""
+import argparse
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from neo4j_pool import get_neo4j_session
+
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("minute", "hour", "day")
+BUCKET_LENGTHS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# (reading property, keeps min/max as well as the mean)
+MEASURES = (("temperature", True), ("humidity", True), ("comfort_score", False))
+
+
+def bucket_starts(timestamp):
+    """{resolution: start} for the buckets an ISO `timestamp` falls in"""
+    moment = datetime.fromisoformat(timestamp)
+    minute = moment.replace(second=0, microsecond=0)
+    return {
+        "minute": minute.isoformat(),
+        "hour": minute.replace(minute=0).isoformat(),
+        "day": minute.replace(hour=0, minute=0).isoformat(),
+    }
+
+
+def reading_source(properties):
+    return properties.get("esp32_ip") or properties.get("data_source") or "DHT11"
+
+
+def _number(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def rollup_deltas(readings):
+    """
+    Per-bucket aggregates of `readings` (node property dicts), as parameters
+    for ROLLUP_QUERY.  A batch usually lands in one or two buckets per
+    resolution, so this is far fewer rows than readings.
+    """
+    deltas = {}
+    for properties in readings:
+        try:
+            starts = bucket_starts(properties["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        source = reading_source(properties)
+        values = {name: _number(properties.get(name)) for name, _ in MEASURES}
+        for resolution, start in starts.items():
+            delta = deltas.get((resolution, source, start))
+            if delta is None:
+                delta = deltas[(resolution, source, start)] = {
+                    "resolution": resolution, "source": source, "start": start, "readings": 0}
+                for name, _ in MEASURES:
+                    delta.update({f"{name}_count": 0, f"{name}_sum": 0.0, f"{name}_min": None, f"{name}_max": None})
+            delta["readings"] += 1
+            for name, _ in MEASURES:
+                value = values[name]
+                if value is None:
+                    continue
+                delta[f"{name}_count"] += 1
+                delta[f"{name}_sum"] += value
+                if delta[f"{name}_min"] is None or value < delta[f"{name}_min"]:
+                    delta[f"{name}_min"] = value
+                if delta[f"{name}_max"] is None or value > delta[f"{name}_max"]:
+                    delta[f"{name}_max"] = value
+    return list(deltas.values())
+
+
+def _rollup_query():
+    on_create = ["b.readings = 0"]
+    accumulate = ["b.readings = b.readings + r.readings"]
+    means = ["b.updated_at = $updated_at"]
+    for name, extremes in MEASURES:
+        on_create += [f"b.{name}_count = 0", f"b.{name}_sum = 0.0"]
+        accumulate += [f"b.{name}_count = b.{name}_count + r.{name}_count",
+                       f"b.{name}_sum = b.{name}_sum + r.{name}_sum"]
+        if extremes:
+            for bound, better in (("min", "<"), ("max", ">")):
+                field = f"{name}_{bound}"
+                accumulate.append(
+                    f"b.{field} = CASE WHEN r.{field} IS NULL THEN b.{field} "
+                    f"WHEN b.{field} IS NULL OR r.{field} {better} b.{field} THEN r.{field} ELSE b.{field} END")
+        means.append(f"b.{name}_mean = CASE WHEN b.{name}_count > 0 THEN b.{name}_sum / b.{name}_count END")
+    separator = ",\n    "
+    return (
+        "UNWIND $rollups AS r\n"
+        "MERGE (b:DHT11Rollup {resolution: r.resolution, source: r.source, start: r.start})\n"
+        f"ON CREATE SET\n    {separator.join(on_create)}\n"
+        f"SET\n    {separator.join(accumulate)}\n"
+        # A separate SET, so the means see the updated counts and sums
+        f"SET\n    {separator.join(means)}\n"
+    )
+
+
+ROLLUP_QUERY = _rollup_query()
+
+
+def apply_rollups(tx, readings, since=None):
+    """
+    Fold `readings` (node property dicts) into their rollups inside
+    transaction `tx`.  With `since` ({resolution: start}), buckets starting
+    earlier are left alone.
+    """
+    deltas = rollup_deltas(readings)
+    if since is not None:
+        deltas = [delta for delta in deltas if delta["start"] >= since[delta["resolution"]]]
+    if deltas:
+        tx.run(ROLLUP_QUERY, rollups=deltas, updated_at=datetime.now().isoformat()).consume()
+    return len(deltas)
+
+
+def _recent_rollups(tx, resolution, source, limit):
+    return tx.run("""
+        MATCH (b:DHT11Rollup {resolution: $resolution})
+        WHERE $source IS NULL OR b.source = $source
+        RETURN b {.*} AS rollup
+        ORDER BY b.start DESC
+        LIMIT $limit
+    """, resolution=resolution, source=source, limit=limit).value("rollup")
+
+
+def recent_rollups(resolution="hour", source=None, limit=24):
+    """The newest `limit` rollups at `resolution`, newest first, as property dicts"""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {resolution!r}, expected one of {RESOLUTIONS}")
+    with get_neo4j_session() as neo4j_session:
+        return neo4j_session.execute_read(_recent_rollups, resolution, source, limit)
+
+
+def _delete_batch(tx, match, cutoff, batch_size):
+    return tx.run(f"""
+        {match}
+        WITH n LIMIT $batch_size
+        DETACH DELETE n
+        RETURN count(*) AS deleted
+    """, cutoff=cutoff, batch_size=batch_size).single()["deleted"]
+
+
+class RetentionPolicy:
+    def __init__(self, raw_days=None, minute_days=None, hour_days=None, batch_size=None):
+        self.raw_days = raw_days if raw_days is not None else \
+            float(os.environ.get("SENSOR_RAW_RETENTION_DAYS", "7"))
+        self.minute_days = minute_days if minute_days is not None else \
+            float(os.environ.get("SENSOR_MINUTE_RETENTION_DAYS", "30"))
+        self.hour_days = hour_days if hour_days is not None else \
+            float(os.environ.get("SENSOR_HOUR_RETENTION_DAYS", "365"))
+        self.batch_size = batch_size or int(os.environ.get("SENSOR_PRUNE_BATCH", "5000"))
+        self._stop = threading.Event()
+        self._pruner = None
+        self._lock = threading.Lock()
+        self._counters = {"runs": 0, "raw_deleted": 0, "minute_deleted": 0, "hour_deleted": 0,
+                          "errors": 0, "last_run_seconds": 0.0}
+
+    def targets(self):
+        """(counter, MATCH clause binding n, retention days) for every enabled limit"""
+        return [(counter, match, days) for counter, match, days in (
+            ("raw_deleted", "MATCH (n:DHT11:SensoryMemory) WHERE n.timestamp < $cutoff", self.raw_days),
+            ("minute_deleted", "MATCH (n:DHT11Rollup {resolution: 'minute'}) WHERE n.start < $cutoff",
+             self.minute_days),
+            ("hour_deleted", "MATCH (n:DHT11Rollup {resolution: 'hour'}) WHERE n.start < $cutoff",
+             self.hour_days),
+        ) if days > 0]
+
+    def prune(self, now=None):
+        """Delete everything past its retention limit, batch by batch; returns {counter: deleted}"""
+        now = now or datetime.now()
+        start = time.perf_counter()
+        deleted = {}
+        try:
+            with get_neo4j_session() as neo4j_session:
+                for counter, match, days in self.targets():
+                    cutoff = (now - timedelta(days=days)).isoformat()
+                    deleted[counter] = 0
+                    while not self._stop.is_set():
+                        count = neo4j_session.execute_write(_delete_batch, match, cutoff, self.batch_size)
+                        deleted[counter] += count
+                        if count < self.batch_size:
+                            break
+        except Exception as e:
+            logger.warning(f"Sensor retention run failed: {e}")
+            with self._lock:
+                self._counters["errors"] += 1
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._counters["runs"] += 1
+            self._counters["last_run_seconds"] = seconds
+            for counter, count in deleted.items():
+                self._counters[counter] += count
+        if any(deleted.values()):
+            logger.info(f"Sensor retention pruned {deleted} in {seconds:.2f}s")
+        return deleted
+
+    def start_pruner(self, interval=None):
+        interval = interval if interval is not None else float(os.environ.get("SENSOR_PRUNE_INTERVAL", "3600"))
+        if interval <= 0 or self._pruner is not None or not self.targets():
+            return self
+        self._pruner = threading.Thread(target=self._prune_loop, args=(interval,),
+                                        name="sensor-pruner", daemon=True)
+        self._pruner.start()
+        return self
+
+    def _prune_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.prune()
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update(raw_days=self.raw_days, minute_days=self.minute_days, hour_days=self.hour_days)
+        return stats
+
+
+def _oldest_reading(tx):
+    return tx.run("MATCH (s:DHT11:SensoryMemory) RETURN min(s.timestamp) AS oldest").single()["oldest"]
+
+
+def first_whole_buckets(oldest):
+    """{resolution: start} of the first bucket that begins at or after ISO timestamp `oldest`"""
+    moment = datetime.fromisoformat(oldest)
+    firsts = {}
+    for resolution, start in bucket_starts(oldest).items():
+        start = datetime.fromisoformat(start)
+        if start < moment:
+            start += BUCKET_LENGTHS[resolution]
+        firsts[resolution] = start.isoformat()
+    return firsts
+
+
+def _reading_page(tx, after, after_id, limit):
+    # Keyset on (timestamp, elementId): readings sharing a timestamp can straddle a page boundary
+    return tx.run("""
+        MATCH (s:DHT11:SensoryMemory)
+        WHERE s.timestamp > $after OR (s.timestamp = $after AND elementId(s) > $after_id)
+        RETURN s {.*} AS reading, elementId(s) AS id
+        ORDER BY s.timestamp, id
+        LIMIT $limit
+    """, after=after, after_id=after_id, limit=limit).data()
+
+
+def _clear_rollups(tx, resolution, since, batch_size):
+    return tx.run("""
+        MATCH (b:DHT11Rollup {resolution: $resolution})
+        WHERE b.start >= $since
+        WITH b LIMIT $batch_size
+        DELETE b
+        RETURN count(*) AS deleted
+    """, resolution=resolution, since=since, batch_size=batch_size).single()["deleted"]
+
+
+def backfill(batch_size=5000):
+    """
+    Rebuild the rollups that the raw readings still kept fully cover; returns
+    the readings folded in.  Buckets that start before the oldest raw reading
+    (older history, whose readings retention has deleted) are left as they
+    are.  Readings sensor_filter kept out of the graph are not stored, so a
+    rebuilt bucket only counts the stored ones.
+    """
+    folded = 0
+    with get_neo4j_session() as neo4j_session:
+        oldest = neo4j_session.execute_read(_oldest_reading)
+        if oldest is None:
+            return folded
+        since = first_whole_buckets(oldest)
+        for resolution, start in since.items():
+            while neo4j_session.execute_write(_clear_rollups, resolution, start, batch_size) == batch_size:
+                pass
+        after, after_id = "", ""
+        while True:
+            page = neo4j_session.execute_read(_reading_page, after, after_id, batch_size)
+            if not page:
+                return folded
+            neo4j_session.execute_write(apply_rollups, [row["reading"] for row in page], since)
+            folded += len(page)
+            after, after_id = page[-1]["reading"]["timestamp"], page[-1]["id"]
+
+
+retention = RetentionPolicy()
+atexit.register(retention.close)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="DHT11 rollup maintenance")
+    arg_parser.add_argument("--prune", action="store_true", help="apply the retention policy once")
+    arg_parser.add_argument("--backfill", action="store_true", help="rebuild rollups from the raw readings")
+    args = arg_parser.parse_args()
+    if args.backfill:
+        print(f"Rolled up {backfill()} readings")
+    if args.prune or not args.backfill:
+        print(retention.prune())
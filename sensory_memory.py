@@ -0,0 +1,86 @@
+"""
+Batched sensory-memory writer.
+
+The Text -> Sentence -> Word structure of a message (including the
+NEXT_SENTENCE / NEXT_WORD ordering edges) is tokenized locally and shipped to
+Neo4j as one parameterized UNWIND statement inside a single write
+transaction, instead of one autocommit round-trip per sentence, word and edge.
+"""
+from nltk import sent_tokenize, word_tokenize
+
+
+SENSORY_MEMORY_QUERY = """
+MERGE (t:Text:SensoryMemory {full_text: $text, timestamp: $timestamp, ip_address: $ip_address})
+WITH t
+UNWIND $sentences AS sent
+MERGE (s:Sentence:SensoryMemory {sentence_text: sent.text})
+MERGE (t)-[:HAS_A_SENTENCE]->(s)
+WITH t, s, sent
+CALL {
+    WITH s, sent
+    UNWIND sent.words AS word
+    MERGE (w:Word:SensoryMemory {word_text: word})
+    MERGE (s)-[:HAS_A_WORD]->(w)
+    RETURN collect(w) AS words
+}
+CALL {
+    WITH words
+    UNWIND range(0, size(words) - 2) AS i
+    WITH words[i] AS w1, words[i + 1] AS w2
+    MERGE (w1)-[:NEXT_WORD]->(w2)
+}
+WITH t, s, words, sent
+ORDER BY sent.index
+WITH t, collect(s) AS sentences, collect(words) AS sentence_words
+CALL {
+    WITH sentences
+    UNWIND range(0, size(sentences) - 2) AS i
+    WITH sentences[i] AS s1, sentences[i + 1] AS s2
+    MERGE (s1)-[:NEXT_SENTENCE]->(s2)
+}
+RETURN elementId(t) AS text_id,
+       [s IN sentences | elementId(s)] AS sentence_ids,
+       [ws IN sentence_words | [w IN ws | elementId(w)]] AS word_ids
+"""
+
+TEXT_ONLY_QUERY = """
+MERGE (t:Text:SensoryMemory {full_text: $text, timestamp: $timestamp, ip_address: $ip_address})
+RETURN elementId(t) AS text_id, [] AS sentence_ids, [] AS word_ids
+"""
+
+
+def build_sensory_payload(text, sentences=None):
+    """
+    Tokenize text into the parameter list used by SENSORY_MEMORY_QUERY.
+
+    `sentences` may be a pre-computed list of (sentence_text, tokens) pairs;
+    otherwise the text is tokenized here.
+    """
+    if sentences is None:
+        sentences = [(sentence, word_tokenize(sentence)) for sentence in sent_tokenize(text)]
+    return [
+        {"index": index, "text": sentence, "words": list(words)}
+        for index, (sentence, words) in enumerate(sentences)
+    ]
+
+
+def _write_sensory_memory(tx, text, timestamp, ip_address, payload):
+    query = SENSORY_MEMORY_QUERY if payload else TEXT_ONLY_QUERY
+    record = tx.run(query, text=text, timestamp=timestamp, ip_address=ip_address,
+                    sentences=payload).single()
+    return {
+        "text_id": record["text_id"],
+        "sentence_ids": list(record["sentence_ids"]),
+        "word_ids": [list(ids) for ids in record["word_ids"]],
+    }
+
+
+def write_sensory_memory(neo4j_session, text, timestamp, ip_address, sentences=None):
+    """
+    Write the whole sensory structure of `text` in one transaction.
+
+    Returns the element ids of the Text node, its Sentence nodes (in order) and
+    the Word nodes of each sentence (in order).
+    """
+    payload = build_sensory_payload(text, sentences)
+    return neo4j_session.execute_write(_write_sensory_memory, text, timestamp, ip_address, payload)
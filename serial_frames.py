@@ -0,0 +1,240 @@
+"""
+Streaming reader for DHT11 readings pushed over a serial line.
+
+In the original polling mode DHT11SensoryMemoryManager writes GET_SENSOR_DATA,
+waits for one line and sleeps 30 seconds.  In streaming mode the
+microcontroller is sent `STREAM_START <interval_ms>` and from then on pushes
+one JSON object per line without being asked, until it receives
+`STREAM_STOP`.
+
+FrameParser takes whatever bytes have arrived and returns the complete
+frames in them.  An unfinished line stays buffered until the rest arrives.
+It resyncs on its own:
+
+  * a line that is not valid JSON is counted as a parse error and skipped;
+  * noise in front of a frame (a line joined mid-frame, boot messages) is
+    skipped up to the first '{';
+  * a buffer that grows past max_frame bytes without a newline is dropped
+    up to the next newline.
+
+StreamingSerialReader reads the port on its own thread, taking whatever
+bytes are waiting rather than a line at a time.  It hands frames to a
+callback at no more than `sample_rate` per second (anything faster is
+counted as throttled) and reports frames per second, parse errors and
+resyncs.  It works against any pyserial port, including
+serial.serial_for_url("loop://") and a pty, so it can be tried without
+hardware:
+
+    python serial_frames.py --demo    # fake device on a pty, prints metrics
+
+Configuration (environment, with defaults):
+
+    DHT11_SERIAL_MODE   poll   (poll | stream; read by DHT11SensoryMemoryManager)
+    DHT11_SAMPLE_RATE   1      (frames per second passed on, and asked of the device)
+    DHT11_MAX_FRAME     4096   (bytes)
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds the current frame rate is measured over
+RATE_WINDOW = 10.0
+
+
+class FrameParser:
+    def __init__(self, max_frame=None):
+        self.max_frame = max_frame or int(os.environ.get("DHT11_MAX_FRAME", "4096"))
+        self._buffer = bytearray()
+        # Set after an overflow: everything up to the next newline belongs to the dropped frame
+        self._discarding = False
+        self.counters = {"bytes": 0, "frames": 0, "parse_errors": 0, "resyncs": 0, "overflows": 0}
+
+    def feed(self, data):
+        """Add received bytes; returns the complete frames (dicts) they finish, in order"""
+        self.counters["bytes"] += len(data)
+        self._buffer += data
+        frames = []
+        while True:
+            end = self._buffer.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            if self._discarding:
+                self._discarding = False
+                continue
+            frame = self._parse(line)
+            if frame is not None:
+                frames.append(frame)
+
+        if len(self._buffer) > self.max_frame:
+            self.counters["overflows"] += 1
+            self._buffer.clear()
+            self._discarding = True
+        return frames
+
+    def _parse(self, line):
+        line = line.strip()
+        if not line:
+            return None
+        start = line.find(b"{")
+        if start < 0:
+            self.counters["parse_errors"] += 1
+            return None
+        if start > 0:
+            self.counters["resyncs"] += 1
+            line = line[start:]
+        frame = self._decode(line)
+        if frame is None:
+            self.counters["parse_errors"] += 1
+            # A frame cut off mid-way runs into the next one; frames are flat, so the last '{' starts it
+            restart = line.rfind(b"{")
+            if restart <= 0:
+                return None
+            frame = self._decode(line[restart:])
+            if frame is None:
+                return None
+            self.counters["resyncs"] += 1
+        self.counters["frames"] += 1
+        return frame
+
+    @staticmethod
+    def _decode(line):
+        try:
+            frame = json.loads(line)
+        except (UnicodeDecodeError, ValueError):
+            return None
+        return frame if isinstance(frame, dict) else None
+
+
+class StreamingSerialReader:
+    def __init__(self, serial_connection, on_frame, sample_rate=None, max_frame=None):
+        self.serial_connection = serial_connection
+        self.on_frame = on_frame
+        self.sample_rate = sample_rate or float(os.environ.get("DHT11_SAMPLE_RATE", "1"))
+        self.parser = FrameParser(max_frame)
+        self.running = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self._next_delivery = 0.0
+        self._started_at = None
+        # Arrival times of the frames in the last RATE_WINDOW seconds
+        self._window = deque()
+        self._counters = {"delivered": 0, "throttled": 0, "read_errors": 0}
+
+    def start(self):
+        """Ask the device to stream at sample_rate and start reading"""
+        interval_ms = max(1, int(1000 / self.sample_rate))
+        self.serial_connection.write(f"STREAM_START {interval_ms}\n".encode())
+        self.running = True
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._read_loop, name="dht11-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def _read_loop(self):
+        while self.running:
+            try:
+                # Whatever is waiting, or wait (up to the port timeout) for the next byte
+                data = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+            except Exception as e:
+                with self._lock:
+                    self._counters["read_errors"] += 1
+                logger.error(f"Serial stream read error: {e}")
+                time.sleep(1)
+                continue
+            if data:
+                with self._lock:
+                    frames = self.parser.feed(data)
+                for frame in frames:
+                    self._deliver(frame)
+
+    def _deliver(self, frame):
+        now = time.monotonic()
+        with self._lock:
+            self._window.append(now)
+            self._trim_window(now)
+            if now < self._next_delivery:
+                self._counters["throttled"] += 1
+                return
+            self._next_delivery = max(self._next_delivery + 1 / self.sample_rate, now)
+            self._counters["delivered"] += 1
+        try:
+            self.on_frame(frame)
+        except Exception:
+            logger.exception("Serial frame callback failed")
+
+    def _trim_window(self, now):
+        while self._window and now - self._window[0] > RATE_WINDOW:
+            self._window.popleft()
+
+    def stop(self, timeout=2):
+        self.running = False
+        try:
+            self.serial_connection.write(b"STREAM_STOP\n")
+        except Exception:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def metrics(self):
+        """Frame rates (last 10 s and overall), delivery, throttling and parse-error counters"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim_window(now)
+            metrics = dict(self.parser.counters)
+            metrics.update(self._counters)
+            recent = len(self._window)
+        elapsed = now - self._started_at if self._started_at is not None else 0.0
+        metrics["frames_per_second"] = recent / min(RATE_WINDOW, elapsed) if elapsed else 0.0
+        metrics["average_frames_per_second"] = metrics["frames"] / elapsed if elapsed else 0.0
+        metrics["sample_rate"] = self.sample_rate
+        return metrics
+
+
+def _fake_device(fd, interval, stop):
+    """Write DHT11 frames to pty master `fd`, with some noise, until `stop` is set"""
+    import random
+    sent = 0
+    while not stop.is_set():
+        frame = json.dumps({"temperature": round(random.uniform(20, 26), 1),
+                            "humidity": round(random.uniform(40, 60), 1),
+                            "status": "valid"}).encode() + b"\n"
+        sent += 1
+        if sent % 25 == 0:
+            frame = b"garbage" + frame          # noise before a frame
+        elif sent % 40 == 0:
+            frame = frame[:len(frame) // 2]     # frame cut off mid-way
+        os.write(fd, frame)
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    import pty
+
+    import serial
+
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser(description="Run the streaming reader against a fake pty device")
+    arg_parser.add_argument("--demo", action="store_true", required=True)
+    arg_parser.add_argument("--device-rate", type=float, default=50, help="frames per second the fake device sends")
+    arg_parser.add_argument("--sample-rate", type=float, default=10)
+    arg_parser.add_argument("--seconds", type=float, default=5)
+    args = arg_parser.parse_args()
+
+    master, slave = pty.openpty()
+    port = serial.Serial(os.ttyname(slave), 115200, timeout=0.1)
+    stopped = threading.Event()
+    threading.Thread(target=_fake_device, args=(master, 1 / args.device_rate, stopped), daemon=True).start()
+    reader = StreamingSerialReader(port, lambda frame: None, sample_rate=args.sample_rate).start()
+    time.sleep(args.seconds)
+    stopped.set()
+    reader.stop()
+    print(reader.metrics())
@@ -0,0 +1,122 @@
+"""
+Single-pass NLP analysis shared by the memory writers.
+
+analyze_text() runs sentence splitting, tokenization, POS tagging, named
+entity chunking, VADER sentiment and sentence-type classification exactly
+once per message and returns an immutable AnalyzedText.  The sensory,
+semantic and PAM writers all consume that object instead of re-running NLTK
+on the raw string.
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from nltk import sent_tokenize, word_tokenize
+from nltk.tree import Tree
+
+from nlp_resources import ne_chunk, pos_tag, sentiment_analyzer
+
+
+WH_WORDS = frozenset({"what", "when", "where", "who", "why", "how", "which", "whom", "whose"})
+AUX_MODALS = frozenset({"is", "are", "was", "were", "do", "does", "did", "can", "could", "will", "would",
+                        "should", "shall", "may", "might", "have", "has", "had"})
+
+
+@dataclass(frozen=True)
+class AnalyzedSentence:
+    text: str
+    tokens: tuple
+    pos_tags: tuple          # ((token, treebank_tag), ...)
+    named_entities: tuple    # ((entity_text, entity_type), ...)
+    sentiment: MappingProxyType  # VADER scores: pos, neg, neu, compound
+    mood: str
+    sentence_type: str
+
+    @property
+    def entity_map(self):
+        """Token -> named-entity type, for tokens inside a named entity"""
+        return {name: entity_type for name, entity_type in self.named_entities}
+
+
+@dataclass(frozen=True)
+class AnalyzedText:
+    text: str
+    sentences: tuple
+
+    @property
+    def tokens(self):
+        return tuple(token for sentence in self.sentences for token in sentence.tokens)
+
+    @property
+    def pos_tags(self):
+        return tuple(tag for sentence in self.sentences for tag in sentence.pos_tags)
+
+    @property
+    def named_entities(self):
+        return tuple(entity for sentence in self.sentences for entity in sentence.named_entities)
+
+
+def extract_named_entities(tagged_tokens):
+    named_entities = []
+    for subtree in ne_chunk(tagged_tokens):
+        if isinstance(subtree, Tree):
+            entity_name = " ".join([token for token, _ in subtree.leaves()])
+            named_entities.append((entity_name, subtree.label()))
+    return tuple(named_entities)
+
+
+def classify_sentence_type(tokens, tags):
+    if not tokens:
+        return "unknown"
+
+    first_word = tokens[0].lower()
+    first_tag = tags[0][1] if tags else ""
+
+    # Interrogative if sentence starts with wh-word or auxiliary/modal verb
+    if first_word in WH_WORDS or first_word in AUX_MODALS:
+        return "interrogative"
+
+    # Imperative: usually starts with base form verb (VB) and no subject (PRP/NOUN)
+    if first_tag == "VB" and all(tag[1] not in {"PRP", "NN", "NNP"} for tag in tags[:2]):
+        return "imperative"
+
+    # Exclamatory: begins with interjection (UH) or exclamatory adjective/adverb
+    if first_tag == "UH" or first_word in {"what", "how"} and len(tags) > 1 and tags[1][1] in {"JJ", "RB"}:
+        return "exclamatory"
+
+    # Default fallback
+    return "declarative"
+
+
+def dominant_mood(scores):
+    if scores["pos"] > scores["neg"] and scores["pos"] > scores["neu"]:
+        return "positive"
+    if scores["neg"] > scores["pos"] and scores["neg"] > scores["neu"]:
+        return "negative"
+    return "neutral"
+
+
+def analyze_text(text):
+    """Run the full NLTK pipeline over `text` once"""
+    sia = sentiment_analyzer()
+    sentences = []
+    for sentence in sent_tokenize(text):
+        tokens = tuple(word_tokenize(sentence))
+        tags = tuple(pos_tag(tokens)) if tokens else ()
+        scores = sia.polarity_scores(sentence)
+        sentences.append(AnalyzedSentence(
+            text=sentence,
+            tokens=tokens,
+            pos_tags=tags,
+            named_entities=extract_named_entities(tags) if tags else (),
+            sentiment=MappingProxyType(dict(scores)),
+            mood=dominant_mood(scores),
+            sentence_type=classify_sentence_type(tokens, tags),
+        ))
+    return AnalyzedText(text=text, sentences=tuple(sentences))
+
+
+def ensure_analyzed(text_or_analysis):
+    """Accept either raw text or an AnalyzedText"""
+    if isinstance(text_or_analysis, AnalyzedText):
+        return text_or_analysis
+    return analyze_text(text_or_analysis)